@@ -0,0 +1,192 @@
+"""
+models/backtest.py
+
+Rolling-origin backtesting and benchmark harness for crowd count forecasters.
+
+- Builds long count series: synthetic (like forecasting_model.demo_run) or
+  replayed from the detections_*.json files in results/.
+- Cuts every (train window, horizon) pair at once with stride tricks; the
+  rolling-origin loop itself is forecasters.rolling_backtest, shared with
+  ForecasterSelector.
+- Evaluates each registered forecaster per camera, cameras in a process pool.
+- Reports MAE/RMSE per horizon next to fit/predict latency percentiles and
+  peak traced memory.
+
+Usage:
+    python -m models.backtest --cameras 8 --length 5000 --workers 4
+    python -m models.backtest --results results/
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .forecasters import DEFAULT_CANDIDATES, create_forecaster, rolling_backtest
+from .model_utils import calculate_horizon_metrics
+
+
+# ---------------- Series Sources ----------------
+def synthetic_series(length: int = 5000, seed: int = 0, period: int = 300,
+                     base: float = 50.0, amplitude: float = 20.0, noise: float = 3.0) -> np.ndarray:
+    """Sinusoidal counts with Gaussian noise, as in demo_run but arbitrarily long."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(length)
+    counts = base + amplitude * np.sin(2 * np.pi * t / period) + rng.normal(0, noise, length)
+    return np.clip(counts, 0, None).astype(int).astype(np.float64)
+
+
+def load_result_series(results_dir: str = "results") -> np.ndarray:
+    """Replay per-frame counts from detections_*.json, de-duplicated by frame."""
+    by_frame = {}
+    for path in glob.glob(os.path.join(results_dir, "detections_*.json")):
+        with open(path) as f:
+            for record in json.load(f):
+                by_frame[record["frame"]] = record["count"]
+    return np.array([by_frame[k] for k in sorted(by_frame)], dtype=np.float64)
+
+
+# ---------------- Windowing ----------------
+def rolling_windows(series: np.ndarray, train_window: int, horizon: int, stride: int = 1):
+    """
+    All rolling origins as zero-copy views.
+    Returns (train, target): (n_origins, train_window) and (n_origins, horizon).
+    """
+    series = np.ascontiguousarray(series, dtype=np.float64)
+    if len(series) < train_window + horizon:
+        raise ValueError(f"Series of length {len(series)} is shorter than "
+                         f"train_window + horizon ({train_window + horizon})")
+    windows = np.lib.stride_tricks.sliding_window_view(series, train_window + horizon)[::stride]
+    return windows[:, :train_window], windows[:, train_window:]
+
+
+# ---------------- Evaluation ----------------
+def backtest_forecaster(name: str, series: np.ndarray, horizon: int = 10, train_window: int = 120,
+                        stride: int = 10, params: Optional[Dict] = None) -> Dict:
+    """Backtest one forecaster over all rolling origins of a series."""
+    train, _ = rolling_windows(series, train_window, horizon, stride)
+    origins = train_window + stride * np.arange(len(train))
+    forecaster = create_forecaster(name, **(params or {}))
+    preds, target, fit_s, predict_s = rolling_backtest(forecaster, series, origins, horizon, train_window)
+
+    # Peak memory of a single fit+predict, traced separately so it doesn't skew latency
+    tracemalloc.start()
+    create_forecaster(name, **(params or {})).fit(train[-1]).predict(horizon)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    metrics = calculate_horizon_metrics(target, preds)
+    return {
+        "forecaster": name,
+        "n_origins": len(train),
+        "mae": metrics["mae"].tolist(),
+        "rmse": metrics["rmse"].tolist(),
+        "fit_ms": (fit_s * 1000.0).tolist(),
+        "predict_ms": (predict_s * 1000.0).tolist(),
+        "peak_kb": peak / 1024.0,
+    }
+
+
+def _evaluate_camera(job) -> List[Dict]:
+    """Process-pool entry point: every forecaster on one camera's series."""
+    camera_id, series, forecasters, horizon, train_window, stride = job
+    results = []
+    for name in forecasters:
+        result = backtest_forecaster(name, series, horizon, train_window, stride)
+        result["camera_id"] = camera_id
+        results.append(result)
+    return results
+
+
+def run_backtest(series_by_camera: Dict[str, np.ndarray],
+                 forecasters: Sequence[str] = DEFAULT_CANDIDATES,
+                 horizon: int = 10, train_window: int = 120, stride: int = 10,
+                 workers: Optional[int] = None) -> List[Dict]:
+    """Backtest all forecasters on all cameras, one camera per pool task."""
+    jobs = [(cam, series, list(forecasters), horizon, train_window, stride)
+            for cam, series in series_by_camera.items()]
+    if workers == 1 or len(jobs) == 1:
+        per_camera = [_evaluate_camera(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            per_camera = list(pool.map(_evaluate_camera, jobs))
+    return [r for results in per_camera for r in results]
+
+
+def summarize(results: List[Dict]) -> List[Dict]:
+    """Aggregate per-camera results per forecaster (errors weighted by origin count)."""
+    summary = []
+    for name in dict.fromkeys(r["forecaster"] for r in results):
+        rows = [r for r in results if r["forecaster"] == name]
+        weights = np.array([r["n_origins"] for r in rows], dtype=np.float64)
+        mae = np.average(np.array([r["mae"] for r in rows]), axis=0, weights=weights)
+        mse = np.average(np.array([r["rmse"] for r in rows]) ** 2, axis=0, weights=weights)
+        fit_ms = np.concatenate([r["fit_ms"] for r in rows])
+        predict_ms = np.concatenate([r["predict_ms"] for r in rows])
+        summary.append({
+            "forecaster": name,
+            "origins": int(weights.sum()),
+            "mae": mae,
+            "rmse": np.sqrt(mse),
+            "fit_p50_ms": float(np.percentile(fit_ms, 50)),
+            "fit_p95_ms": float(np.percentile(fit_ms, 95)),
+            "predict_p50_ms": float(np.percentile(predict_ms, 50)),
+            "predict_p95_ms": float(np.percentile(predict_ms, 95)),
+            "peak_kb": max(r["peak_kb"] for r in rows),
+        })
+    return summary
+
+
+def print_report(summary: List[Dict]) -> None:
+    from tabulate import tabulate
+
+    headers = ["Forecaster", "Origins", "MAE h1", "MAE hN", "RMSE h1", "RMSE hN",
+               "Fit p50/p95 ms", "Predict p50/p95 ms", "Peak KB"]
+    rows = [[s["forecaster"], s["origins"],
+             f"{s['mae'][0]:.2f}", f"{s['mae'][-1]:.2f}",
+             f"{s['rmse'][0]:.2f}", f"{s['rmse'][-1]:.2f}",
+             f"{s['fit_p50_ms']:.3f}/{s['fit_p95_ms']:.3f}",
+             f"{s['predict_p50_ms']:.3f}/{s['predict_p95_ms']:.3f}",
+             f"{s['peak_kb']:.1f}"] for s in summary]
+    print(tabulate(rows, headers=headers, tablefmt="github"))
+
+    print("\nMAE per horizon step:")
+    horizon_rows = [[s["forecaster"]] + [f"{v:.2f}" for v in s["mae"]] for s in summary]
+    steps = len(summary[0]["mae"]) if summary else 0
+    print(tabulate(horizon_rows, headers=["Forecaster"] + [f"h{i + 1}" for i in range(steps)],
+                   tablefmt="github"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin forecast backtest")
+    parser.add_argument("--results", help="Replay counts from this results directory instead of synthetic data")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of synthetic cameras")
+    parser.add_argument("--length", type=int, default=5000, help="Synthetic series length")
+    parser.add_argument("--forecasters", nargs="+", default=list(DEFAULT_CANDIDATES))
+    parser.add_argument("--horizon", type=int, default=10)
+    parser.add_argument("--train-window", type=int, default=120)
+    parser.add_argument("--stride", type=int, default=10, help="Frames between rolling origins")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    args = parser.parse_args()
+
+    if args.results:
+        series_by_camera = {"results": load_result_series(args.results)}
+    else:
+        series_by_camera = {f"cam{i:02d}": synthetic_series(args.length, seed=i)
+                            for i in range(args.cameras)}
+
+    start = time.perf_counter()
+    results = run_backtest(series_by_camera, args.forecasters, args.horizon,
+                           args.train_window, args.stride, args.workers)
+    print_report(summarize(results))
+    print(f"\nBacktested {len(series_by_camera)} camera(s) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
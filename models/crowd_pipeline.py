@@ -1,4 +1,5 @@
 import os
+import math
 import json
 import numpy as np
 from datetime import datetime
@@ -7,32 +8,112 @@ import cv2
 from collections import deque
 from pathlib import Path
 import time
-import requests
 
 from .detection_model import CrowdAnalyzer
-from .forecasting_model import train_lstm_model, train_linear_model
+from .forecasters import ForecasterSelector
+from .forecast_cache import ForecastCache, cached_forecast
+from .rollups import RollupAggregator
+from .model_utils import LiteForecastModel, CSVLogger, load_forecast_model, save_forecast_model
+from .detections import DetectionBatch
+from .heatmap import HeatmapAccumulator
+from .zones import ZoneMap, LineCounter, load_zone_config
+from .flow import FlowEstimator
+from services.alert_service import AlertEngine, AlertRule
+from services.scheduler_service import CameraBudget, CameraSettings
 
 class CrowdPipeline:
-    def __init__(self, detection_weights="yolov8n.pt", device="cuda", source_type="file", camera_id="default_cam"):
-        self.detector = CrowdAnalyzer(
+    def __init__(self, detection_weights="yolov8n.pt", device="cuda", source_type="file", camera_id="default_cam",
+                 forecast_candidates=None, forecast_error_budget=2.0, forecast_cache_dir=None,
+                 forecast_model_path=None, detection_log_path=None, zone_config=None,
+                 alert_rules=None, dashboard=None, estimate_flow=True, scheduler=None, camera_budget=None,
+                 checkpoint_path=None, checkpoint_every=300, rate_policy=None, detector=None,
+                 detection_history=300, detector_kwargs=None):
+        # A prebuilt CrowdAnalyzer (or a stand-in, as in scripts/soak_test.py) replaces the YOLO one;
+        # detector_kwargs configure the built one (detection_cache, tile_mode, count_mode, ...)
+        self.detector = detector if detector is not None else CrowdAnalyzer(
             yolo_weights=detection_weights,
-            device=device
+            device=device,
+            **(detector_kwargs or {})
         )
         self.device = device
         self.counts_history = deque(maxlen=30)  # Store just the counts
-        self.detection_data = []  # Store full detection data separately
+        # Full detection data separately; bounded so weeks-long runs do not grow without limit
+        self.detection_data = deque(maxlen=int(detection_history))
         self.forecast_window = 30
         self.forecast_steps = 10
+        self.forecast_selector = ForecasterSelector(
+            candidates=forecast_candidates,
+            error_budget=forecast_error_budget,
+            horizon=self.forecast_steps
+        )
+        # Unchanged count windows (idle or static scenes) reuse earlier forecasts
+        self.forecast_cache = ForecastCache(cache_dir=forecast_cache_dir)
+        # Result files get closed buckets through drain(); the in-memory history is only a short tail
+        self.rollups = RollupAggregator(max_closed=60)
+        # Exported LSTM (see model_utils.export_forecast_model) served without TensorFlow
+        self.lite_forecaster = LiteForecastModel(forecast_model_path) if forecast_model_path else None
+        self.lstm_models = {}  # look_back -> Keras model, reused across retrains
+        self.detection_log = CSVLogger(
+            detection_log_path, ["timestamp", "frame", "camera_id", "count", "boxes"]
+        ) if detection_log_path else None
+        self.last_detections = DetectionBatch()
+        self.heatmap = None  # created on the first frame, once the frame size is known
+        # Zones are rasterized on the first frame as well; lines need no raster
+        self.zone_config = load_zone_config(zone_config) if zone_config else None
+        self.zone_map = None
+        self.line_counter = LineCounter(self.zone_config["lines"]) if self.zone_config else None
+        # Crowd velocity/direction from sparse LK tracking of head centers
+        self.flow = FlowEstimator() if estimate_flow else None
+
+        # Alerting: debounced, hysteresis-based rules instead of a per-frame "count > 9"
+        if alert_rules is None:
+            alert_rules = [
+                AlertRule("crowd_high", threshold=10),
+                AlertRule("crowd_forecast_high", threshold=10, metric="forecast", severity="info"),
+            ]
+            for zone in (self.zone_config or {}).get("zones", []):
+                if zone.get("max_count") is not None:
+                    alert_rules.append(AlertRule(f"zone_{zone['name']}_high", threshold=zone["max_count"] + 1,
+                                                 zone=zone["name"]))
+        self.alert_engine = AlertEngine(alert_rules)
+        # Optional services.dashboard_service.DashboardService fed in-process
+        self.dashboard = dashboard
+        # Optional services.scheduler_service.LoadScheduler shared by the cameras of a node
+        self.scheduler = scheduler
+        if scheduler is not None:
+            scheduler.register(camera_budget or CameraBudget(camera_id))
+        # Optional services.rate_policy_service.ForecastRatePolicy: detection rate from forecast risk
+        self.rate_policy = rate_policy
+        if rate_policy is not None:
+            thresholds = [r.threshold for r in self.alert_engine.rules_for(camera_id) if r.zone is None]
+            rate_policy.register(camera_id, min(thresholds, default=10), self.detector.imgsz)
+        self.last_detect_frame = None
+        # Scheduler / rate policy settings last pushed to the detector; pushed again only
+        # when they change, so the detector's adaptive imgsz is not reset every detection
+        self._applied_settings = None
+        self.last_forecast = None
         self.source_type = source_type
         self.frame_idx = 0
-        self.last_forecast = time.time()
+        self.media_epoch = None  # wall-clock time of media_time 0 for sampled file sources
+        self.last_forecast_time = time.time()
         self.forecast_interval = 1.0  # seconds
         self.camera_id = camera_id
         self.backend_url = "http://localhost:5000/api/crowd"
         self.auth_token = None
+        self.last_saved_frame = 0  # last frame whose results files were written
+        self.last_uploaded_frame = 0  # last frame the backend accepted
+
+        # Warm restart: periodic checkpoints of per-camera state, restored here on start;
+        # checkpoint_every <= 0 only restores (call save_checkpoint to write one)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = int(checkpoint_every)
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint(checkpoint_path)
 
     def authenticate(self, email, password):
         """Authenticate with the backend and store the token."""
+        import requests
+
         auth_url = "http://localhost:5000/api/auth/login"
         try:
             response = requests.post(auth_url, json={"email": email, "password": password})
@@ -44,59 +125,266 @@ class CrowdPipeline:
         except requests.exceptions.RequestException as e:
             print(f"Error during authentication: {e}")
     
-    def process_frame(self, frame: np.ndarray, save_detections: bool = True) -> Tuple[np.ndarray, int, float, bool]:
-        """Process a frame through detection and update history"""
+    def process_frame(self, frame: np.ndarray, save_detections: bool = True, media_time: Optional[float] = None,
+                      source_frame: Optional[int] = None,
+                      detections: Optional[DetectionBatch] = None,
+                      annotate: bool = True) -> Tuple[np.ndarray, int, float, bool]:
+        """
+        Process a frame through detection and update history. For sampled file sources,
+        media_time (seconds into the video) drives record timestamps, rollups, heatmap,
+        flow and alert timing instead of the wall clock. detections is this frame's
+        post-processed batch when it was detected elsewhere (e.g. by an
+        inference_pool.DetectorPool); the local detector is then skipped.
+        annotate=False skips the frame copy and overlays for consumers that never
+        display it (headless runs, load tests); the input frame is returned as is.
+        """
         self.frame_idx += 1
-        results = self.detector(frame, classes=[0])  # Pass classes=[0] to only detect persons
-        
-        # Get person detections (class 0)
-        person_boxes = results[0].boxes[results[0].boxes.cls == 0]
-        count = len(person_boxes)
+        if media_time is None:
+            now = datetime.now()
+        else:
+            if self.media_epoch is None:
+                self.media_epoch = time.time() - media_time
+            now = datetime.fromtimestamp(self.media_epoch + media_time)
+        settings = self._detection_settings()
+        detected = True
+        if detections is not None:
+            person_boxes = detections
+            self.last_detect_frame = self.frame_idx
+            if self.rate_policy is not None:
+                self.rate_policy.record(self.camera_id, self.frame_idx, self._count(person_boxes), settings)
+        elif settings is None or self.last_detect_frame is None or \
+                self.frame_idx - self.last_detect_frame >= settings.stride:
+            detect_start = time.perf_counter()
+            if settings is not None and settings != self._applied_settings:
+                # The scheduler / rate policy sets imgsz; it also keys the detection cache
+                self.detector.imgsz = settings.imgsz
+                self.detector.enable_refine = settings.refine
+                self._applied_settings = settings
+            # Person boxes and de-duplicated head circles as one DetectionBatch (cached, tiled or direct)
+            # Only source frame numbers key the detection cache: frame_idx of a live or resumed
+            # stream says nothing about which picture it is
+            person_boxes = self.detector.detect(frame, frame_idx=source_frame)
+            self.last_detect_frame = self.frame_idx
+            if self.scheduler is not None:
+                self.scheduler.record(self.camera_id, time.perf_counter() - detect_start)
+            if self.rate_policy is not None:
+                self.rate_policy.record(self.camera_id, self.frame_idx, self._count(person_boxes), settings)
+        else:
+            # Skipped frame: the scheduler or the rate policy has stretched this camera's stride
+            person_boxes = self.last_detections
+            detected = False
+            if self.rate_policy is not None:
+                self.rate_policy.record(self.camera_id, self.frame_idx)
+        self.last_detections = person_boxes
+        count = self._count(person_boxes)
         
-        # Add count to counts history
+        # Add count to counts history; forecasters only learn from counts that were detected
         self.counts_history.append(count)
+        if detected:
+            self.forecast_selector.observe(count)
+        if self.rate_policy is not None and now.timestamp() - self.last_forecast_time >= self.forecast_interval:
+            self.last_forecast_time = now.timestamp()
+            # The policy horizon is in frames; forecaster steps are detections, one per stride frames.
+            # Clamped to what the active forecaster supports (the LSTM's trained horizon)
+            steps = math.ceil(self.rate_policy.horizon / settings.stride)
+            outlook = self.forecast_selector.forecast(max(self.forecast_steps, steps))
+            self.last_forecast = outlook[:self.forecast_steps] if outlook else None
+            self.rate_policy.update(self.camera_id, outlook, timestamp=now.timestamp())
         avg_count = sum(self.counts_history) / len(self.counts_history)
         
         # Draw boxes and count
-        annotated = frame.copy()
-        for box in person_boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        annotated = frame.copy() if annotate else frame
+        if annotate:
+            for x1, y1, x2, y2 in person_boxes.xyxy.astype(int).tolist():
+                cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
         
-        # Generate alert if count exceeds the threshold
-        alert = count > 9
+        # Per-zone counts and line crossings from head positions
+        centers = person_boxes.centers(self.detector.head_top_ratio)
+        zone_counts, zones_over, crossings = None, [], {}
+        if self.zone_config is not None:
+            if self.zone_map is None:
+                self.zone_map = ZoneMap(self.zone_config["zones"], frame.shape[:2])
+            zone_counts = self.zone_map.count(centers)
+            zones_over = self.zone_map.over_limit(zone_counts)
+            crossings = self.line_counter.update(centers)
+
+        flow = self.flow.update(frame, centers, now.timestamp(), self.zone_map) if self.flow is not None else None
+
+        # Alert state from the streaming engine (raw, smoothed, forecast and zone rules)
+        alert_events = self.alert_engine.evaluate(self.camera_id, count, forecast=self.last_forecast,
+                                                  zones=zone_counts, timestamp=now.timestamp())
+        # The frame flag is about the crowd now; info-level rules (the forecast outlook) only emit events
+        alert = self.alert_engine.is_active(self.camera_id, min_severity="warning")
 
         # Add text overlays
-        cv2.putText(annotated, f"Count: {count}", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(annotated, f"Status: {'ALERT!' if alert else 'Normal'}", (10, 70),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0) if not alert else (0, 0, 255), 2)
-        
-        if alert:
-            cv2.putText(annotated, "High Crowd Density Detected!", (10, 110),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        if annotate:
+            cv2.putText(annotated, f"Count: {count}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.putText(annotated, f"Status: {'ALERT!' if alert else 'Normal'}", (10, 70),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0) if not alert else (0, 0, 255), 2)
+
+            if alert:
+                cv2.putText(annotated, "High Crowd Density Detected!", (10, 110),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         
+        self.rollups.add(now.timestamp(), count, alert)
+        if self.heatmap is None:
+            self.heatmap = HeatmapAccumulator(frame.shape[:2])
+        self.heatmap.update(centers, now.timestamp())
+
         if save_detections:
             detection_data = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now.isoformat(),
                 "frame": self.frame_idx,
                 "count": count,
                 "average_count": float(avg_count),
                 "alert": alert
             }
+            if media_time is not None:
+                detection_data["media_time"] = round(media_time, 3)
+                detection_data["source_frame"] = source_frame
+            if self.zone_config is not None:
+                detection_data["zones"] = zone_counts
+                detection_data["zones_over_limit"] = zones_over
+                detection_data["line_crossings"] = crossings
+            if flow is not None:
+                detection_data["flow"] = flow
+            if alert_events:
+                detection_data["alert_events"] = [e.to_dict() for e in alert_events]
             self.detection_data.append(detection_data)
+            if self.dashboard is not None:
+                self.dashboard.publish_detection(self.camera_id, detection_data)
+            if self.detection_log is not None:
+                self.detection_log.log_detection(self.frame_idx, self.camera_id, count, person_boxes)
         
         # Send data to backend
         self.send_data_to_backend(count, alert)
 
+        if self.checkpoint_path and self.checkpoint_every > 0 and self.frame_idx % self.checkpoint_every == 0:
+            self.save_checkpoint(self.checkpoint_path)
+
         return annotated, count, avg_count, alert
 
+    def _count(self, batch: DetectionBatch) -> int:
+        """People in a batch per the detector's count mode (head circles or person boxes)."""
+        return len(batch) if self.detector.count_mode == "persons" else len(batch.circles)
+
+    def _detection_settings(self):
+        """Combined scheduler and rate policy settings (the sparser of each), or None without either."""
+        sources = [src.settings(self.camera_id) for src in (self.scheduler, self.rate_policy) if src is not None]
+        if not sources:
+            return None
+        return CameraSettings(stride=max(s.stride for s in sources), imgsz=min(s.imgsz for s in sources),
+                              refine=all(s.refine for s in sources))
+
+    CHECKPOINT_VERSION = 1
+
+    def get_state(self) -> Dict[str, Any]:
+        """Compact per-camera state needed to resume warm (no frames; save_checkpoint adds LSTM model files)."""
+        state = {
+            "version": self.CHECKPOINT_VERSION,
+            "camera_id": self.camera_id,
+            "saved_at": time.time(),
+            "frame_idx": self.frame_idx,
+            "last_saved_frame": self.last_saved_frame,
+            "last_uploaded_frame": self.last_uploaded_frame,
+            "media_epoch": self.media_epoch,
+            "counts_history": list(self.counts_history),
+            "detection_data": list(self.detection_data)[-self.forecast_window:],
+            "last_forecast": self.last_forecast,
+            "forecaster": self.forecast_selector.get_state(),
+            "alerts": self.alert_engine.get_state(self.camera_id),
+            "detector": {
+                "imgsz": self.detector.imgsz,
+                "frame_counter": self.detector.frame_counter,
+                "count_history": list(self.detector.count_history),
+            },
+        }
+        if self.line_counter is not None:
+            state["lines"] = self.line_counter.get_state()
+        state["rollups"] = self.rollups.get_state()
+        if self.heatmap is not None:
+            state["heatmap"] = self.heatmap.get_state()
+        return state
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        if state.get("version") != self.CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {state.get('version')}")
+        if state.get("camera_id") != self.camera_id:
+            raise ValueError(f"Checkpoint is for camera {state.get('camera_id')}, not {self.camera_id}")
+        self.frame_idx = int(state["frame_idx"])
+        self.last_saved_frame = int(state.get("last_saved_frame", 0))
+        self.last_uploaded_frame = int(state.get("last_uploaded_frame", 0))
+        self.media_epoch = state.get("media_epoch")
+        self.counts_history.extend(state["counts_history"])
+        self.detection_data = deque(state.get("detection_data", []), maxlen=self.detection_data.maxlen)
+        self.last_forecast = state.get("last_forecast")
+        self.forecast_selector.set_state(state["forecaster"])
+        if state.get("alerts") is not None:
+            self.alert_engine.set_state(self.camera_id, state["alerts"])
+        detector = state.get("detector", {})
+        self.detector.imgsz = int(detector.get("imgsz", self.detector.imgsz))
+        # Keep the restored (possibly adapted) imgsz until the scheduler / rate policy change
+        self._applied_settings = self._detection_settings()
+        self.detector.frame_counter = int(detector.get("frame_counter", 0))
+        self.detector.count_history.extend(detector.get("count_history", []))
+        if self.line_counter is not None and "lines" in state:
+            self.line_counter.set_state(state["lines"])
+        self.rollups.set_state(state.get("rollups", {}))
+        if state.get("heatmap") is not None:
+            self.heatmap = HeatmapAccumulator(state["heatmap"]["frame_shape"])
+            self.heatmap.set_state(state["heatmap"])
+        for look_back, model_path in state.get("lstm_models", {}).items():
+            model = load_forecast_model(model_path)
+            if model is not None:
+                self.lstm_models[int(look_back)] = model
+
+    def _save_lstm_models(self, path: str) -> Dict[str, str]:
+        """Keras forecasters next to the checkpoint (<path>.lstm<look_back>.h5), each replaced atomically."""
+        saved = {}
+        for look_back, model in self.lstm_models.items():
+            model_path = f"{path}.lstm{look_back}.h5"
+            tmp = f"{path}.lstm{look_back}.tmp.h5"
+            if save_forecast_model(model, tmp):
+                os.replace(tmp, model_path)
+                saved[str(look_back)] = model_path
+        return saved
+
+    def save_checkpoint(self, path: str) -> None:
+        """Write the state atomically (temp file, fsync, rename)."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        try:
+            state = self.get_state()
+            state["lstm_models"] = self._save_lstm_models(path)
+            with open(tmp, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not write checkpoint {path}: {e}")
+
+    def load_checkpoint(self, path: str) -> bool:
+        """Restore from a checkpoint; a missing, stale-format or corrupt file means a cold start."""
+        try:
+            with open(path) as f:
+                self.restore_state(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring checkpoint {path}: {e}")
+            return False
+        print(f"Resumed {self.camera_id} from checkpoint at frame {self.frame_idx}")
+        return True
+
     def send_data_to_backend(self, count: int, alert: bool):
         """Send detection data to the backend server"""
         if not self.auth_token:
             print("Cannot send data to backend. Not authenticated.")
             return
 
+        import requests
+
         headers = {
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self.auth_token}'
@@ -110,6 +398,7 @@ class CrowdPipeline:
         try:
             response = requests.post(self.backend_url, json=payload, headers=headers)
             if response.status_code == 201:
+                self.last_uploaded_frame = self.frame_idx
                 print(f"Successfully sent data to backend: {response.json()}")
             else:
                 print(f"Failed to send data. Status: {response.status_code}, Body: {response.text}")
@@ -117,54 +406,98 @@ class CrowdPipeline:
             print(f"Error sending data to backend: {e}")
 
     def forecast_crowd(self, method="lstm"):
-        """Generate crowd forecast from detection history"""
+        """Generate crowd forecast from detection history.
+
+        method="auto" uses the per-camera selector, which routes to the cheapest
+        statistical forecaster within the error budget and needs no training here.
+        """
+        if method.lower() == "auto":
+            predictions = self.forecast_selector.forecast(self.forecast_steps)
+            if predictions is None:
+                return None, None
+            return self.forecast_selector.active, predictions
+
         if len(self.counts_history) < self.forecast_window:
             return None, None
 
         # Prepare data for forecasting
         counts = list(self.counts_history)
         
-        if method.lower() == "lstm":
-            model, predictions = train_lstm_model(
-                counts, 
-                look_back=self.forecast_window,
-                n_steps=self.forecast_steps
-            )
+        if method.lower() == "lstm" and self.lite_forecaster is not None:
+            return self.lite_forecaster, self.lite_forecaster.predict(counts)[:self.forecast_steps].tolist()
+        elif method.lower() == "lstm":
+            # Each training pair spans look_back + forecast_steps counts of the window
+            model, predictions = self._lstm_forecast(counts, look_back=len(counts) - self.forecast_steps)
         else:
-            model, predictions = train_linear_model(
+            model, predictions = cached_forecast(
+                self.forecast_cache, "linear",
                 counts,
                 n_steps=self.forecast_steps
             )
         
         return model, predictions
 
+    def _lstm_forecast(self, counts, look_back=5):
+        """LSTM forecast through the cache; one Keras model per look_back is kept and retrained in place."""
+        model, predictions = cached_forecast(self.forecast_cache, "lstm", counts, look_back=look_back,
+                                             n_steps=self.forecast_steps, model=self.lstm_models.get(look_back))
+        if model is not None:
+            self.lstm_models[look_back] = model
+        return model, predictions
+
+    @staticmethod
+    def _write_json(path: str, payload, **kwargs) -> None:
+        """Write via a temp file and rename, so readers (services/dashboard_service.py) never see half a file."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f, **kwargs)
+        os.replace(tmp, path)
+
     def save_pipeline_data(self, output_dir: str) -> Tuple[str, str]:
         """Save both detection and forecast data"""
         os.makedirs(output_dir, exist_ok=True)
         
         # Save detection history
         detection_path = os.path.join(output_dir, f"detections_{self.frame_idx}.json")
-        with open(detection_path, 'w') as f:
-            json.dump(self.detection_data[-30:], f, indent=2)  # Keep last 30 frames
+        self._write_json(detection_path, list(self.detection_data)[-30:], indent=2)  # Keep last 30 frames
+        self.last_saved_frame = self.frame_idx
+
+        if self.heatmap is not None:
+            heatmap_path = os.path.join(output_dir, f"heatmap_{self.frame_idx}.json")
+            self.heatmap.save_snapshot(heatmap_path, camera_id=self.camera_id)
+
+        # Save time buckets closed since the last save
+        closed_buckets = self.rollups.drain()
+        if closed_buckets:
+            rollup_path = os.path.join(output_dir, f"rollups_{self.frame_idx}.json")
+            self._write_json(rollup_path, closed_buckets)
         
         # Generate and save forecasts if we have enough history
         if len(self.counts_history) >= self.forecast_window:
             counts = list(self.counts_history)
-            lstm_model, lstm_preds = train_lstm_model(counts, n_steps=self.forecast_steps)
-            linear_model, linear_preds = train_linear_model(counts, n_steps=self.forecast_steps)
+            self.last_forecast = self.forecast_selector.forecast(self.forecast_steps)
+            if self.lite_forecaster is not None:
+                lstm_preds = self.lite_forecaster.predict(counts)[:self.forecast_steps]
+            else:
+                lstm_model, lstm_preds = self._lstm_forecast(counts)
+            linear_model, linear_preds = cached_forecast(self.forecast_cache, "linear", counts, n_steps=self.forecast_steps)
             
             forecast_data = {
                 "timestamp": datetime.now().isoformat(),
                 "frame": self.frame_idx,
                 "lstm_predictions": lstm_preds.tolist() if isinstance(lstm_preds, np.ndarray) else lstm_preds,
                 "linear_predictions": linear_preds.tolist() if isinstance(linear_preds, np.ndarray) else linear_preds,
+                "selected_model": self.forecast_selector.active.name if self.forecast_selector.active else None,
+                "selected_predictions": self.last_forecast,
                 "window_size": self.forecast_window,
                 "steps": self.forecast_steps
             }
             
+            if self.dashboard is not None:
+                self.dashboard.publish_forecast(self.camera_id, forecast_data)
+
             forecast_path = os.path.join(output_dir, f"forecast_{self.frame_idx}.json")
-            with open(forecast_path, 'w') as f:
-                json.dump(forecast_data, f, indent=2)
+            self._write_json(forecast_path, forecast_data, indent=2)
                 
             return detection_path, forecast_path
             
@@ -0,0 +1,165 @@
+"""
+models/detection_cache.py
+
+On-disk cache of raw detector outputs for fast re-runs and replays.
+
+- Raw per-frame YOLO outputs (xyxy, conf, cls) are stored before any
+  postprocessing, so re-running a clip with different head_top_ratio,
+  circle_nms_factor, Hough or NMS settings skips inference entirely.
+- Cache directories are keyed by (video content hash, weights hash, conf,
+  iou, max_det, tiling); tiling is the tile mode, size, overlap and guide
+  imgsz, or nothing when frames are not tiled. Each frame entry also records
+  the imgsz it was inferred at and only matches a request for the same imgsz.
+- Storage is chunked: one .npz per `chunk_frames` frames holding a packed
+  float32 (N, 6) array plus per-frame offsets, written atomically.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .detections import DetectionBatch
+
+logger = logging.getLogger("detection_cache")
+
+_HASH_MEMO: Dict[Tuple[str, int, float], str] = {}
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a file's content, memoized per (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    digest = _HASH_MEMO.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                h.update(block)
+        digest = _HASH_MEMO[memo_key] = h.hexdigest()
+    return digest
+
+
+class DetectionCache:
+    """Chunked store of raw detections for one (video, weights, inference settings) combination."""
+
+    def __init__(self, root: str, video_path: str, weights: str, conf: float, iou: float,
+                 chunk_frames: int = 256, max_det: int = 300, tile_mode: str = "off",
+                 tile_size: int = 960, tile_overlap: float = 0.2, guide_imgsz: int = 640):
+        weights_id = file_hash(weights) if os.path.isfile(weights) else str(weights)
+        tiling = None
+        if tile_mode != "off":
+            tiling = {"mode": tile_mode, "size": int(tile_size), "overlap": float(tile_overlap),
+                      "guide_imgsz": int(guide_imgsz) if tile_mode == "guided" else None}
+        self.meta = {
+            "video": os.path.basename(str(video_path)),
+            "video_hash": file_hash(video_path),
+            "weights": os.path.basename(str(weights)),
+            "weights_hash": weights_id,
+            "conf": float(conf),
+            "iou": float(iou),
+            "max_det": int(max_det),
+            "tiling": tiling,
+            "chunk_frames": int(chunk_frames),
+        }
+        key_src = json.dumps([self.meta["video_hash"], weights_id, self.meta["conf"], self.meta["iou"],
+                              self.meta["max_det"], tiling], sort_keys=True)
+        self.key = hashlib.sha256(key_src.encode()).hexdigest()[:24]
+        self.dir = Path(root) / self.key
+        self.dir.mkdir(parents=True, exist_ok=True)
+        meta_path = self.dir / "meta.json"
+        if not meta_path.exists():
+            with open(meta_path, "w") as f:
+                json.dump(self.meta, f, indent=2)
+
+        self.chunk_frames = int(chunk_frames)
+        self.hits = 0
+        self.misses = 0
+        # Loaded chunk for reads: frame -> (imgsz, rows)
+        self._read_chunk_id = None
+        self._read_frames: Dict[int, Tuple[int, np.ndarray]] = {}
+        # Pending chunk for writes
+        self._write_chunk_id = None
+        self._write_frames: Dict[int, Tuple[int, np.ndarray]] = {}
+
+    @classmethod
+    def for_analyzer(cls, root: str, video_path: str, weights: str, analyzer,
+                     chunk_frames: int = 256) -> "DetectionCache":
+        """Cache keyed on a CrowdAnalyzer's own inference settings."""
+        return cls(root, video_path, weights, analyzer.conf_threshold, analyzer.iou_threshold,
+                   chunk_frames=chunk_frames, max_det=analyzer.max_det, tile_mode=analyzer.tile_mode,
+                   tile_size=analyzer.tile_size, tile_overlap=analyzer.tile_overlap,
+                   guide_imgsz=analyzer.guide_imgsz)
+
+    def _chunk_path(self, chunk_id: int) -> Path:
+        return self.dir / f"chunk_{chunk_id:06d}.npz"
+
+    def _load_chunk(self, chunk_id: int) -> Dict[int, Tuple[int, np.ndarray]]:
+        path = self._chunk_path(chunk_id)
+        if not path.exists():
+            return {}
+        with np.load(path) as npz:
+            frames, imgsz, offsets, data = npz["frames"], npz["imgsz"], npz["offsets"], npz["data"]
+        return {int(f): (int(s), data[offsets[i]:offsets[i + 1]])
+                for i, (f, s) in enumerate(zip(frames, imgsz))}
+
+    def get(self, frame_idx: int, imgsz: int) -> Optional[DetectionBatch]:
+        """Raw detections for a frame inferred at imgsz, or None on a miss."""
+        chunk_id = frame_idx // self.chunk_frames
+        if chunk_id == self._write_chunk_id and frame_idx in self._write_frames:
+            entry = self._write_frames[frame_idx]
+        else:
+            if chunk_id != self._read_chunk_id:
+                self._read_frames = self._load_chunk(chunk_id)
+                self._read_chunk_id = chunk_id
+            entry = self._read_frames.get(frame_idx)
+        if entry is None or entry[0] != int(imgsz):
+            self.misses += 1
+            return None
+        self.hits += 1
+        rows = entry[1]
+        return DetectionBatch(xyxy=rows[:, :4], cls=rows[:, 5].astype(np.int64), conf=rows[:, 4])
+
+    def put(self, frame_idx: int, imgsz: int, raw: DetectionBatch) -> None:
+        """Record the raw detections of a frame; chunks are written when the run moves on."""
+        chunk_id = frame_idx // self.chunk_frames
+        if self._write_chunk_id is not None and chunk_id != self._write_chunk_id:
+            self.flush()
+        self._write_chunk_id = chunk_id
+        rows = np.empty((len(raw), 6), dtype=np.float32)
+        rows[:, :4] = raw.xyxy
+        rows[:, 4] = raw.conf
+        rows[:, 5] = raw.cls
+        self._write_frames[frame_idx] = (int(imgsz), rows)
+
+    def flush(self) -> None:
+        """Merge pending frames into their chunk file (atomic replace)."""
+        if not self._write_frames:
+            return
+        chunk_id = self._write_chunk_id
+        merged = self._load_chunk(chunk_id)
+        merged.update(self._write_frames)
+        frames = np.array(sorted(merged), dtype=np.int64)
+        imgsz = np.array([merged[f][0] for f in frames], dtype=np.int32)
+        lengths = np.array([len(merged[f][1]) for f in frames], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        data = np.concatenate([merged[f][1] for f in frames]) if len(frames) else np.zeros((0, 6), np.float32)
+
+        path = self._chunk_path(chunk_id)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, frames=frames, imgsz=imgsz, offsets=offsets, data=data)
+        os.replace(tmp, path)
+        if self._read_chunk_id == chunk_id:
+            self._read_chunk_id = None
+        self._write_frames = {}
+        self._write_chunk_id = None
+
+    def close(self) -> None:
+        self.flush()
+        total = self.hits + self.misses
+        if total:
+            logger.info(f"Detection cache {self.key}: {self.hits}/{total} frames served from disk")
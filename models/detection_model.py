@@ -1,15 +1,16 @@
-from ultralytics import YOLO
 import numpy as np
 import cv2
-import torch
 import argparse
 import csv
-import math
 import time
 from collections import deque
 import json
+import os
 from datetime import datetime
 
+from .detections import DetectionBatch
+from .preprocess import Letterbox, scale_boxes
+
 class CrowdAnalyzer:
     def __init__(self,  # Fix: Changed from _init_ to __init__
                  yolo_weights,
@@ -39,21 +40,19 @@ class CrowdAnalyzer:
                  hough_max_radius_scale=0.4,
                  nms_mode="distance",
                  nms_iou=0.3,
-                 count_mode="heads"):
-        # Device/setup
-        self.device = "cuda" if device == "cuda" and torch.cuda.is_available() else "cpu"
-        try:
-            self.model = YOLO(yolo_weights)
-            if self.device == "cuda":
-                self.model.to("cuda")
-                torch.backends.cudnn.benchmark = True
-            # Fuse for faster inference where supported
-            try:
-                self.model.fuse()
-            except Exception:
-                pass
-        except Exception as e:
-            raise RuntimeError(f"Failed to load YOLO model: {e}")
+                 count_mode="heads",
+                 detection_cache=None,
+                 fast_path=True,
+                 tile_mode="off",
+                 tile_size=960,
+                 tile_overlap=0.2,
+                 guide_imgsz=640):
+        if yolo_weights is None:
+            # Postprocess-only instance: raw detections come from elsewhere (caches, sweeps)
+            self.device = "cpu"
+            self.model = None
+        else:
+            self._load_model(yolo_weights, device)
 
         # Config
         self.min_head_radius = min_head_radius
@@ -81,46 +80,79 @@ class CrowdAnalyzer:
         self.nms_mode = nms_mode
         self.nms_iou = float(nms_iou)
         self.count_mode = count_mode if count_mode in ("heads", "persons") else "heads"
+        # Optional DetectionCache: raw outputs are replayed from disk when the key matches
+        self.detection_cache = detection_cache
+        # Direct-network inference with preallocated letterbox buffers (see _infer_direct);
+        # set up and checked against predict() on the first frame
+        self.fast_path = bool(fast_path) and self.model is not None
+        self._fast = None
+        # Tiled mode for high-resolution frames: "off", "full" (every tile) or
+        # "guided" (only tiles around candidates from a downscaled pass)
+        self.tile_mode = tile_mode if tile_mode in ("off", "full", "guided") else "off"
+        self.tile_size = int(tile_size)
+        self.tile_overlap = float(tile_overlap)
+        self.guide_imgsz = int(guide_imgsz)
+        self.last_tile_stats = {}
 
         # State
         self.frame_counter = 0
         self.count_history = deque(maxlen=30)  # smoothing
         self._last_infer_end_ts = None
+        self.last_detections = DetectionBatch()
+        self._alert_active = False
+
+    def _load_model(self, yolo_weights, device):
+        """Load YOLO weights on the requested device."""
+        # Heavy frameworks load here rather than at module import
+        import torch
+        from ultralytics import YOLO
+
+        # Device/setup
+        self.device = "cuda" if device == "cuda" and torch.cuda.is_available() else "cpu"
+        try:
+            self.model = YOLO(yolo_weights)
+            if self.device == "cuda":
+                self.model.to("cuda")
+                torch.backends.cudnn.benchmark = True
+            # Fuse for faster inference where supported
+            try:
+                self.model.fuse()
+            except Exception:
+                pass
+        except Exception as e:
+            raise RuntimeError(f"Failed to load YOLO model: {e}")
+
+    @staticmethod
+    def _greedy_suppress(suppress: np.ndarray) -> np.ndarray:
+        """Greedy NMS over a precomputed (M, M) suppression matrix in priority order."""
+        keep = np.ones(len(suppress), dtype=bool)
+        for i in range(len(suppress)):
+            if keep[i]:
+                keep[i + 1:] &= ~suppress[i, i + 1:]
+        return keep
 
     def _nms_circles_area(self, circles, iou_thresh: float):
         """Area-based NMS for circles using IoU of circle overlap."""
-        if not circles:
-            return []
-        circles_sorted = sorted(circles, key=lambda c: c[2], reverse=True)
-        kept = []
-
-        def circle_iou(c1, c2):
-            x1, y1, r1 = c1
-            x2, y2, r2 = c2
-            d = math.hypot(x1 - x2, y1 - y2)
-            if d >= r1 + r2:
-                return 0.0
-            if d <= abs(r1 - r2):
-                inter = math.pi * min(r1, r2) ** 2
-            else:
-                # ✅ FIXED: Proper exponentiation
-                alpha = math.acos((r1*2 + d2 - r2*2) / (2 * r1 * d))
-                beta = math.acos((r2*2 + d2 - r1*2) / (2 * r2 * d))
-                inter = r1*2 * alpha + r2*2 * beta - 0.5 * math.sqrt(
-                    max(0.0, (-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2))
-                )
-            union = math.pi * r1*2 + math.pi * r2*2 - inter
-            return inter / union if union > 0 else 0.0
-
-        for c in circles_sorted:
-            keep = True
-            for k in kept:
-                if circle_iou(c, k) > iou_thresh:
-                    keep = False
-                    break
-            if keep:
-                kept.append(c)
-        return kept
+        circles = np.asarray(circles, dtype=np.int32).reshape(-1, 3)
+        if len(circles) == 0:
+            return circles
+        circles = circles[np.argsort(-circles[:, 2], kind="stable")]
+        c = circles.astype(np.float64)
+        r1, r2 = c[:, None, 2], c[None, :, 2]
+        d = np.hypot(c[:, None, 0] - c[None, :, 0], c[:, None, 1] - c[None, :, 1])
+
+        # Lens area of two intersecting circles; contained / disjoint cases patched below
+        with np.errstate(divide="ignore", invalid="ignore"):
+            alpha = np.arccos(np.clip((d ** 2 + r1 ** 2 - r2 ** 2) / (2 * d * r1), -1.0, 1.0))
+            beta = np.arccos(np.clip((d ** 2 + r2 ** 2 - r1 ** 2) / (2 * d * r2), -1.0, 1.0))
+            lens = r1 ** 2 * alpha + r2 ** 2 * beta - 0.5 * np.sqrt(
+                np.clip((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2), 0.0, None)
+            )
+        inter = np.where(d <= np.abs(r1 - r2), np.pi * np.minimum(r1, r2) ** 2, lens)
+        inter = np.where(d >= r1 + r2, 0.0, inter)
+        union = np.pi * r1 ** 2 + np.pi * r2 ** 2 - inter
+        iou = np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+        return circles[self._greedy_suppress(iou > iou_thresh)]
 
     def _refine_head_with_hough(self, frame_bgr, bbox):
         """Refine head center within top region of bbox using HoughCircles."""
@@ -163,52 +195,107 @@ class CrowdAnalyzer:
                 best = (gcx, gcy, int(r))
         return best
 
-    def _body_to_circular_head(self, bbox, frame_shape):
-        """Estimate head circle from person bounding box"""
-        x1, y1, x2, y2 = bbox
+    def _body_to_circular_heads(self, xyxy, top_ratios, frame_shape):
+        """Estimate head circles (M, 3) from integer person boxes (M, 4)"""
+        x1, y1, x2, y2 = xyxy.T
         body_height = y2 - y1
         body_width = x2 - x1
 
         # Approximate head position near top of body
         head_center_x = (x1 + x2) // 2
-        head_center_y = y1 + int(body_height * self.head_top_ratio)
+        head_center_y = y1 + (body_height * top_ratios).astype(np.int64)
 
         # Clamp inside frame
-        head_center_x = max(0, min(head_center_x, frame_shape[1] - 1))
-        head_center_y = max(0, min(head_center_y, frame_shape[0] - 1))
+        head_center_x = np.clip(head_center_x, 0, frame_shape[1] - 1)
+        head_center_y = np.clip(head_center_y, 0, frame_shape[0] - 1)
 
         # Estimate radius
-        head_radius = max(
+        head_radius = np.maximum(
             self.min_head_radius,
-            min(int(min(body_width, body_height) * self.head_radius_scale), self.max_head_radius)
+            np.minimum((np.minimum(body_width, body_height) * self.head_radius_scale).astype(np.int64),
+                       self.max_head_radius)
         )
-        return (head_center_x, head_center_y, head_radius)
+        return np.stack([head_center_x, head_center_y, head_radius], axis=1).astype(np.int32)
 
     def _filter_overlapping_circles(self, circles, factor=None):
         """Greedy NMS over head circles based on center distance.
         Keeps larger circles first and removes neighbors within a fraction of min radius.
         """
-        if not circles:
-            return []
-        # Sort by radius descending
-        circles_sorted = sorted(circles, key=lambda c: c[2], reverse=True)
-        kept = []
+        circles = np.asarray(circles, dtype=np.int32).reshape(-1, 3)
+        if len(circles) == 0:
+            return circles
+        # Sort by radius descending (stable, so ties keep detection order)
+        circles = circles[np.argsort(-circles[:, 2], kind="stable")]
         eff_factor = factor if factor is not None else self.circle_nms_factor
-        for cx, cy, r in circles_sorted:
-            keep = True
-            for kx, ky, kr in kept:
-                dist = math.hypot(cx - kx, cy - ky)
-                min_r = min(r, kr)
-                if dist < min_r * eff_factor:
-                    keep = False
-                    break
-            if keep:
-                kept.append((cx, cy, r))
-        return kept
+        c = circles.astype(np.float64)
+        dist = np.hypot(c[:, None, 0] - c[None, :, 0], c[:, None, 1] - c[None, :, 1])
+        min_r = np.minimum(c[:, None, 2], c[None, :, 2])
+        return circles[self._greedy_suppress(dist < min_r * eff_factor)]
+
+    def _setup_fast_path(self):
+        """Network, letterbox and input tensors for _infer_direct; None for non-PyTorch weights."""
+        import torch
+
+        net = getattr(self.model, "model", None)
+        if not isinstance(net, torch.nn.Module):
+            return None
+        half = self.device == "cuda"
+        net = net.to(self.device).eval()
+        net = net.half() if half else net.float()
+        stride = int(max(net.stride)) if hasattr(net, "stride") else 32
+        return {"net": net, "dtype": torch.float16 if half else torch.float32,
+                "letterbox": Letterbox(stride), "inputs": {}}
+
+    def _decode(self, preds, input_shape, frame_shape) -> DetectionBatch:
+        """Person boxes from raw network output, mirroring ultralytics' best-class NMS."""
+        import torch
+        import torchvision
+
+        if isinstance(preds, (list, tuple)):
+            preds = preds[0]
+        x = preds[0].transpose(0, 1)  # (anchors, 4 + nc)
+        conf, j = x[:, 4:].max(1)
+        # Best class must be person and above the threshold, as predict(classes=[0]) keeps
+        person = (conf > self.conf_threshold) & (j == 0)
+        x, conf = x[person], conf[person]
+        if len(x) == 0:
+            return DetectionBatch()
+        xy, wh = x[:, :2], x[:, 2:4] / 2
+        boxes = torch.cat((xy - wh, xy + wh), 1).float()
+        scores = conf.float()
+        if len(scores) > 30000:
+            order = scores.argsort(descending=True)[:30000]
+            boxes, scores = boxes[order], scores[order]
+        keep = torchvision.ops.nms(boxes, scores, self.iou_threshold)[:self.max_det]
+        scores = scores[keep, None]
+        data = torch.cat((boxes[keep], scores, torch.zeros_like(scores)), 1)
+        data = data.cpu().numpy()  # single device->host transfer
+        scale_boxes(data[:, :4], input_shape, frame_shape)
+        return DetectionBatch(xyxy=data[:, :4], cls=data[:, 5].astype(np.int64), conf=data[:, 4])
+
+    def _infer_direct(self, frame_bgr) -> DetectionBatch:
+        """Letterbox into reusable buffers and call the network directly, bypassing predict()."""
+        import torch
+
+        fast = self._fast
+        imgsz = fast["letterbox"].check_imgsz(self.imgsz)
+        rgb, _ = fast["letterbox"](frame_bgr, imgsz)
+        key = (frame_bgr.shape[:2], imgsz)
+        entry = fast["inputs"].get(key)
+        if entry is None:
+            host = torch.from_numpy(rgb).permute(2, 0, 1).unsqueeze(0)  # shares the letterbox buffer
+            entry = fast["inputs"][key] = (host, torch.empty(host.shape, dtype=fast["dtype"], device=self.device))
+        host, inp = entry
+        inp.copy_(host)  # uint8 -> float on the device
+        inp.div_(255)
+        with torch.inference_mode():
+            preds = fast["net"](inp)
+            return self._decode(preds, rgb.shape[:2], frame_bgr.shape[:2])
+
+    def _infer_predict(self, frame_bgr) -> DetectionBatch:
+        """Raw detections through ultralytics predict()."""
+        import torch
 
-    def detect_circular_heads(self, frame_bgr):
-        """Run YOLO, detect people, convert to head circles. Returns (circles, boxes)."""
-        infer_start = time.time()
         with torch.inference_mode():  # ✅ FIXED: Proper context manager
             results = self.model.predict(
                 frame_bgr,
@@ -221,45 +308,170 @@ class CrowdAnalyzer:
                 half=(self.device == "cuda"),
                 verbose=False,
             )
+        if results and len(results) > 0:
+            return DetectionBatch.from_yolo(results[0])
+        return DetectionBatch()
+
+    def _check_fast_path(self, frame_bgr):
+        """Keep the direct path only if it reproduces predict() on this frame."""
+        reference = self._infer_predict(frame_bgr)
+        direct = self._infer_direct(frame_bgr)
+        same = (len(direct) == len(reference)
+                and np.allclose(direct.xyxy, reference.xyxy, atol=1e-3)
+                and np.allclose(direct.conf, reference.conf, atol=1e-5))
+        if not same:
+            print("Direct inference path disagrees with predict(); falling back to predict()")
+            self.fast_path = False
+        return reference
+
+    @staticmethod
+    def _tile_origins(length: int, tile: int, overlap: float) -> np.ndarray:
+        """Evenly stepped tile origins along one axis; the last tile ends at the border."""
+        if length <= tile:
+            return np.zeros(1, dtype=np.int64)
+        step = max(1, int(tile * (1.0 - overlap)))
+        n = int(np.ceil((length - tile) / step)) + 1
+        return np.unique(np.minimum(np.arange(n) * step, length - tile))
+
+    def _tile_grid(self, frame_shape) -> np.ndarray:
+        """Overlapping native-resolution tiles (T, 4) as x0, y0, x1, y1."""
+        h, w = int(frame_shape[0]), int(frame_shape[1])
+        ys = self._tile_origins(h, self.tile_size, self.tile_overlap)
+        xs = self._tile_origins(w, self.tile_size, self.tile_overlap)
+        x0, y0 = np.meshgrid(xs, ys)
+        x0, y0 = x0.ravel(), y0.ravel()
+        return np.stack([x0, y0, np.minimum(x0 + self.tile_size, w), np.minimum(y0 + self.tile_size, h)], axis=1)
+
+    @staticmethod
+    def _box_overlaps(xyxy: np.ndarray):
+        """Pairwise IoU and intersection-over-smaller-box matrices."""
+        b = xyxy.astype(np.float64)
+        area = np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+        iw = np.clip(np.minimum(b[:, None, 2], b[None, :, 2]) - np.maximum(b[:, None, 0], b[None, :, 0]), 0, None)
+        ih = np.clip(np.minimum(b[:, None, 3], b[None, :, 3]) - np.maximum(b[:, None, 1], b[None, :, 1]), 0, None)
+        inter = iw * ih
+        union = area[:, None] + area[None, :] - inter
+        iou = np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+        smaller = np.minimum(area[:, None], area[None, :])
+        ios = np.where(smaller > 0, inter / np.where(smaller > 0, smaller, 1.0), 0.0)
+        return iou, ios
+
+    def _merge_tiles(self, raw: DetectionBatch, at_seam: np.ndarray) -> DetectionBatch:
+        """
+        NMS across tiles, best confidence first. Besides the usual IoU test, a box cut
+        by a tile seam is dropped when it lies mostly inside a more confident box.
+        """
+        if len(raw) == 0:
+            return raw
+        order = np.argsort(-raw.conf, kind="stable")
+        raw, at_seam = raw.select(order), at_seam[order]
+        iou, ios = self._box_overlaps(raw.xyxy)
+        suppress = (iou > self.iou_threshold) | ((ios > 0.7) & (at_seam[:, None] | at_seam[None, :]))
+        keep = np.flatnonzero(self._greedy_suppress(suppress))[:self.max_det]
+        return raw.select(keep)
+
+    def _infer_tiled(self, frame_bgr) -> DetectionBatch:
+        """Native-resolution overlapping tiles in one batch, merged across seams."""
+        import torch
+
+        h, w = frame_bgr.shape[:2]
+        tiles = self._tile_grid((h, w))
+        total = len(tiles)
+        guide = None
+        if self.tile_mode == "guided":
+            imgsz, self.imgsz = self.imgsz, self.guide_imgsz
+            guide = self._infer_predict(frame_bgr)
+            self.imgsz = imgsz
+            # Tiles touching a candidate, grown by the candidate's own size to catch neighbours
+            b = guide.xyxy.astype(np.float64)
+            size = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1])[:, None]
+            grown = np.concatenate([b[:, :2] - size, b[:, 2:] + size], axis=1)
+            hit = ((tiles[:, None, 0] < grown[None, :, 2]) & (tiles[:, None, 2] > grown[None, :, 0])
+                   & (tiles[:, None, 1] < grown[None, :, 3]) & (tiles[:, None, 3] > grown[None, :, 1]))
+            tiles = tiles[hit.any(axis=1)]
+        self.last_tile_stats = {"tiles": int(len(tiles)), "total_tiles": int(total)}
+
+        parts, seams = [], []
+        if guide is not None and len(guide):
+            parts.append(guide)
+            seams.append(np.zeros(len(guide), dtype=bool))
+        if len(tiles):
+            crops = [frame_bgr[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles.tolist()]
+            with torch.inference_mode():
+                results = self.model.predict(
+                    crops,
+                    device=self.device,
+                    conf=self.conf_threshold,
+                    iou=self.iou_threshold,
+                    imgsz=self.tile_size,
+                    classes=[0],  # person
+                    max_det=self.max_det,
+                    half=(self.device == "cuda"),
+                    verbose=False,
+                )
+            for (x0, y0, x1, y1), result in zip(tiles.tolist(), results):
+                batch = DetectionBatch.from_yolo(result)
+                if len(batch) == 0:
+                    continue
+                xyxy = batch.xyxy + np.array([x0, y0, x0, y0], dtype=batch.xyxy.dtype)
+                # Box edges on an inner tile border (not the frame border) mark a cut person
+                m = 2.0
+                at_seam = (((xyxy[:, 0] <= x0 + m) & (x0 > 0)) | ((xyxy[:, 2] >= x1 - m) & (x1 < w))
+                           | ((xyxy[:, 1] <= y0 + m) & (y0 > 0)) | ((xyxy[:, 3] >= y1 - m) & (y1 < h)))
+                parts.append(DetectionBatch(xyxy, batch.cls, batch.conf))
+                seams.append(at_seam)
+        if not parts:
+            return DetectionBatch()
+        merged = DetectionBatch(np.concatenate([p.xyxy for p in parts]),
+                                np.concatenate([p.cls for p in parts]),
+                                np.concatenate([p.conf for p in parts]))
+        return self._merge_tiles(merged, np.concatenate(seams))
+
+    def _infer(self, frame_bgr):
+        """Run YOLO on one frame and return the raw detections as a DetectionBatch."""
+        if self.tile_mode != "off":
+            # Tile size is fixed; adaptive imgsz does not apply
+            return self._infer_tiled(frame_bgr)
+        infer_start = time.time()
+        if self.fast_path and self._fast is None:
+            self._fast = self._setup_fast_path()
+            if self._fast is None:
+                self.fast_path = False
+                raw = self._infer_predict(frame_bgr)
+            else:
+                raw = self._check_fast_path(frame_bgr)
+        elif self.fast_path:
+            raw = self._infer_direct(frame_bgr)
+        else:
+            raw = self._infer_predict(frame_bgr)
         infer_end = time.time()
         self._last_infer_end_ts = infer_end
-
-        circles = []
-        boxes = []
-        if results and len(results) > 0:
-            r = results[0]
-            if hasattr(r, "boxes") and r.boxes is not None and len(r.boxes) > 0:
-                xyxy = r.boxes.xyxy.cpu().numpy()
-                cls_ids = r.boxes.cls.cpu().numpy()
-
-                for i, box in enumerate(xyxy):
-                    if int(cls_ids[i]) == 0:  # person class
-                        x1, y1, x2, y2 = box.astype(int)
-                        area = max(0, (x2 - x1)) * max(0, (y2 - y1))
-                        if area < self.min_bbox_area:
-                            continue
-                        boxes.append((x1, y1, x2, y2))
-                        # Aspect-ratio aware head placement
-                        body_h = max(1, y2 - y1)
-                        body_w = max(1, x2 - x1)
-                        aspect = body_h / body_w
-                        # Adjust top ratio for very tall vs. squat boxes
-                        if aspect >= 2.0:
-                            adj_ratio = max(0.12, min(0.20, self.head_top_ratio * 0.9))
-                        elif aspect <= 1.2:
-                            adj_ratio = min(0.26, max(0.16, self.head_top_ratio * 1.2))
-                        else:
-                            adj_ratio = self.head_top_ratio
-                        orig_ratio = self.head_top_ratio
-                        self.head_top_ratio = adj_ratio
-                        circle = None
-                        if self.enable_refine:
-                            circle = self._refine_head_with_hough(frame_bgr, (x1, y1, x2, y2))
-                        if circle is None:
-                            circle = self._body_to_circular_head((x1, y1, x2, y2), frame_bgr.shape)
-                        self.head_top_ratio = orig_ratio
-                        if circle:
-                            circles.append(circle)
+        self._adapt_imgsz(infer_start, infer_end)
+        return raw
+
+    def postprocess(self, frame_bgr, raw: DetectionBatch) -> DetectionBatch:
+        """Filter person boxes and convert them to de-duplicated head circles."""
+        xyxy = raw.xyxy.astype(int)
+        x1, y1, x2, y2 = xyxy.T
+        area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        mask = (raw.cls == 0) & (area >= self.min_bbox_area)  # person class
+        batch = DetectionBatch(xyxy[mask], raw.cls[mask], raw.conf[mask])
+        boxes = batch.xyxy
+
+        # Aspect-ratio aware head placement: adjust top ratio for very tall vs. squat boxes
+        body_h = np.maximum(1, boxes[:, 3] - boxes[:, 1])
+        body_w = np.maximum(1, boxes[:, 2] - boxes[:, 0])
+        aspect = body_h / body_w
+        top_ratios = np.where(
+            aspect >= 2.0, max(0.12, min(0.20, self.head_top_ratio * 0.9)),
+            np.where(aspect <= 1.2, min(0.26, max(0.16, self.head_top_ratio * 1.2)), self.head_top_ratio)
+        )
+        circles = self._body_to_circular_heads(boxes, top_ratios, frame_bgr.shape)
+        if self.enable_refine:
+            for i, box in enumerate(boxes.tolist()):
+                refined = self._refine_head_with_hough(frame_bgr, box)
+                if refined is not None:
+                    circles[i] = refined
 
         # Dynamic NMS factor: more suppression when many candidates
         if self.nms_mode == "area":
@@ -271,8 +483,11 @@ class CrowdAnalyzer:
             elif len(circles) > 60:
                 dynamic_factor = max(0.85, self.circle_nms_factor) * 1.1
             circles = self._filter_overlapping_circles(circles, factor=dynamic_factor)
+        batch.circles = circles
+        return batch
 
-        # Adaptive imgsz to hit target FPS
+    def _adapt_imgsz(self, infer_start, infer_end):
+        """Adaptive imgsz to hit target FPS"""
         if self.adaptive and self._last_infer_end_ts is not None:
             infer_ms = (infer_end - infer_start) * 1000.0
             if infer_ms > 0:
@@ -281,31 +496,56 @@ class CrowdAnalyzer:
                     self.imgsz = max(self.min_imgsz, self.imgsz - 64)
                 elif current_fps > self.target_fps * 1.2 and self.imgsz < self.max_imgsz:
                     self.imgsz = min(self.max_imgsz, self.imgsz + 64)
-        return circles, boxes
 
-    def analyze_frame(self, frame_bgr, threshold=50, visualize=True):
+    def raw_detections(self, frame_bgr, frame_idx=None) -> DetectionBatch:
+        """Raw YOLO detections for a frame, replayed from the detection cache when possible."""
+        cache = self.detection_cache
+        if cache is None or frame_idx is None:
+            return self._infer(frame_bgr)
+        # Key on the imgsz the frame is about to be inferred at; a hit skips inference
+        imgsz = self.imgsz
+        raw = cache.get(frame_idx, imgsz)
+        if raw is None:
+            raw = self._infer(frame_bgr)
+            cache.put(frame_idx, imgsz, raw)
+        return raw
+
+    def detect(self, frame_bgr, frame_idx=None) -> DetectionBatch:
+        """Run YOLO, detect people, convert to head circles, all as arrays."""
+        return self.postprocess(frame_bgr, self.raw_detections(frame_bgr, frame_idx))
+
+    def detect_circular_heads(self, frame_bgr):
+        """Run YOLO, detect people, convert to head circles. Returns (circles, boxes) as lists."""
+        batch = self.detect(frame_bgr)
+        return batch.circles_list(), batch.boxes_list()
+
+    def analyze_frame(self, frame_bgr, threshold=9, visualize=True):
         """Main loop: detect heads, smooth count, visualize"""
         self.frame_counter += 1
-        circles, boxes = self.detect_circular_heads(frame_bgr)
+        batch = self.detect(frame_bgr, frame_idx=self.frame_counter)
+        self.last_detections = batch
 
-        head_count = len(circles)
+        head_count = len(batch.circles)
         if self.count_mode == "persons":
-            head_count = len(boxes)
+            head_count = len(batch)
         self.count_history.append(head_count)
         avg_count = int(sum(self.count_history) / len(self.count_history))
 
-        alert_triggered = head_count >= 9
-        if alert_triggered:
+        alert_triggered = head_count >= threshold
+        # Report only the transition into the alert state, not every frame above it
+        if alert_triggered and not self._alert_active:
             print(f"[ALERT] Frame {self.frame_counter}: High crowd detected ({avg_count})")
+        self._alert_active = alert_triggered
 
         if visualize:
             display_frame = frame_bgr.copy()
             if self.count_mode == "persons":
-                for idx, (x1, y1, x2, y2) in enumerate(boxes, 1):
+                for idx, (x1, y1, x2, y2) in enumerate(batch.xyxy.tolist(), 1):
                     cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
                     cv2.putText(display_frame, str(idx), (x1, max(0, y1 - 5)),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
             else:
+                circles = batch.circles.tolist()
                 if head_count < 100:
                     for idx, (cx, cy, r) in enumerate(circles, 1):
                         cv2.circle(display_frame, (cx, cy), r, (0, 255, 0), 2)
@@ -350,11 +590,11 @@ class CrowdAnalyzer:
             json.dump(data, f, indent=2)
         return data
 
-    def __call__(self, frame, device=None, classes=None):
+    def __call__(self, frame, device=None, classes=None, **kwargs):
         """Make the class callable for detection"""
         if device is None:
             device = self.device
-        return self.model(frame, device=device, classes=classes)
+        return self.model(frame, device=device, classes=classes, **kwargs)
 
 
 def main():
@@ -364,16 +604,26 @@ def main():
     parser.add_argument("--device", default="cuda", choices=["cpu", "cuda"], help="Inference device")
     parser.add_argument("--count-mode", default="persons", choices=["persons", "heads"], help="Counting mode")
     parser.add_argument("--threshold", type=int, default=9, help="Crowd alert threshold")
+    parser.add_argument("--tile-mode", default="off", choices=["off", "full", "guided"],
+                        help="Native-resolution tiled inference for high-resolution cameras")
+    parser.add_argument("--cache-dir", help="Cache raw detections here and replay them on re-runs (video files only)")
     args = parser.parse_args()
     
     cap = None  # Initialize cap in broader scope
+    cache = None
     
     try:
         analyzer = CrowdAnalyzer(
             yolo_weights=args.weights,
             device=args.device,
-            count_mode=args.count_mode
+            count_mode=args.count_mode,
+            tile_mode=args.tile_mode
         )
+        if args.cache_dir and os.path.isfile(args.source):
+            from .detection_cache import DetectionCache
+
+            cache = DetectionCache.for_analyzer(args.cache_dir, args.source, args.weights, analyzer)
+            analyzer.detection_cache = cache
         
         cap = cv2.VideoCapture(args.source)
         if not cap.isOpened():
@@ -400,6 +650,8 @@ def main():
     except Exception as e:
         print(f"Error: {str(e)}")
     finally:
+        if cache is not None:
+            cache.close()
         if cap is not None:
             cap.release()
         cv2.destroyAllWindows()
@@ -0,0 +1,94 @@
+"""
+models/detections.py
+
+Compact array-backed detection records.
+
+- DetectionBatch holds one frame's detections as parallel NumPy arrays
+  (xyxy boxes, class ids, confidences, head circles) instead of lists of
+  tuples, dicts and JSON strings.
+- Built from a YOLO result with a single device->host transfer whose
+  columns are sliced as views.
+- Vectorized helpers for filtering, head centers and bulk serialization.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class DetectionBatch:
+    """Detections of one frame as arrays: xyxy (N, 4), cls (N,), conf (N,), circles (M, 3)."""
+
+    __slots__ = ("xyxy", "cls", "conf", "circles")
+
+    def __init__(self,
+                 xyxy: Optional[np.ndarray] = None,
+                 cls: Optional[np.ndarray] = None,
+                 conf: Optional[np.ndarray] = None,
+                 circles: Optional[np.ndarray] = None):
+        self.xyxy = np.zeros((0, 4), dtype=np.float32) if xyxy is None else xyxy
+        n = len(self.xyxy)
+        self.cls = np.zeros(n, dtype=np.int64) if cls is None else cls
+        self.conf = np.ones(n, dtype=np.float32) if conf is None else conf
+        self.circles = np.zeros((0, 3), dtype=np.int32) if circles is None else circles
+
+    @classmethod
+    def from_yolo(cls, result: Any) -> "DetectionBatch":
+        """
+        Wrap an ultralytics Results object. boxes.data is (N, 6) =
+        [x1, y1, x2, y2, conf, cls]; it is moved to host once and the
+        returned arrays are views into that buffer.
+        """
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            return cls()
+        data = boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()
+        data = np.asarray(data)
+        return cls(xyxy=data[:, :4], cls=data[:, 5].astype(np.int64), conf=data[:, 4])
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+    def __repr__(self) -> str:
+        return f"DetectionBatch(boxes={len(self.xyxy)}, circles={len(self.circles)})"
+
+    def select(self, mask: np.ndarray) -> "DetectionBatch":
+        """Subset of the boxes (boolean mask or indices); circles are kept as is."""
+        return DetectionBatch(self.xyxy[mask], self.cls[mask], self.conf[mask], self.circles)
+
+    def areas(self) -> np.ndarray:
+        wh = np.clip(self.xyxy[:, 2:4] - self.xyxy[:, 0:2], 0, None)
+        return wh[:, 0] * wh[:, 1]
+
+    def centers(self, top_ratio: float = 0.5) -> np.ndarray:
+        """
+        Head centers (M, 2) from circles. Without circles, one point per box at
+        top_ratio of its height (0.5 = box center, CrowdAnalyzer.head_top_ratio = head).
+        """
+        if len(self.circles):
+            return self.circles[:, :2]
+        x = (self.xyxy[:, 0] + self.xyxy[:, 2]) / 2.0
+        y = self.xyxy[:, 1] + (self.xyxy[:, 3] - self.xyxy[:, 1]) * top_ratio
+        return np.stack([x, y], axis=1)
+
+    def boxes_list(self) -> List[Tuple[int, int, int, int]]:
+        """Boxes as a list of int tuples (for code that still expects lists)."""
+        return [tuple(b) for b in self.xyxy.astype(int).tolist()]
+
+    def circles_list(self) -> List[Tuple[int, int, int]]:
+        return [tuple(c) for c in self.circles.astype(int).tolist()]
+
+    def to_dict(self) -> Dict[str, list]:
+        """Bulk conversion of all arrays to JSON-ready lists."""
+        return {
+            "boxes": self.xyxy.astype(int).tolist(),
+            "conf": np.round(self.conf.astype(np.float64), 3).tolist(),
+            "circles": self.circles.astype(int).tolist(),
+        }
+
+    def to_json(self) -> str:
+        """Boxes as a JSON list of [x1, y1, x2, y2], matching CSVLogger.log_detection."""
+        return json.dumps(self.xyxy.astype(int).tolist())
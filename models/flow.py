@@ -0,0 +1,132 @@
+"""
+models/flow.py
+
+Sparse optical-flow crowd velocity and direction for a camera.
+
+- Only the head centers of the previous frame are tracked, with pyramidal
+  Lucas-Kanade (cv2.calcOpticalFlowPyrLK) on a downscaled grayscale frame.
+- Each frame is converted and downscaled once; that image is reused as the
+  "previous" image of the next frame. (The Python bindings do not accept
+  prebuilt pyramids for calcOpticalFlowPyrLK, so OpenCV builds the levels.)
+- Velocities (px/s in frame coordinates) are aggregated with NumPy into a
+  mean velocity, speed, coherence and a direction histogram, overall and per
+  zone (via ZoneMap label lookup and np.bincount).
+
+Directions are in image coordinates: 0 deg = moving right, 90 deg = moving
+down. Histogram bin i is centred on i * 360 / n_bins degrees.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FlowEstimator:
+    """Tracks head centers frame to frame and summarizes their motion."""
+
+    def __init__(self,
+                 scale: float = 0.5,
+                 win_size: Tuple[int, int] = (15, 15),
+                 max_level: int = 2,
+                 n_bins: int = 8,
+                 min_speed: float = 5.0,
+                 max_error: float = 30.0):
+        self.scale = float(scale)
+        self.win_size = tuple(win_size)
+        self.max_level = int(max_level)
+        self.n_bins = int(n_bins)
+        self.min_speed = float(min_speed)  # px/s below which a head counts as stationary
+        self.max_error = float(max_error)
+        self._prev_gray = None
+        self._prev_pts = np.zeros((0, 1, 2), dtype=np.float32)
+        self._prev_ts = None
+
+    def _gray(self, frame_bgr: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def track(self, frame_bgr: np.ndarray, centers: np.ndarray,
+              timestamp: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Track the previous frame's centers into this frame, then remember `centers`
+        for the next call. Returns (positions, velocities), both (M, 2) in frame px.
+        Without timestamps, velocities are in px/frame.
+        """
+        gray = self._gray(frame_bgr)
+        positions = np.zeros((0, 2), dtype=np.float64)
+        velocities = np.zeros((0, 2), dtype=np.float64)
+        if self._prev_gray is not None and len(self._prev_pts):
+            next_pts, status, err = cv2.calcOpticalFlowPyrLK(
+                self._prev_gray, gray, self._prev_pts, None,
+                winSize=self.win_size, maxLevel=self.max_level,
+            )
+            ok = (status.ravel() == 1) & (err.ravel() <= self.max_error)
+            prev = self._prev_pts[ok, 0].astype(np.float64) / self.scale
+            curr = next_pts[ok, 0].astype(np.float64) / self.scale
+            dt = 1.0
+            if timestamp is not None and self._prev_ts is not None and timestamp > self._prev_ts:
+                dt = timestamp - self._prev_ts
+            positions, velocities = curr, (curr - prev) / dt
+
+        self._prev_gray = gray
+        self._prev_pts = (np.asarray(centers, dtype=np.float32).reshape(-1, 1, 2) * self.scale)
+        self._prev_ts = timestamp
+        return positions, velocities
+
+    def update(self, frame_bgr: np.ndarray, centers: np.ndarray,
+               timestamp: Optional[float] = None, zone_map=None) -> Dict:
+        """Track one frame and return overall (and per-zone) motion statistics."""
+        positions, velocities = self.track(frame_bgr, centers, timestamp)
+        stats = {"overall": self._summarize(velocities)}
+        if zone_map is not None:
+            stats["zones"] = self._summarize_zones(velocities, zone_map.assign(positions), zone_map.names)
+        return stats
+
+    def _bins(self, velocities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        speed = np.hypot(velocities[:, 0], velocities[:, 1])
+        angle = np.degrees(np.arctan2(velocities[:, 1], velocities[:, 0])) % 360.0
+        bins = np.floor(angle * self.n_bins / 360.0 + 0.5).astype(np.int64) % self.n_bins
+        return speed, bins
+
+    @staticmethod
+    def _stats(n: int, moving: int, sum_v: np.ndarray, sum_speed: float, hist: np.ndarray) -> Dict:
+        if n == 0:
+            return {"tracked": 0, "moving": 0, "mean_speed": 0.0, "mean_velocity": [0.0, 0.0],
+                    "direction_deg": None, "coherence": 0.0, "direction_hist": hist.tolist()}
+        mean_v = sum_v / n
+        mean_speed = sum_speed / n
+        # 1.0 = everyone moving the same way; near 0 = random motion or counter-flow
+        coherence = float(np.hypot(*mean_v) / mean_speed) if mean_speed > 0 else 0.0
+        return {
+            "tracked": int(n),
+            "moving": int(moving),
+            "mean_speed": round(float(mean_speed), 2),
+            "mean_velocity": [round(float(mean_v[0]), 2), round(float(mean_v[1]), 2)],
+            "direction_deg": round(float(np.degrees(np.arctan2(mean_v[1], mean_v[0])) % 360.0), 1),
+            "coherence": round(coherence, 3),
+            "direction_hist": hist.tolist(),
+        }
+
+    def _summarize(self, velocities: np.ndarray) -> Dict:
+        speed, bins = self._bins(velocities)
+        moving = speed >= self.min_speed
+        hist = np.bincount(bins[moving], minlength=self.n_bins)
+        return self._stats(len(velocities), int(moving.sum()), velocities.sum(axis=0), float(speed.sum()), hist)
+
+    def _summarize_zones(self, velocities: np.ndarray, labels: np.ndarray, names) -> Dict[str, Dict]:
+        n_labels = len(names) + 1
+        speed, bins = self._bins(velocities)
+        moving = speed >= self.min_speed
+        counts = np.bincount(labels, minlength=n_labels)
+        moving_counts = np.bincount(labels, weights=moving, minlength=n_labels)
+        sum_vx = np.bincount(labels, weights=velocities[:, 0], minlength=n_labels)
+        sum_vy = np.bincount(labels, weights=velocities[:, 1], minlength=n_labels)
+        sum_speed = np.bincount(labels, weights=speed, minlength=n_labels)
+        hists = np.bincount(labels[moving].astype(np.int64) * self.n_bins + bins[moving],
+                            minlength=n_labels * self.n_bins).reshape(n_labels, self.n_bins)
+        return {name: self._stats(int(counts[z]), int(moving_counts[z]), np.array([sum_vx[z], sum_vy[z]]),
+                                  float(sum_speed[z]), hists[z])
+                for z, name in enumerate(names, 1)}
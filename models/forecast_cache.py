@@ -0,0 +1,134 @@
+"""
+models/forecast_cache.py
+
+Content-addressed memoization for the forecasting functions.
+
+- Keys are a hash of the quantized count window plus the method name and its
+  fully bound parameters, so an unchanged history (empty or static scene)
+  never retrains a model.
+- Bounded in-memory LRU with optional on-disk persistence of predictions.
+- Hit/miss/eviction statistics via ForecastCache.stats().
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("forecast_cache")
+
+
+class ForecastCache:
+    """LRU cache of (model, predictions) keyed by window content and parameters."""
+
+    def __init__(self, max_entries: int = 256, quantum: float = 1.0, cache_dir: Optional[str] = None):
+        self.max_entries = int(max_entries)
+        self.quantum = float(quantum)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: "OrderedDict[str, Tuple[Any, List[float]]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, counts: Sequence[float], method: str, params: Dict) -> str:
+        """Hash of the quantized window, the method and its parameters."""
+        q = np.round(np.asarray(counts, dtype=np.float64) / self.quantum).astype(np.int64)
+        h = hashlib.blake2b(q.tobytes(), digest_size=16)
+        h.update(json.dumps([method, params], sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Any, List[float]]]:
+        """Look up a key in memory, then on disk. Disk hits carry no model object."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        if self.cache_dir is not None:
+            path = self.cache_dir / f"{key}.json"
+            try:
+                with open(path) as f:
+                    entry = (None, json.load(f)["predictions"])
+            except (OSError, ValueError, KeyError):
+                entry = None
+            if entry is not None:
+                self.disk_hits += 1
+                self._store(key, entry)
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, model: Any, predictions: Sequence[float]) -> None:
+        """Insert a result, evicting the least recently used entries past max_entries."""
+        predictions = [float(p) for p in predictions]
+        self._store(key, (model, predictions))
+        if self.cache_dir is not None:
+            path = self.cache_dir / f"{key}.json"
+            tmp = path.with_suffix(".tmp")
+            try:
+                with open(tmp, "w") as f:
+                    json.dump({"predictions": predictions}, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not persist forecast cache entry: {e}")
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+def _forecast_fn(method: str):
+    from .forecasting_model import train_lstm_model, train_linear_model
+
+    return train_lstm_model if method.lower() == "lstm" else train_linear_model
+
+
+def cached_forecast(cache: Optional[ForecastCache], method: str, counts: Sequence[float],
+                    **params) -> Tuple[Any, List[float]]:
+    """
+    Memoized train_lstm_model / train_linear_model.
+    Parameters are bound against the function signature (defaults included)
+    so that explicit and implicit defaults share a cache entry.
+    """
+    fn = _forecast_fn(method)
+    if cache is None:
+        return fn(counts, **params)
+
+    bound = inspect.signature(fn).bind(counts, **params)
+    bound.apply_defaults()
+    # A model passed in for reuse does not change the forecast
+    key_params = {k: v for k, v in bound.arguments.items() if k not in ("history_counts", "model")}
+    key = cache.make_key(counts, method.lower(), key_params)
+
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+    model, predictions = fn(counts, **params)
+    cache.put(key, model, predictions)
+    return model, [float(p) for p in predictions]
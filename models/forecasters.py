@@ -0,0 +1,518 @@
+"""
+models/forecasters.py
+
+Lightweight statistical forecasters and per-camera model selection.
+
+- Plugin registry of forecasters sharing one fit()/predict()/update() interface.
+- EWMA, Holt (optionally damped), additive Holt-Winters and NumPy AR(p).
+- Adapters for the linear and LSTM models in forecasting_model.py.
+- ForecasterSelector backtests the candidates on recent history and routes
+  forecasts to the cheapest one that stays within an error budget, so most
+  cameras never touch TensorFlow at runtime. Cost is the fit + predict time
+  measured during those backtests.
+- rolling_backtest() is the rolling-origin loop shared with models/backtest.py.
+"""
+
+import copy
+import logging
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Type
+
+import numpy as np
+
+logger = logging.getLogger("forecasters")
+
+FORECASTERS: Dict[str, Type["Forecaster"]] = {}
+
+
+def register_forecaster(cls: Type["Forecaster"]) -> Type["Forecaster"]:
+    """Class decorator adding a forecaster to the registry under cls.name."""
+    FORECASTERS[cls.name] = cls
+    return cls
+
+
+def create_forecaster(name: str, **params) -> "Forecaster":
+    """Instantiate a registered forecaster by name."""
+    try:
+        cls = FORECASTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown forecaster '{name}'. Available: {sorted(FORECASTERS)}")
+    return cls(**params)
+
+
+class Forecaster:
+    """
+    Base interface for all forecasters.
+
+    fit(history) resets the state from a full history, update(value) folds in
+    one new observation in O(1) and predict(n_steps) returns the next n_steps.
+    cost is a relative runtime prior, used to rank candidates only until their
+    backtests have been timed.
+    """
+
+    name = "base"
+    cost = 1.0
+    min_history = 1
+    max_steps = None  # longest predict() supported; None for any horizon
+    restorable = True  # fitted state round-trips through get_state()/set_state()
+
+    def fit(self, history: Sequence[float]) -> "Forecaster":
+        raise NotImplementedError
+
+    def update(self, value: float) -> None:
+        raise NotImplementedError
+
+    def predict(self, n_steps: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def params(self) -> Dict:
+        """Constructor parameters, used for cache keys and reporting."""
+        return {}
+
+    def clone(self) -> "Forecaster":
+        """Independent copy (fitted state included) to backtest without disturbing this one."""
+        return copy.deepcopy(self)
+
+    def get_state(self) -> Dict:
+        """Fitted state as JSON-friendly values (deques and arrays become lists)."""
+        state = {}
+        for key, value in vars(self).items():
+            if isinstance(value, deque):
+                state[key] = list(value)
+            elif isinstance(value, np.ndarray):
+                state[key] = value.tolist()
+            elif value is None or isinstance(value, (int, float, str, bool)):
+                state[key] = value
+        return state
+
+    def set_state(self, state: Dict) -> None:
+        for key, value in state.items():
+            current = getattr(self, key, None)
+            if isinstance(current, deque):
+                setattr(self, key, deque(value, maxlen=current.maxlen))
+            elif isinstance(current, np.ndarray):
+                setattr(self, key, np.asarray(value, dtype=current.dtype))
+            else:
+                setattr(self, key, value)
+
+
+@register_forecaster
+class EWMAForecaster(Forecaster):
+    """Exponentially weighted moving average; flat forecast at the current level."""
+
+    name = "ewma"
+    cost = 1.0
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = float(alpha)
+        self.level = None
+
+    def fit(self, history):
+        self.level = None
+        for v in np.asarray(history, dtype=np.float64):
+            self.update(v)
+        return self
+
+    def update(self, value):
+        value = float(value)
+        self.level = value if self.level is None else self.alpha * value + (1 - self.alpha) * self.level
+
+    def predict(self, n_steps):
+        return np.full(n_steps, self.level if self.level is not None else 0.0)
+
+    def params(self):
+        return {"alpha": self.alpha}
+
+
+@register_forecaster
+class HoltForecaster(Forecaster):
+    """Holt's linear trend method with optional trend damping (phi < 1)."""
+
+    name = "holt"
+    cost = 2.0
+    min_history = 2
+
+    def __init__(self, alpha: float = 0.4, beta: float = 0.1, phi: float = 0.95):
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.phi = float(phi)
+        self.level = None
+        self.trend = 0.0
+
+    def fit(self, history):
+        data = np.asarray(history, dtype=np.float64)
+        self.level = None
+        self.trend = 0.0
+        if len(data) >= 2:
+            self.level = data[0]
+            self.trend = data[1] - data[0]
+            data = data[1:]
+        for v in data:
+            self.update(v)
+        return self
+
+    def update(self, value):
+        value = float(value)
+        if self.level is None:
+            self.level = value
+            return
+        prev_level = self.level
+        self.level = self.alpha * value + (1 - self.alpha) * (prev_level + self.phi * self.trend)
+        self.trend = self.beta * (self.level - prev_level) + (1 - self.beta) * self.phi * self.trend
+
+    def predict(self, n_steps):
+        level = self.level if self.level is not None else 0.0
+        damp = np.cumsum(self.phi ** np.arange(1, n_steps + 1))
+        return level + damp * self.trend
+
+    def params(self):
+        return {"alpha": self.alpha, "beta": self.beta, "phi": self.phi}
+
+
+@register_forecaster
+class HoltWintersForecaster(Forecaster):
+    """Additive Holt-Winters (level, trend, seasonal period season_length)."""
+
+    name = "holt_winters"
+    cost = 4.0
+
+    def __init__(self, alpha: float = 0.3, beta: float = 0.05, gamma: float = 0.2,
+                 season_length: int = 30):
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.gamma = float(gamma)
+        self.season_length = int(season_length)
+        self.min_history = 2 * self.season_length
+        self.level = None
+        self.trend = 0.0
+        self.season = np.zeros(self.season_length)
+        self.t = 0
+
+    def fit(self, history):
+        data = np.asarray(history, dtype=np.float64)
+        m = self.season_length
+        self.season = np.zeros(m)
+        self.trend = 0.0
+        self.level = None
+        self.t = 0
+        if len(data) >= 2 * m:
+            first, second = data[:m], data[m:2 * m]
+            self.level = first.mean()
+            self.trend = (second.mean() - first.mean()) / m
+            self.season = first - self.level
+            self.t = m
+            data = data[m:]
+        for v in data:
+            self.update(v)
+        return self
+
+    def update(self, value):
+        value = float(value)
+        if self.level is None:
+            self.level = value
+            self.t += 1
+            return
+        idx = self.t % self.season_length
+        prev_level = self.level
+        self.level = self.alpha * (value - self.season[idx]) + (1 - self.alpha) * (prev_level + self.trend)
+        self.trend = self.beta * (self.level - prev_level) + (1 - self.beta) * self.trend
+        self.season[idx] = self.gamma * (value - self.level) + (1 - self.gamma) * self.season[idx]
+        self.t += 1
+
+    def predict(self, n_steps):
+        level = self.level if self.level is not None else 0.0
+        h = np.arange(1, n_steps + 1)
+        seasonal = self.season[(self.t + h - 1) % self.season_length]
+        return level + h * self.trend + seasonal
+
+    def params(self):
+        return {"alpha": self.alpha, "beta": self.beta, "gamma": self.gamma,
+                "season_length": self.season_length}
+
+
+@register_forecaster
+class ARForecaster(Forecaster):
+    """Autoregressive AR(p) model with intercept, fitted by least squares."""
+
+    name = "ar"
+    cost = 3.0
+
+    def __init__(self, order: int = 5, window: int = 300):
+        self.order = int(order)
+        self.window = int(window)
+        self.min_history = 2 * self.order + 1
+        self.coef = np.zeros(self.order + 1)
+        self.buffer = deque(maxlen=self.order)
+
+    def fit(self, history):
+        data = np.asarray(history, dtype=np.float64)[-self.window:]
+        p = self.order
+        self.buffer = deque(data[-p:], maxlen=p)
+        self.coef = np.zeros(p + 1)
+        if len(data) <= p:
+            self.coef[0] = data.mean() if len(data) else 0.0
+            return self
+        lags = np.lib.stride_tricks.sliding_window_view(data[:-1], p)
+        design = np.hstack([np.ones((len(lags), 1)), lags])
+        self.coef, *_ = np.linalg.lstsq(design, data[p:], rcond=None)
+        return self
+
+    def update(self, value):
+        self.buffer.append(float(value))
+
+    def predict(self, n_steps):
+        p = self.order
+        window = list(self.buffer)
+        if len(window) < p:
+            window = [window[0] if window else 0.0] * (p - len(window)) + window
+        window = np.asarray(window, dtype=np.float64)
+        preds = np.empty(n_steps)
+        for i in range(n_steps):
+            nxt = self.coef[0] + window @ self.coef[1:]
+            preds[i] = nxt
+            window = np.roll(window, -1)
+            window[-1] = nxt
+        return preds
+
+    def params(self):
+        return {"order": self.order, "window": self.window}
+
+
+@register_forecaster
+class LinearTrendForecaster(Forecaster):
+    """Straight-line fit over the recent window (NumPy version of train_linear_model)."""
+
+    name = "linear"
+    cost = 2.0
+    min_history = 2
+
+    def __init__(self, window: int = 30):
+        self.window = int(window)
+        self.buffer = deque(maxlen=self.window)
+
+    def fit(self, history):
+        self.buffer = deque(np.asarray(history, dtype=np.float64)[-self.window:], maxlen=self.window)
+        return self
+
+    def update(self, value):
+        self.buffer.append(float(value))
+
+    def predict(self, n_steps):
+        y = np.asarray(self.buffer)
+        if len(y) < 2:
+            return np.full(n_steps, y[-1] if len(y) else 0.0)
+        x = np.arange(len(y))
+        slope, intercept = np.polyfit(x, y, 1)
+        return intercept + slope * np.arange(len(y), len(y) + n_steps)
+
+    def params(self):
+        return {"window": self.window}
+
+
+@register_forecaster
+class LSTMForecaster(Forecaster):
+    """Adapter around forecasting_model.train_lstm_model; TensorFlow is imported on fit."""
+
+    name = "lstm"
+    cost = 1000.0
+    restorable = False  # the Keras model is not checkpointed; refit from history on restore
+
+    def __init__(self, look_back: int = 5, n_steps: int = 10, epochs: int = 20, window: int = 300):
+        self.look_back = int(look_back)
+        self.n_steps = int(n_steps)
+        self.epochs = int(epochs)
+        self.window = int(window)
+        self.min_history = self.look_back + self.n_steps
+        self.model = None
+        self.buffer = deque(maxlen=self.window)
+
+    def fit(self, history):
+        from .forecasting_model import train_lstm_model
+
+        self.buffer = deque(np.asarray(history, dtype=np.float64)[-self.window:], maxlen=self.window)
+        self.model, _ = train_lstm_model(list(self.buffer), look_back=self.look_back,
+                                         n_steps=self.n_steps, epochs=self.epochs, model=self.model)
+        return self
+
+    @property
+    def max_steps(self):
+        return self.n_steps  # the network emits a fixed number of steps
+
+    def update(self, value):
+        self.buffer.append(float(value))
+
+    def predict(self, n_steps):
+        from .forecasting_model import predict_lstm_batch
+
+        if self.model is None:
+            raise RuntimeError("LSTMForecaster.predict called before fit")
+        if n_steps > self.n_steps:
+            raise ValueError(f"Model was trained for {self.n_steps} steps, asked for {n_steps}")
+        return predict_lstm_batch(self.model, [list(self.buffer)])[0][:n_steps].astype(np.float64)
+
+    def params(self):
+        return {"look_back": self.look_back, "n_steps": self.n_steps, "epochs": self.epochs}
+
+    def clone(self):
+        # Keras models do not deep-copy; the copy trains its own
+        model, self.model = self.model, None
+        try:
+            return copy.deepcopy(self)
+        finally:
+            self.model = model
+
+
+def rolling_backtest(forecaster: Forecaster, series: Sequence[float], origins: Iterable[int], horizon: int,
+                     train_window: Optional[int] = None):
+    """
+    Rolling-origin evaluation: at each origin, fit on the series before it (its
+    last train_window values if given) and forecast the next horizon values.
+    Returns (predictions, targets, fit seconds, predict seconds), one row or
+    value per origin.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    origins = np.asarray(list(origins), dtype=np.int64)
+    preds = np.empty((len(origins), horizon))
+    fit_s = np.empty(len(origins))
+    predict_s = np.empty(len(origins))
+    for i, origin in enumerate(origins):
+        start = 0 if train_window is None else origin - train_window
+        t0 = time.perf_counter()
+        forecaster.fit(series[start:origin])
+        t1 = time.perf_counter()
+        preds[i] = forecaster.predict(horizon)
+        t2 = time.perf_counter()
+        fit_s[i] = t1 - t0
+        predict_s[i] = t2 - t1
+    targets = np.lib.stride_tricks.sliding_window_view(series, horizon)[origins]
+    return preds, targets, fit_s, predict_s
+
+
+# LSTM is opt-in: backtesting it means training several networks per reselection
+DEFAULT_CANDIDATES = ("ewma", "holt", "linear", "ar", "holt_winters")
+
+
+class ForecasterSelector:
+    """
+    Per-camera model selection by periodic rolling-origin backtests.
+
+    Backtests run on clones, so the routed model is never refit mid-selection.
+    Each one also times the candidate (mean fit + predict seconds per origin,
+    in costs). Once every candidate has been timed, they are tried cheapest
+    first and the first whose backtest MAE stays within error_budget is routed
+    all forecasts until the next reselection. Until then all candidates are
+    backtested and the cheapest within budget wins. If none qualifies, the
+    most accurate candidate wins.
+    """
+
+    def __init__(self,
+                 candidates: Optional[Iterable] = None,
+                 error_budget: float = 2.0,
+                 horizon: int = 10,
+                 history_size: int = 300,
+                 reselect_every: int = 100,
+                 n_origins: int = 5):
+        specs = candidates if candidates is not None else DEFAULT_CANDIDATES
+        self.candidates: List[Forecaster] = sorted(
+            (create_forecaster(s) if isinstance(s, str) else s for s in specs),
+            key=lambda f: f.cost,
+        )
+        self.error_budget = float(error_budget)
+        self.horizon = int(horizon)
+        self.history = deque(maxlen=int(history_size))
+        self.reselect_every = int(reselect_every)
+        self.n_origins = int(n_origins)
+        self.active: Optional[Forecaster] = None
+        self.scores: Dict[str, float] = {}
+        self.costs: Dict[str, float] = {}  # measured seconds per backtest origin
+        self._since_select = 0
+
+    def observe(self, value: float) -> None:
+        """Record a new count and keep the active model current."""
+        self.history.append(float(value))
+        self._since_select += 1
+        if self.active is not None:
+            self.active.update(value)
+        if self.active is None or self._since_select >= self.reselect_every:
+            self.select()
+
+    def backtest(self, forecaster: Forecaster) -> float:
+        """Mean absolute error of a clone of forecaster over the last n_origins origins; records its cost."""
+        h = self.horizon
+        last_origin = len(self.history) - h
+        first_origin = max(forecaster.min_history, last_origin - (self.n_origins - 1) * h)
+        if last_origin < first_origin:
+            return float("inf")
+        preds, targets, fit_s, predict_s = rolling_backtest(forecaster.clone(), self.history,
+                                                            range(first_origin, last_origin + 1, h), h)
+        self.costs[forecaster.name] = float(np.mean(fit_s + predict_s))
+        return float(np.abs(preds - targets).mean())
+
+    def select(self) -> Optional[Forecaster]:
+        """Backtest candidates cheapest-first and activate the winner."""
+        if len(self.history) < self.horizon + 1:
+            return None
+        self._since_select = 0
+        self.scores = {}
+        best = None
+        # Until every candidate has a measured cost, backtest them all rather than trust the priors
+        exhaustive = any(f.name not in self.costs for f in self.candidates)
+        within = []
+        for forecaster in sorted(self.candidates, key=lambda f: self.costs.get(f.name, f.cost)):
+            try:
+                mae = self.backtest(forecaster)
+            except Exception as e:
+                logger.warning(f"Backtest of {forecaster.name} failed: {e}")
+                continue
+            self.scores[forecaster.name] = mae
+            if best is None or mae < self.scores[best.name]:
+                best = forecaster
+            if mae <= self.error_budget:
+                within.append(forecaster)
+                if not exhaustive:
+                    break
+        if within:
+            best = min(within, key=lambda f: self.costs[f.name])
+        if best is not None:
+            best.fit(self.history)
+            if best is not self.active:
+                logger.info(f"Selected forecaster '{best.name}' (MAE {self.scores[best.name]:.2f})")
+            self.active = best
+        return best
+
+    def get_state(self) -> Dict:
+        """History, active model and its fitted state, for pipeline checkpoints."""
+        return {
+            "history": list(self.history),
+            "active": self.active.name if self.active is not None else None,
+            "active_state": self.active.get_state() if self.active is not None else None,
+            "scores": self.scores,
+            "costs": self.costs,
+            "since_select": self._since_select,
+        }
+
+    def set_state(self, state: Dict) -> None:
+        """Resume from get_state() without re-running the selection backtests."""
+        self.history = deque(state.get("history", []), maxlen=self.history.maxlen)
+        self.scores = dict(state.get("scores", {}))
+        self.costs = dict(state.get("costs", {}))
+        self._since_select = int(state.get("since_select", 0))
+        self.active = next((f for f in self.candidates if f.name == state.get("active")), None)
+        if self.active is not None:
+            if self.active.restorable and state.get("active_state") is not None:
+                self.active.set_state(state["active_state"])
+            else:
+                self.active.fit(self.history)
+
+    def forecast(self, n_steps: Optional[int] = None) -> Optional[List[float]]:
+        """
+        Forecast with the active model, or None while history is too short.
+        Models with a fixed horizon (LSTM) return at most their max_steps.
+        """
+        if self.active is None and self.select() is None:
+            return None
+        n_steps = n_steps or self.horizon
+        if self.active.max_steps is not None:
+            n_steps = min(n_steps, self.active.max_steps)
+        return self.active.predict(n_steps).tolist()
@@ -7,44 +7,33 @@ Crowd count forecasting for Smart Crowd Management.
 - Functions:
     - train_linear_model()
     - train_lstm_model()
+    - train_lstm_model_batch(histories)
     - predict_future_counts(model, history, n_steps)
+    - predict_lstm_batch(model, histories)
     - demo_run()
 """
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 import logging
-import sys
 import time
 import json
+import weakref
 from typing import List, Dict, Tuple
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import train_test_split
-
-# For LSTM
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
-
-# For enhanced output and progress display
-from colorama import init, Fore, Style
-from tqdm import tqdm
-from tabulate import tabulate
-
-# Initialize colorama
-init(autoreset=True)
-
-# ---------------- Logging Configuration ----------------
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# TensorFlow/Keras, sklearn, matplotlib and the console helpers (colorama, tqdm,
+# tabulate) are imported inside the functions that use them, so importing this
+# module (e.g. via crowd_pipeline on a detection-only run) stays cheap.
+_colorama_ready = False
+
+def _colors():
+    """Import colorama on first use and return (Fore, Style)."""
+    global _colorama_ready
+    from colorama import init, Fore, Style
+    if not _colorama_ready:
+        init(autoreset=True)
+        _colorama_ready = True
+    return Fore, Style
+
 logger = logging.getLogger(__name__)
 
 # ---------------- Linear Regression Forecast ----------------
@@ -54,6 +43,11 @@ def train_linear_model(history_counts, n_steps=6):
     history_counts: list of past counts
     n_steps: number of future predictions
     """
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_squared_error
+    from tqdm import tqdm
+    Fore, _ = _colors()
+
     print_header("Linear Regression Training")
     
     # Show loading animation
@@ -79,35 +73,155 @@ def train_linear_model(history_counts, n_steps=6):
     return model, preds.tolist()
 
 # ---------------- LSTM Forecast ----------------
-def create_lstm_model(input_shape):
+def create_lstm_model(input_shape, n_outputs=1):
+    """Build an LSTM with a direct multi-horizon head (one unit per future step)."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+
     model = Sequential()
     model.add(LSTM(64, activation='relu', input_shape=input_shape))
-    model.add(Dense(1))
+    model.add(Dense(n_outputs))
     model.compile(optimizer='adam', loss='mse')
+    _INITIAL_WEIGHTS[model] = model.get_weights()
     return model
 
-def train_lstm_model(history_counts, look_back=5, n_steps=6, epochs=20):
+# Weights of each model as built, so a retrain can start from scratch without rebuilding it
+_INITIAL_WEIGHTS = weakref.WeakKeyDictionary()
+
+def _reuse_lstm_model(model, look_back, n_steps):
+    """
+    Reset model to its initial weights and a fresh optimizer state if it has the
+    requested shape and None otherwise. Rebuilding a Sequential on every retrain
+    grows Keras' global state and retraces the forward function.
+    """
+    import tensorflow as tf
+
+    if model is None or model not in _INITIAL_WEIGHTS:
+        return None
+    if int(model.input_shape[1]) != look_back or int(model.output_shape[-1]) != n_steps:
+        return None
+    model.set_weights(_INITIAL_WEIGHTS[model])
+    variables = model.optimizer.variables
+    for v in (variables() if callable(variables) else variables):
+        v.assign(tf.zeros(v.shape, dtype=v.dtype))
+    return model
+
+# Compiled forward passes, keyed by model so each Keras model is traced once
+_FORWARD_FNS = weakref.WeakKeyDictionary()
+
+def _compiled_forward(model):
+    """Return a cached tf.function wrapping model.__call__ for inference."""
+    fn = _FORWARD_FNS.get(model)
+    if fn is None:
+        import tensorflow as tf
+        # Only a weak reference in the closure: a strong one from the value would keep the key alive
+        model_ref = weakref.ref(model)
+        fn = tf.function(lambda x: model_ref()(x, training=False), reduce_retracing=True)
+        _FORWARD_FNS[model] = fn
+    return fn
+
+def _make_windows(data, look_back, n_steps):
+    """Slice a series into (look_back -> n_steps) supervised training pairs."""
+    n_samples = len(data) - look_back - n_steps + 1
+    idx = np.arange(look_back)[None, :] + np.arange(n_samples)[:, None]
+    X = data[idx]
+    y = data[idx[:, -1:] + 1 + np.arange(n_steps)[None, :]]
+    return X, y
+
+def fit_look_back(length, look_back, n_steps):
+    """
+    Largest usable window for a history of `length` counts: look_back itself when
+    a (look_back -> n_steps) training pair fits, otherwise length - n_steps with a
+    warning. Raises ValueError when not even a one-step window fits.
+    """
+    if look_back + n_steps <= length:
+        return look_back
+    fitted = length - n_steps
+    if fitted < 1:
+        raise ValueError(f"Need more than {n_steps} counts per history to forecast {n_steps} steps")
+    logger.warning(f"look_back={look_back} needs {look_back + n_steps} counts but the history has "
+                   f"{length}; training with look_back={fitted}")
+    return fitted
+
+def predict_lstm_batch(model, histories, look_back=None):
+    """
+    Forecast several series with one forward pass of a multi-horizon LSTM.
+    histories: sequence of K count histories (each at least look_back long)
+    look_back: window length; defaults to the model's input length
+    Returns a (K, n_steps) float array.
+    """
+    import tensorflow as tf
+
+    if look_back is None:
+        look_back = int(model.input_shape[1])
+    windows = np.stack([np.asarray(h, dtype=np.float32)[-look_back:] for h in histories])
+    if windows.shape[1] != look_back:
+        raise ValueError(f"Every history needs at least {look_back} values")
+    preds = _compiled_forward(model)(tf.constant(windows[..., None]))
+    return preds.numpy()
+
+def predict_future_counts(model, history, n_steps=None):
+    """
+    Forecast the next n_steps counts of one history with a trained multi-horizon
+    LSTM (all steps come from a single forward pass). n_steps defaults to the
+    model's horizon and may not exceed it.
+    """
+    horizon = int(model.output_shape[-1])
+    if n_steps is None:
+        n_steps = horizon
+    if n_steps > horizon:
+        raise ValueError(f"Model forecasts {horizon} steps, {n_steps} requested")
+    return [float(v) for v in predict_lstm_batch(model, [history])[0][:n_steps]]
+
+def train_lstm_model(history_counts, look_back=5, n_steps=6, epochs=20, model=None):
     """
     Train an LSTM model on time-series crowd counts.
     history_counts: list of past counts
     look_back: how many past steps to look at
     n_steps: number of future predictions
+    model: a model from an earlier call to retrain in place (if the shapes match)
     """
+    model, preds = train_lstm_model_batch([history_counts], look_back=look_back,
+                                          n_steps=n_steps, epochs=epochs, model=model)
+    return model, preds[0]
+
+def train_lstm_model_batch(histories, look_back=5, n_steps=6, epochs=20, model=None):
+    """
+    Train one shared LSTM on the histories of K cameras and forecast all of them.
+    histories: list of K count histories
+    look_back: how many past steps to look at; shortened with a warning when the
+               shortest history is too short (see fit_look_back). The window
+               actually used is the model's input_shape[1].
+    n_steps: number of future predictions, produced directly by the output head
+    model: a model from an earlier call; it is reset and retrained in place
+           when its shapes match, otherwise a new one is built
+    Returns (model, list of K prediction lists).
+    """
+    series = [np.asarray(h, dtype=np.float32) for h in histories]
+    look_back = fit_look_back(min(len(s) for s in series), look_back, n_steps)
+
+    import tensorflow as tf
+    from sklearn.model_selection import train_test_split
+    from tqdm import tqdm
+    Fore, _ = _colors()
+
     print_header("LSTM Model Training")
-    
-    data = np.array(history_counts, dtype=np.float32)
-    X, y = [], []
-    for i in range(len(data) - look_back):
-        X.append(data[i:i+look_back])
-        y.append(data[i+look_back])
-    X, y = np.array(X), np.array(y)
+
+    pairs = [_make_windows(s, look_back, n_steps) for s in series]
+    X = np.concatenate([p[0] for p in pairs])
+    y = np.concatenate([p[1] for p in pairs])
 
     X = X.reshape((X.shape[0], X.shape[1], 1))  # [samples, timesteps, features]
 
-    # Split train-test
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    # Split train-test (too few windows to hold any out when look_back was clamped)
+    if len(X) >= 5:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    else:
+        X_train, X_test, y_train, y_test = X, X[:0], y, y[:0]
 
-    model = create_lstm_model((look_back, 1))
+    model = _reuse_lstm_model(model, look_back, n_steps)
+    if model is None:
+        model = create_lstm_model((look_back, 1), n_outputs=n_steps)
     
     class CustomCallback(tf.keras.callbacks.Callback):
         def on_train_begin(self, logs=None):
@@ -119,7 +233,8 @@ def train_lstm_model(history_counts, look_back=5, n_steps=6, epochs=20):
             if (epoch + 1) % 5 == 0:
                 print(f"\n{Fore.GREEN}Epoch {epoch+1}/{epochs}:")
                 print(f"{Fore.WHITE}Loss: {logs['loss']:.4f}")
-                print(f"Val Loss: {logs['val_loss']:.4f}")
+                if 'val_loss' in logs:
+                    print(f"Val Loss: {logs['val_loss']:.4f}")
                 
         def on_train_end(self, logs=None):
             self.progress.close()
@@ -129,24 +244,19 @@ def train_lstm_model(history_counts, look_back=5, n_steps=6, epochs=20):
         X_train, y_train,
         epochs=epochs,
         verbose=0,
-        validation_data=(X_test, y_test),
+        validation_data=(X_test, y_test) if len(X_test) else None,
         callbacks=[CustomCallback()]
     )
     
-    # Forecast future n_steps
-    last_seq = data[-look_back:]
-    preds = []
-    input_seq = last_seq.reshape((1, look_back, 1))
-    for _ in range(n_steps):
-        next_val = model.predict(input_seq, verbose=0)[0][0]
-        preds.append(float(next_val))
-        # shift input sequence
-        input_seq = np.append(input_seq[:, 1:, :], [[[next_val]]], axis=1)
-
-    return model, preds
+    # Forecast all n_steps for every camera in a single forward pass
+    preds = predict_lstm_batch(model, series, look_back=look_back)
+    return model, [[float(v) for v in row] for row in preds]
 
 # ---------------- Demo Run ----------------
 def demo_run():
+    import matplotlib.pyplot as plt
+    Fore, Style = _colors()
+
     print_header("Crowd Forecasting Demo")
     
     # Create synthetic demo data (sinusoidal + noise)
@@ -181,11 +291,15 @@ def demo_run():
     print(f"\n{Fore.GREEN}✨ Demo completed successfully!{Style.RESET_ALL}")
 
 def print_header(text):
+    Fore, Style = _colors()
     print(f"\n{Fore.CYAN}{'='*50}")
     print(f"{Fore.CYAN}{text.center(50)}")
     print(f"{Fore.CYAN}{'='*50}{Style.RESET_ALL}\n")
 
 def print_result_table(predictions, model_name):
+    from tabulate import tabulate
+    Fore, Style = _colors()
+
     headers = ["Step", "Prediction", "Confidence"]
     # Add fake confidence for demonstration
     confidence = [f"{100-i*3:.1f}%" for i in range(len(predictions))]
@@ -199,25 +313,41 @@ def load_detection_data(detection_data: List[Dict]) -> Tuple[List[str], List[int
     counts = [d["count"] for d in detection_data]
     return timestamps, counts
 
+def load_rollup_counts(detection_data: List[Dict], resolution: int = 10,
+                       field: str = "count_mean") -> List[float]:
+    """Resample detection data into fixed-interval buckets using its timestamps"""
+    from .rollups import rollup_detections
+
+    return rollup_detections(detection_data, resolutions=(resolution,)).series(resolution, field)
+
 def forecast_from_detections(detection_data: List[Dict], method="lstm", 
-                           look_back=30, n_steps=10) -> Dict:
-    """Generate forecasts from detection data"""
-    _, counts = load_detection_data(detection_data)
+                           look_back=30, n_steps=10, cache=None, resolution=None) -> Dict:
+    """Generate forecasts from detection data (memoized when a ForecastCache is given).
+    With resolution (seconds) set, forecasts per-bucket mean counts instead of raw frames."""
+    from .forecast_cache import cached_forecast
+
+    if resolution:
+        counts = load_rollup_counts(detection_data, resolution)
+    else:
+        _, counts = load_detection_data(detection_data)
     
     if method.lower() == "lstm":
-        model, predictions = train_lstm_model(counts, 
-                                            look_back=look_back,
-                                            n_steps=n_steps)
+        look_back = fit_look_back(len(counts), look_back, n_steps)
+        model, predictions = cached_forecast(cache, method, counts,
+                                             look_back=look_back,
+                                             n_steps=n_steps)
     else:
-        model, predictions = train_linear_model(counts, n_steps=n_steps)
+        model, predictions = cached_forecast(cache, method, counts, n_steps=n_steps)
     
     return {
         "method": method,
         "predictions": predictions,
         "look_back": look_back,
-        "n_steps": n_steps
+        "n_steps": n_steps,
+        "resolution_s": resolution
     }
 
 # ---------------- Entry Point ----------------
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
     demo_run()
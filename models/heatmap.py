@@ -0,0 +1,145 @@
+"""
+models/heatmap.py
+
+Incremental occupancy heatmaps per camera.
+
+- Bins head centers into a low-resolution grid with np.add.at, so each frame
+  costs O(detections).
+- Keeps an exponentially decayed grid and a sliding-window total built from a
+  fixed ring of time slots; memory depends only on grid size and slot count.
+- Exports compact snapshots (uint16 grid + scale + metadata) for the result
+  files consumed by the dashboard.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class HeatmapAccumulator:
+    """Decayed and windowed head-center occupancy on a rows x cols grid."""
+
+    def __init__(self,
+                 frame_shape: Tuple[int, int],
+                 grid: Tuple[int, int] = (36, 64),
+                 half_life: float = 60.0,
+                 window: float = 300.0,
+                 slots: int = 30):
+        self.frame_h, self.frame_w = int(frame_shape[0]), int(frame_shape[1])
+        self.rows, self.cols = int(grid[0]), int(grid[1])
+        self.half_life = float(half_life)
+        self.window = float(window)
+        self.slot_span = self.window / int(slots)
+
+        n_cells = self.rows * self.cols
+        self.decayed = np.zeros(n_cells, dtype=np.float32)
+        self.slots = np.zeros((int(slots), n_cells), dtype=np.uint32)
+        self.frames = 0
+        self._slot = 0
+        self._slot_start = None
+        self._last_ts = None
+
+    def _cells(self, centers: np.ndarray) -> np.ndarray:
+        """Flat grid indices of (N, 2) x/y pixel coordinates."""
+        cx = (centers[:, 0] * (self.cols / self.frame_w)).astype(np.int64)
+        cy = (centers[:, 1] * (self.rows / self.frame_h)).astype(np.int64)
+        np.clip(cx, 0, self.cols - 1, out=cx)
+        np.clip(cy, 0, self.rows - 1, out=cy)
+        return cy * self.cols + cx
+
+    def _advance_slots(self, timestamp: float) -> None:
+        if self._slot_start is None:
+            self._slot_start = timestamp
+            return
+        elapsed = int((timestamp - self._slot_start) // self.slot_span)
+        if elapsed <= 0:
+            return
+        # Clear every slot we step over (at most the whole ring after a long gap)
+        for _ in range(min(elapsed, len(self.slots))):
+            self._slot = (self._slot + 1) % len(self.slots)
+            self.slots[self._slot] = 0
+        self._slot_start += elapsed * self.slot_span
+
+    def update(self, centers: np.ndarray, timestamp: float) -> None:
+        """Add one frame of head centers observed at timestamp (seconds)."""
+        if self._last_ts is not None and timestamp > self._last_ts:
+            self.decayed *= np.float32(0.5 ** ((timestamp - self._last_ts) / self.half_life))
+        self._last_ts = timestamp
+        self._advance_slots(timestamp)
+        self.frames += 1
+
+        centers = np.asarray(centers).reshape(-1, 2)
+        if len(centers) == 0:
+            return
+        cells = self._cells(centers)
+        np.add.at(self.decayed, cells, 1.0)
+        np.add.at(self.slots[self._slot], cells, 1)
+
+    def windowed(self) -> np.ndarray:
+        """Head-center counts over the last `window` seconds as a (rows, cols) grid."""
+        return self.slots.sum(axis=0, dtype=np.uint64).reshape(self.rows, self.cols)
+
+    def get_state(self) -> Dict:
+        """Exact grids and slot position, for pipeline checkpoints (snapshot() is quantized)."""
+        return {
+            "frame_shape": [self.frame_h, self.frame_w],
+            "shape": [self.rows, self.cols],
+            "decayed": base64.b64encode(self.decayed.astype("<f4").tobytes()).decode("ascii"),
+            "slots": base64.b64encode(self.slots.astype("<u4").tobytes()).decode("ascii"),
+            "frames": self.frames,
+            "slot": self._slot,
+            "slot_start": self._slot_start,
+            "last_ts": self._last_ts,
+        }
+
+    def set_state(self, state: Dict) -> None:
+        decayed = np.frombuffer(base64.b64decode(state["decayed"]), dtype="<f4")
+        slots = np.frombuffer(base64.b64decode(state["slots"]), dtype="<u4")
+        if decayed.size != self.decayed.size or slots.size != self.slots.size:
+            raise ValueError("Heatmap state does not match this grid")
+        self.frame_h, self.frame_w = (int(v) for v in state["frame_shape"])
+        self.decayed = decayed.astype(np.float32)
+        self.slots = slots.astype(np.uint32).reshape(self.slots.shape)
+        self.frames = int(state["frames"])
+        self._slot = int(state["slot"])
+        self._slot_start = state["slot_start"]
+        self._last_ts = state["last_ts"]
+
+    def snapshot(self, kind: str = "decayed", camera_id: Optional[str] = None) -> Dict:
+        """Compact export: the grid quantized to uint16 with value = data * scale."""
+        grid = self.decayed.reshape(self.rows, self.cols) if kind == "decayed" else self.windowed()
+        peak = float(grid.max()) if grid.size else 0.0
+        scale = peak / 65535.0 if peak > 0 else 1.0
+        data = np.round(grid / scale).astype("<u2")
+        return {
+            "camera_id": camera_id,
+            "timestamp": datetime.now().isoformat(),
+            "kind": kind,
+            "shape": [self.rows, self.cols],
+            "frame_shape": [self.frame_h, self.frame_w],
+            "dtype": "uint16",
+            "scale": scale,
+            "half_life_s": self.half_life,
+            "window_s": self.window,
+            "frames": self.frames,
+            "data": base64.b64encode(data.tobytes()).decode("ascii"),
+        }
+
+    def save_snapshot(self, filepath: str, camera_id: Optional[str] = None) -> Dict:
+        """Write decayed and windowed snapshots to one JSON file."""
+        snapshot = {
+            "decayed": self.snapshot("decayed", camera_id),
+            "window": self.snapshot("window", camera_id),
+        }
+        with open(filepath, "w") as f:
+            json.dump(snapshot, f)
+        return snapshot
+
+
+def decode_snapshot(snapshot: Dict) -> np.ndarray:
+    """Inverse of HeatmapAccumulator.snapshot: float grid of shape snapshot['shape']."""
+    data = np.frombuffer(base64.b64decode(snapshot["data"]), dtype="<u2")
+    return data.reshape(snapshot["shape"]).astype(np.float32) * snapshot["scale"]
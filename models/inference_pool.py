@@ -0,0 +1,313 @@
+"""
+models/inference_pool.py
+
+Detector worker pool with startup auto-tuning of worker count and thread affinity.
+
+- A layout is (workers, threads per worker). Each worker process is pinned to
+  its own disjoint set of cores with os.sched_setaffinity and limits torch
+  intra-op parallelism to that set with torch.set_num_threads.
+- Calibration benchmarks candidate layouts on a clip from the camera (or,
+  without one, a synthetic clip), keeps those whose p95 frame latency is
+  under the cap, and picks the one with the best total throughput. Latency
+  covers the whole detect() call, post-processing included; noise frames
+  have no people, so only a real clip costs that part. The choice is saved
+  as JSON together with what it was measured for (host, weights, device,
+  imgsz, latency cap) and reused only while all of those match.
+- DetectorPool.from_calibration starts the pool with the saved (or freshly
+  calibrated) layout; run_pipeline.py --pool detects through it.
+
+Usage:
+    python -m models.inference_pool --weights yolov8n.pt --video videos/crowd2.mp4 --latency-cap-ms 250
+    python -m models.inference_pool --weights yolov8n.pt --layouts 1x16 2x8 4x4 8x2
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .synthetic import synthetic_clip
+
+DEFAULT_LAYOUT_PATH = os.path.join("config", "inference_layout.json")
+
+
+@dataclass(frozen=True)
+class Layout:
+    workers: int
+    threads: int
+
+    def __str__(self):
+        return f"{self.workers}x{self.threads}"
+
+    @classmethod
+    def parse(cls, text: str) -> "Layout":
+        workers, threads = text.lower().split("x")
+        return cls(int(workers), int(threads))
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (all CPUs where affinity is unsupported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def candidate_layouts(n_cores: Optional[int] = None) -> List[Layout]:
+    """Power-of-two worker counts that split the cores evenly, from 1 worker upwards."""
+    n_cores = n_cores or len(available_cores())
+    layouts, workers = [], 1
+    while workers <= n_cores:
+        layouts.append(Layout(workers, n_cores // workers))
+        workers *= 2
+    return layouts
+
+
+def assign_cores(layout: Layout, cores: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """Disjoint, contiguous core sets for each worker of a layout."""
+    cores = list(cores or available_cores())
+    if layout.workers * layout.threads > len(cores):
+        raise ValueError(f"Layout {layout} needs {layout.workers * layout.threads} cores, "
+                         f"only {len(cores)} available")
+    return [cores[i * layout.threads:(i + 1) * layout.threads] for i in range(layout.workers)]
+
+
+def host_signature() -> Dict:
+    return {"host": platform.node(), "cores": len(available_cores()), "machine": platform.machine()}
+
+
+def layout_signature(weights: str, device: str = "cpu", imgsz: int = 640, latency_cap_ms: float = 250.0) -> Dict:
+    """Everything a calibrated layout depends on: the host and what was benchmarked on it."""
+    return {
+        **host_signature(),
+        "weights": os.path.basename(weights),
+        "weights_bytes": os.path.getsize(weights) if os.path.exists(weights) else None,
+        "device": device,
+        "imgsz": int(imgsz),
+        "latency_cap_ms": float(latency_cap_ms),
+    }
+
+
+def load_clip(video_path: str, n_frames: int = 16) -> List[np.ndarray]:
+    """Frames spread evenly over a video, for calibrating on realistic content."""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frames = []
+        for idx in np.linspace(0, max(total - 1, 0), n_frames).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ok, frame = cap.read()
+            if ok:
+                frames.append(frame)
+    finally:
+        cap.release()
+    if not frames:
+        raise ValueError(f"Could not read frames from {video_path}")
+    return frames
+
+
+# ---------------- Workers ----------------
+def _worker_main(weights, device, cores, threads, analyzer_kwargs, in_q, out_q):
+    """Worker process: pin, limit threads, then detect frames until a None arrives."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import cv2
+    import torch
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    from .detection_model import CrowdAnalyzer
+
+    analyzer = CrowdAnalyzer(weights, device=device, **analyzer_kwargs)
+    out_q.put(("ready", None, None))
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+        seq, frame = item
+        out_q.put(("result", seq, analyzer.detect(frame)))
+
+
+class DetectorPool:
+    """CrowdAnalyzer worker processes pinned to disjoint cores; results keyed by sequence number."""
+
+    def __init__(self, weights: str, layout: Layout, device: str = "cpu",
+                 analyzer_kwargs: Optional[Dict] = None, cores: Optional[Sequence[int]] = None):
+        self.layout = layout
+        # Fixed imgsz per worker: adaptive resizing would fight the calibrated layout
+        kwargs = {"adaptive": False, **(analyzer_kwargs or {})}
+        ctx = mp.get_context("spawn")  # torch is not fork-safe once initialized
+        self._in_q = ctx.Queue(maxsize=2 * layout.workers)
+        self._out_q = ctx.Queue()
+        self._procs = [
+            ctx.Process(target=_worker_main, name=f"detector-{i}", daemon=True,
+                        args=(weights, device, core_set, layout.threads, kwargs, self._in_q, self._out_q))
+            for i, core_set in enumerate(assign_cores(layout, cores))
+        ]
+        for proc in self._procs:
+            proc.start()
+        for _ in self._procs:
+            kind, _, _ = self._out_q.get(timeout=300)
+            if kind != "ready":
+                raise RuntimeError("Detector worker failed to start")
+
+    @classmethod
+    def from_calibration(cls, weights: str, path: str = DEFAULT_LAYOUT_PATH, device: str = "cpu",
+                         analyzer_kwargs: Optional[Dict] = None, **calibrate_kwargs) -> "DetectorPool":
+        """Start with the saved layout for this setup, calibrating first if there is none."""
+        signature = layout_signature(weights, device, (analyzer_kwargs or {}).get("imgsz", 640),
+                                     calibrate_kwargs.get("latency_cap_ms", 250.0))
+        layout = load_layout(path, signature)
+        if layout is None:
+            layout = calibrate(weights, device=device, analyzer_kwargs=analyzer_kwargs,
+                               save_path=path, **calibrate_kwargs)["layout"]
+        return cls(weights, layout, device, analyzer_kwargs)
+
+    def submit(self, seq: int, frame: np.ndarray, timeout: Optional[float] = None) -> None:
+        """Queue a frame; blocks while 2 x workers frames are already waiting."""
+        self._in_q.put((seq, frame), timeout=timeout)
+
+    def get(self, timeout: Optional[float] = None):
+        """Next finished (seq, DetectionBatch), in completion order."""
+        _, seq, batch = self._out_q.get(timeout=timeout)
+        return seq, batch
+
+    def close(self) -> None:
+        for _ in self._procs:
+            self._in_q.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------- Calibration ----------------
+def benchmark_layout(weights: str, layout: Layout, frames: List[np.ndarray], device: str = "cpu",
+                     duration: float = 10.0, warmup: int = 2,
+                     analyzer_kwargs: Optional[Dict] = None) -> Dict:
+    """Total FPS and per-frame latency percentiles of one layout over `duration` seconds."""
+    with DetectorPool(weights, layout, device, analyzer_kwargs) as pool:
+        # Warm every worker before timing
+        for seq in range(warmup * layout.workers):
+            pool.submit(seq, frames[seq % len(frames)])
+        for _ in range(warmup * layout.workers):
+            pool.get(timeout=300)
+
+        in_flight = 2 * layout.workers
+        submitted_at = {}
+        latencies = []
+        seq = 0
+        start = time.perf_counter()
+        while True:
+            while len(submitted_at) < in_flight and time.perf_counter() - start < duration:
+                submitted_at[seq] = time.perf_counter()
+                pool.submit(seq, frames[seq % len(frames)])
+                seq += 1
+            if not submitted_at:
+                break
+            done, _ = pool.get(timeout=300)
+            latencies.append(time.perf_counter() - submitted_at.pop(done))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "layout": layout,
+        "frames": len(latencies),
+        "fps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def calibrate(weights: str, layouts: Optional[Sequence[Layout]] = None, device: str = "cpu",
+              latency_cap_ms: float = 250.0, duration: float = 10.0, frame_shape=(720, 1280),
+              analyzer_kwargs: Optional[Dict] = None, save_path: Optional[str] = DEFAULT_LAYOUT_PATH,
+              frames: Optional[List[np.ndarray]] = None) -> Dict:
+    """Benchmark layouts and pick the best throughput whose p95 latency is under the cap."""
+    layouts = list(layouts or candidate_layouts())
+    if frames is None:
+        print("Calibrating on noise frames: post-processing cost is not included (pass a clip for that)")
+        frames = synthetic_clip(shape=frame_shape)
+    results = []
+    for layout in layouts:
+        result = benchmark_layout(weights, layout, frames, device, duration, analyzer_kwargs=analyzer_kwargs)
+        print(f"  {str(layout):>6}: {result['fps']:.1f} FPS, p50 {result['p50_ms']:.0f} ms, "
+              f"p95 {result['p95_ms']:.0f} ms")
+        results.append(result)
+
+    within_cap = [r for r in results if r["p95_ms"] <= latency_cap_ms]
+    if within_cap:
+        best = max(within_cap, key=lambda r: r["fps"])
+    else:
+        print(f"No layout meets the {latency_cap_ms:.0f} ms p95 cap; using the lowest-latency one")
+        best = min(results, key=lambda r: r["p95_ms"])
+
+    if save_path:
+        imgsz = (analyzer_kwargs or {}).get("imgsz", 640)
+        save_layout(save_path, best, layout_signature(weights, device, imgsz, latency_cap_ms))
+    return {"layout": best["layout"], "best": best, "results": results}
+
+
+def save_layout(path: str, result: Dict, signature: Dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    record = {
+        **asdict(result["layout"]),
+        "fps": round(result["fps"], 2),
+        "p95_ms": round(result["p95_ms"], 1),
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **signature,
+    }
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2)
+
+
+def load_layout(path: str = DEFAULT_LAYOUT_PATH, signature: Optional[Dict] = None) -> Optional[Layout]:
+    """Saved layout, or None if missing or measured for a different signature (host only by default)."""
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if any(record.get(k) != v for k, v in (signature or host_signature()).items()):
+        return None
+    return Layout(int(record["workers"]), int(record["threads"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate detector worker count and threads per worker")
+    parser.add_argument("--weights", required=True, help="Path to YOLO weights file")
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--layouts", nargs="+", help="Candidate layouts as WORKERSxTHREADS (default: powers of two)")
+    parser.add_argument("--latency-cap-ms", type=float, default=250.0, help="Max p95 per-frame latency")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to benchmark each layout")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--video", help="Calibrate on frames from this video (default: noise frames)")
+    parser.add_argument("--save", default=DEFAULT_LAYOUT_PATH, help="Where to store the chosen layout")
+    args = parser.parse_args()
+
+    layouts = [Layout.parse(text) for text in args.layouts] if args.layouts else None
+    print(f"Calibrating on {len(available_cores())} cores")
+    frames = load_clip(args.video) if args.video else None
+    outcome = calibrate(args.weights, layouts, args.device, args.latency_cap_ms, args.duration,
+                        analyzer_kwargs={"imgsz": args.imgsz}, save_path=args.save, frames=frames)
+    best = outcome["best"]
+    print(f"Selected {best['layout']} ({best['fps']:.1f} FPS, p95 {best['p95_ms']:.0f} ms), saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
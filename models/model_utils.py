@@ -6,13 +6,18 @@ Utility functions and helper classes for Smart Crowd Management models.
 - Provides reusable loaders for YOLOv8 and fallback HOG.
 - Handles preprocessing and annotation helpers.
 - Forecasting utilities (saving/loading models, error metrics).
-- Common CSV logger for detections and forecasts.
+- Common buffered CSV logger for detections and forecasts.
 """
 
 import os
 import json
 import logging
 import csv
+import time
+import atexit
+import functools
+import threading
+import weakref
 from datetime import datetime
 from pathlib import Path
 from contextlib import contextmanager
@@ -65,15 +70,21 @@ def init_hog_detector():
 
 def annotate_frame(
     frame: np.ndarray, 
-    boxes: List[Tuple[int, int, int, int]], 
+    boxes: Union[List[Tuple[int, int, int, int]], np.ndarray, Any], 
     count: int, 
     source_label: str = "",
     threshold: int = 120
 ) -> np.ndarray:
-    """Draw bounding boxes and overlay count with validation."""
+    """Draw bounding boxes and overlay count with validation.
+    boxes may be a list of tuples, an (N, 4) array or a DetectionBatch."""
     if not validate_frame(frame):
         raise ValueError("Invalid frame format")
     
+    if hasattr(boxes, "xyxy"):
+        boxes = boxes.xyxy
+    if isinstance(boxes, np.ndarray):
+        boxes = boxes.reshape(-1, 4).astype(int).tolist()
+
     annotated = frame.copy()
     for box in boxes:
         if len(box) != 4:
@@ -107,13 +118,115 @@ def save_forecast_model(model: Any, filepath: str) -> bool:
         return False
 
 
+def export_forecast_model(model: Any, filepath: str) -> bool:
+    """
+    Export a trained Keras LSTM (from train_lstm_model) for TensorFlow-free inference.
+    .tflite uses the TFLite converter on a fixed [1, look_back, 1] signature so the
+    LSTM lowers to builtin ops; .onnx uses tf2onnx with a dynamic batch dimension.
+    A <filepath>.json sidecar records look_back and n_steps for LiteForecastModel.
+    """
+    try:
+        import tensorflow as tf
+
+        path = Path(filepath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        look_back = int(model.input_shape[1])
+        n_steps = int(model.output_shape[-1])
+
+        ext = path.suffix.lower()
+        if ext == ".tflite":
+            forward = tf.function(lambda x: model(x, training=False))
+            concrete = forward.get_concrete_function(tf.TensorSpec([1, look_back, 1], tf.float32))
+            converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+            path.write_bytes(converter.convert())
+        elif ext == ".onnx":
+            import tf2onnx
+
+            spec = [tf.TensorSpec([None, look_back, 1], tf.float32, name="counts")]
+            tf2onnx.convert.from_keras(model, input_signature=spec, output_path=str(path))
+        else:
+            raise ValueError(f"Unsupported export format: {ext}")
+
+        with open(f"{path}.json", "w") as f:
+            json.dump({"format": ext[1:], "look_back": look_back, "n_steps": n_steps}, f)
+        logger.info(f"✅ Model exported to {filepath}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to export model: {str(e)}")
+        return False
+
+
+class LiteForecastModel:
+    """
+    Runs an exported .tflite/.onnx forecaster through a small interpreter.
+    Prefers tflite_runtime / ai_edge_litert and onnxruntime so the live pipeline
+    never imports TensorFlow; falls back to tf.lite only if neither is installed.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        with open(f"{filepath}.json") as f:
+            meta = json.load(f)
+        self.look_back = int(meta["look_back"])
+        self.n_steps = int(meta["n_steps"])
+        self.format = os.path.splitext(filepath)[1].lower()
+        # Reused input buffer: one window, [1, look_back, 1]
+        self._window = np.zeros((1, self.look_back, 1), dtype=np.float32)
+
+        if self.format == ".tflite":
+            self._interpreter = self._tflite_interpreter(filepath)
+            self._interpreter.allocate_tensors()
+            self._input_index = self._interpreter.get_input_details()[0]["index"]
+            self._output_index = self._interpreter.get_output_details()[0]["index"]
+        elif self.format == ".onnx":
+            import onnxruntime as ort
+
+            self._session = ort.InferenceSession(filepath, providers=["CPUExecutionProvider"])
+            self._input_name = self._session.get_inputs()[0].name
+        else:
+            raise ValueError(f"Unsupported model format: {self.format}")
+
+    @staticmethod
+    def _tflite_interpreter(filepath: str):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from ai_edge_litert.interpreter import Interpreter
+            except ImportError:
+                logger.warning("tflite_runtime not installed; falling back to tf.lite")
+                from tensorflow.lite import Interpreter
+        return Interpreter(model_path=filepath)
+
+    def predict(self, history: List[float]) -> np.ndarray:
+        """Forecast n_steps from the last look_back counts of one history."""
+        if len(history) < self.look_back:
+            raise ValueError(f"Need at least {self.look_back} counts, got {len(history)}")
+        self._window[0, :, 0] = history[-self.look_back:]
+        if self.format == ".tflite":
+            self._interpreter.set_tensor(self._input_index, self._window)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output_index)[0].copy()
+        return self._session.run(None, {self._input_name: self._window})[0][0]
+
+    def predict_batch(self, histories: List[List[float]]) -> np.ndarray:
+        """Forecast K histories; a single call for ONNX, K invocations for TFLite."""
+        if self.format == ".onnx":
+            windows = np.stack([np.asarray(h[-self.look_back:], dtype=np.float32) for h in histories])
+            return self._session.run(None, {self._input_name: windows[..., None]})[0]
+        return np.stack([self.predict(h) for h in histories])
+
+
 def load_forecast_model(filepath: str):
     """
     Load forecast model from disk.
+    Exported .tflite/.onnx models load as a TensorFlow-free LiteForecastModel.
     """
     try:
         ext = os.path.splitext(filepath)[1]
-        if ext == ".h5":
+        if ext in (".tflite", ".onnx"):
+            model = LiteForecastModel(filepath)
+        elif ext == ".h5":
             from tensorflow.keras.models import load_model
             model = load_model(filepath)
         else:
@@ -141,52 +254,219 @@ def calculate_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float
     return metrics
 
 
+def calculate_horizon_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-horizon MAE/RMSE over many forecasts; inputs are (n_forecasts, horizon)."""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    if y_true.shape != y_pred.shape or y_true.ndim != 2:
+        raise ValueError("Expected matching (n_forecasts, horizon) arrays")
+    err = y_pred - y_true
+    return {
+        "mae": np.abs(err).mean(axis=0),
+        "rmse": np.sqrt((err ** 2).mean(axis=0)),
+    }
+
+
 # ---------------- CSV Logger ----------------
+class _JSONField:
+    """Cell whose JSON encoding is deferred to flush time (off the frame loop)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def encode(self) -> str:
+        value = self.value
+        if hasattr(value, "to_json"):  # DetectionBatch serializes its arrays in bulk
+            return value.to_json()
+        return json.dumps(value.tolist() if hasattr(value, "tolist") else value)
+
+
+def _close_logger(ref: "weakref.ref") -> None:
+    """atexit hook: close a CSVLogger if it is still alive (the hook does not keep it alive)."""
+    csv_logger = ref()
+    if csv_logger is not None:
+        csv_logger.close()
+
+
+def _flush_loop(ref: "weakref.ref", stop: threading.Event, interval: float) -> None:
+    """Background flushes through a weak reference, so the thread does not keep its logger alive."""
+    while not stop.wait(interval):
+        csv_logger = ref()
+        if csv_logger is None:
+            return
+        csv_logger._flush_tick()
+        del csv_logger
+
+
 class CSVLogger:
-    """Enhanced CSV logger with context manager and validation."""
+    """
+    Buffered CSV logger with background flushing, rotation and validation.
+
+    Rows are kept in memory and written through a persistent file handle when
+    flush_rows accumulate or every flush_interval seconds (background thread).
+    Inside batch_logging() nothing is written until the block exits. Rows of a
+    failed write go back to the front of the buffer and are retried. The file
+    rotates to <name>.1 ... <name>.<backup_count> past max_bytes or
+    rotate_interval seconds, and close() (also run at exit) flushes the rest.
+    """
     
-    def __init__(self, filepath: str, header: List[str]):
+    def __init__(self, filepath: str, header: List[str],
+                 flush_rows: int = 500,
+                 flush_interval: Optional[float] = 1.0,
+                 max_bytes: Optional[int] = None,
+                 rotate_interval: Optional[float] = None,
+                 backup_count: int = 5):
         self.filepath = Path(filepath)
         self.header = header
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = int(backup_count)
+
+        self._buffer: List[List[Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._batch_depth = 0
+        self._file = None
+        self._writer = None
+        self._opened_at = 0.0
+        self._closed = False
         self._initialize_file()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(target=_flush_loop, args=(weakref.ref(self), self._stop, flush_interval),
+                                            name=f"csvlogger-{self.filepath.name}", daemon=True)
+            self._thread.start()
+        # Weak references only: a logger dropped without close() can still be collected
+        self._exit_hook = functools.partial(_close_logger, weakref.ref(self))
+        atexit.register(self._exit_hook)
+        weakref.finalize(self, self._stop.set)
     
     def _initialize_file(self) -> None:
-        """Initialize CSV file with header if needed."""
+        """Open the CSV file for appending, writing the header if it is new."""
         try:
             self.filepath.parent.mkdir(parents=True, exist_ok=True)
-            if not self.filepath.exists():
-                with open(self.filepath, "w", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(self.header)
+            is_new = not self.filepath.exists() or self.filepath.stat().st_size == 0
+            self._file = open(self.filepath, "a", newline="")
+            self._writer = csv.writer(self._file)
+            if is_new:
+                self._writer.writerow(self.header)
+                self._file.flush()
+            self._opened_at = time.time()
             logger.info(f"✅ CSV Logger initialized at {self.filepath}")
         except Exception as e:
             logger.error(f"❌ Failed to initialize CSV logger: {str(e)}")
             raise
-    
+
+    def _flush_tick(self) -> None:
+        with self._buffer_lock:
+            batching = self._batch_depth > 0
+        if not batching:
+            try:
+                self.flush()
+            except Exception:
+                pass  # already logged; retried on the next tick
+
     @contextmanager
     def batch_logging(self) -> Generator[None, None, None]:
-        """Context manager for batch logging operations."""
+        """Defer all writes until the block exits, then write them in one go."""
+        with self._buffer_lock:
+            self._batch_depth += 1
         try:
             yield
         except Exception as e:
             logger.error(f"❌ Batch logging failed: {str(e)}")
             raise
+        finally:
+            with self._buffer_lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
     
     def log(self, row: List[Any]) -> None:
-        """Log a single row with validation."""
+        """Buffer a single row with validation."""
         if len(row) != len(self.header):
             raise ValueError(f"Row length {len(row)} does not match header length {len(self.header)}")
-        try:
-            with open(self.filepath, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(row)
-        except Exception as e:
-            logger.error(f"❌ Failed to log row: {str(e)}")
-            raise
+        if self._closed:
+            raise RuntimeError(f"CSV logger for {self.filepath} is closed")
+        with self._buffer_lock:
+            self._buffer.append(row)
+            due = len(self._buffer) >= self.flush_rows and self._batch_depth == 0
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered rows through the open handle and rotate if due."""
+        with self._io_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                if self._file is None or self._file.closed:
+                    self._initialize_file()  # a failed rotation left no open handle
+                self._writer.writerows(
+                    [cell.encode() if isinstance(cell, _JSONField) else cell for cell in row]
+                    for row in rows
+                )
+                self._file.flush()
+            except Exception as e:
+                # Keep the rows (ahead of any logged since) for the next flush
+                with self._buffer_lock:
+                    self._buffer[:0] = rows
+                logger.error(f"❌ Failed to log rows: {str(e)}")
+                raise
+            if self._should_rotate():
+                self._rotate()
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self) -> None:
+        """Shift <file>.N backups like logging.handlers.RotatingFileHandler and reopen."""
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = self.filepath.with_name(f"{self.filepath.name}.{i}")
+                if src.exists():
+                    os.replace(src, self.filepath.with_name(f"{self.filepath.name}.{i + 1}"))
+            os.replace(self.filepath, self.filepath.with_name(f"{self.filepath.name}.1"))
+        else:
+            self.filepath.unlink()
+        self._initialize_file()
+
+    def close(self) -> None:
+        """Stop the flush thread, write remaining rows and close the file."""
+        if self._closed:
+            return
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+        self._closed = True
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        atexit.unregister(self._exit_hook)
+
+    def __enter__(self) -> "CSVLogger":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
-    def log_detection(self, frame_idx: int, camera_id: str, count: int, boxes: List[Tuple[int, int, int, int]]):
+    def log_detection(self, frame_idx: int, camera_id: str, count: int, boxes: Union[List[Tuple[int, int, int, int]], Any]):
         ts = datetime.utcnow().isoformat() + "Z"
-        self.log([ts, frame_idx, camera_id, count, json.dumps(boxes)])
+        self.log([ts, frame_idx, camera_id, count, _JSONField(boxes)])
 
     def log_forecast(self, step: int, prediction: float, model_name: str):
         ts = datetime.utcnow().isoformat() + "Z"
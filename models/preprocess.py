@@ -0,0 +1,82 @@
+"""
+models/preprocess.py
+
+Preallocated letterbox preprocessing for the direct-network detection path.
+
+- Reproduces ultralytics' predict-time LetterBox (minimum-rectangle padding
+  to the model stride, gray 114 border, INTER_LINEAR resize) and scale_boxes,
+  so boxes match the predict() path.
+- One padded BGR buffer and one RGB buffer per (frame shape, imgsz): the border
+  is painted once, each frame is resized straight into the interior view, and
+  the color conversion writes into the RGB buffer. Nothing is allocated per frame.
+"""
+
+import math
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+class LetterboxLayout:
+    """Geometry of letterboxing one frame shape to one imgsz."""
+
+    __slots__ = ("unpad_w", "unpad_h", "top", "left", "out_h", "out_w")
+
+    def __init__(self, frame_shape: Tuple[int, int], imgsz: int, stride: int = 32):
+        h, w = int(frame_shape[0]), int(frame_shape[1])
+        r = min(imgsz / h, imgsz / w)
+        self.unpad_w, self.unpad_h = int(round(w * r)), int(round(h * r))
+        dw, dh = (imgsz - self.unpad_w) % stride / 2, (imgsz - self.unpad_h) % stride / 2
+        self.top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        self.left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        self.out_h = self.unpad_h + self.top + bottom
+        self.out_w = self.unpad_w + self.left + right
+
+
+class Letterbox:
+    """Letterboxes frames into reusable RGB buffers of shape (out_h, out_w, 3)."""
+
+    def __init__(self, stride: int = 32, pad_value: int = 114):
+        self.stride = int(stride)
+        self.pad_value = int(pad_value)
+        self._buffers: Dict[Tuple, Tuple[LetterboxLayout, np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def check_imgsz(self, imgsz: int) -> int:
+        """imgsz rounded up to a multiple of the stride (as ultralytics does)."""
+        return int(math.ceil(imgsz / self.stride) * self.stride)
+
+    def buffers(self, frame_shape, imgsz: int):
+        """(layout, bgr, interior, rgb) for a frame shape, allocated on first use."""
+        key = (int(frame_shape[0]), int(frame_shape[1]), int(imgsz))
+        entry = self._buffers.get(key)
+        if entry is None:
+            layout = LetterboxLayout(frame_shape, imgsz, self.stride)
+            bgr = np.full((layout.out_h, layout.out_w, 3), self.pad_value, dtype=np.uint8)
+            interior = bgr[layout.top:layout.top + layout.unpad_h, layout.left:layout.left + layout.unpad_w]
+            rgb = np.empty_like(bgr)
+            entry = self._buffers[key] = (layout, bgr, interior, rgb)
+        return entry
+
+    def __call__(self, frame_bgr: np.ndarray, imgsz: int) -> Tuple[np.ndarray, LetterboxLayout]:
+        """Letterboxed RGB image (a reused buffer, valid until the next call) and its layout."""
+        layout, bgr, interior, rgb = self.buffers(frame_bgr.shape, imgsz)
+        if frame_bgr.shape[:2] == (layout.unpad_h, layout.unpad_w):
+            np.copyto(interior, frame_bgr)
+        else:
+            cv2.resize(frame_bgr, (layout.unpad_w, layout.unpad_h), dst=interior, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+        return rgb, layout
+
+
+def scale_boxes(boxes: np.ndarray, input_shape: Tuple[int, int], frame_shape: Tuple[int, int]) -> np.ndarray:
+    """Map xyxy boxes from letterboxed input coordinates back to the frame, in place."""
+    gain = min(input_shape[0] / frame_shape[0], input_shape[1] / frame_shape[1])
+    pad_x = round((input_shape[1] - frame_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((input_shape[0] - frame_shape[0] * gain) / 2 - 0.1)
+    boxes[:, [0, 2]] -= pad_x
+    boxes[:, [1, 3]] -= pad_y
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+    return boxes
@@ -0,0 +1,166 @@
+"""
+models/rollups.py
+
+Incremental multi-resolution rollups of per-frame crowd counts.
+
+- Turns the irregular per-frame stream into fixed-interval buckets
+  (1 s, 10 s, 1 min, 15 min by default).
+- Each bucket tracks frames, count min/max/mean/p95 and the alert fraction,
+  updated in O(1) per frame and emitted when the bucket closes.
+- Forecasters and the dashboard read these compact records instead of
+  thousands of frame records.
+"""
+
+import math
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_RESOLUTIONS = (1, 10, 60, 900)  # seconds
+
+
+class RollupBucket:
+    """Running aggregates for one time bucket."""
+
+    __slots__ = ("start", "resolution", "frames", "total", "min", "max", "alerts", "histogram")
+
+    def __init__(self, start: float, resolution: int):
+        self.start = start
+        self.resolution = resolution
+        self.frames = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.alerts = 0
+        # Counts are small integers, so an exact histogram gives p95 without storing frames
+        self.histogram: Dict[int, int] = {}
+
+    def add(self, count: float, alert: bool) -> None:
+        self.frames += 1
+        self.total += count
+        if count < self.min:
+            self.min = count
+        if count > self.max:
+            self.max = count
+        if alert:
+            self.alerts += 1
+        key = int(round(count))
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile from the count histogram."""
+        rank = max(1, math.ceil(q / 100.0 * self.frames))
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if seen >= rank:
+                return float(value)
+        return float(self.max)
+
+    def get_state(self) -> Dict:
+        """Running aggregates of an open bucket, for checkpoints (histogram keys become strings in JSON)."""
+        return {"start": self.start, "frames": self.frames, "total": self.total, "min": self.min,
+                "max": self.max, "alerts": self.alerts, "histogram": self.histogram}
+
+    @classmethod
+    def from_state(cls, state: Dict, resolution: int) -> "RollupBucket":
+        bucket = cls(float(state["start"]), resolution)
+        bucket.frames = int(state["frames"])
+        bucket.total = float(state["total"])
+        bucket.min = state["min"]
+        bucket.max = state["max"]
+        bucket.alerts = int(state["alerts"])
+        bucket.histogram = {int(k): int(v) for k, v in state["histogram"].items()}
+        return bucket
+
+    def to_dict(self) -> Dict:
+        return {
+            "start": datetime.fromtimestamp(self.start).isoformat(),
+            "resolution_s": self.resolution,
+            "frames": self.frames,
+            "count_min": self.min,
+            "count_max": self.max,
+            "count_mean": self.total / self.frames,
+            "count_p95": self.percentile(95),
+            "alert_fraction": self.alerts / self.frames,
+        }
+
+
+class RollupAggregator:
+    """
+    Maintains one open bucket per resolution and closes it when a frame
+    arrives past its end. Closed buckets are kept in bounded deques and
+    passed to on_flush(bucket_dict) if given. Buckets waiting for drain()
+    are bounded too; the oldest are dropped if nothing drains them.
+    """
+
+    def __init__(self,
+                 resolutions: Iterable[int] = DEFAULT_RESOLUTIONS,
+                 max_closed: int = 1000,
+                 on_flush: Optional[Callable[[Dict], None]] = None,
+                 max_pending: int = 10000):
+        self.resolutions = tuple(int(r) for r in resolutions)
+        self.on_flush = on_flush
+        self._open: Dict[int, Optional[RollupBucket]] = {r: None for r in self.resolutions}
+        self.closed: Dict[int, deque] = {r: deque(maxlen=max_closed) for r in self.resolutions}
+        self._pending: deque = deque(maxlen=int(max_pending))
+
+    def add(self, timestamp: float, count: float, alert: bool = False) -> List[Dict]:
+        """Fold one frame in; returns the buckets this frame closed."""
+        flushed = []
+        for res in self.resolutions:
+            bucket = self._open[res]
+            start = timestamp - (timestamp % res)
+            if bucket is not None and start != bucket.start:
+                flushed.append(self._close(res))
+                bucket = None
+            if bucket is None:
+                bucket = self._open[res] = RollupBucket(start, res)
+            bucket.add(count, alert)
+        return flushed
+
+    def flush(self) -> List[Dict]:
+        """Close all open buckets (e.g. on shutdown)."""
+        return [self._close(res) for res in self.resolutions if self._open[res] is not None]
+
+    def _close(self, res: int) -> Dict:
+        record = self._open[res].to_dict()
+        self._open[res] = None
+        self.closed[res].append(record)
+        self._pending.append(record)
+        if self.on_flush is not None:
+            self.on_flush(record)
+        return record
+
+    def drain(self) -> List[Dict]:
+        """Buckets closed since the last drain, for writing to result files."""
+        pending = list(self._pending)
+        self._pending.clear()
+        return pending
+
+    def get_state(self) -> Dict:
+        """Open buckets and closed buckets not yet drained, for pipeline checkpoints."""
+        return {
+            "open": {str(res): b.get_state() for res, b in self._open.items() if b is not None},
+            "pending": list(self._pending),
+        }
+
+    def set_state(self, state: Dict) -> None:
+        for res, bucket in state.get("open", {}).items():
+            if int(res) in self._open:
+                self._open[int(res)] = RollupBucket.from_state(bucket, int(res))
+        self._pending.extend(state.get("pending", []))
+
+    def series(self, resolution: int, field: str = "count_mean") -> List[float]:
+        """One field of the closed buckets at a resolution, oldest first."""
+        return [b[field] for b in self.closed[resolution]]
+
+
+def rollup_detections(detection_data: List[Dict], resolutions: Iterable[int] = DEFAULT_RESOLUTIONS) -> RollupAggregator:
+    """Build rollups from stored detection records using their ISO timestamps."""
+    agg = RollupAggregator(resolutions)
+    for d in detection_data:
+        ts = datetime.fromisoformat(d["timestamp"]).timestamp()
+        agg.add(ts, d["count"], d.get("alert", False))
+    agg.flush()
+    return agg
@@ -0,0 +1,238 @@
+"""
+models/sweep.py
+
+Postprocessing parameter sweep for CrowdAnalyzer with single-pass inference.
+
+- YOLO runs once per frame in the main process (or raw detections are
+  replayed from a DetectionCache); only the raw boxes go to the workers.
+- Frames are shipped in chunks to a process pool; each worker holds one
+  postprocess-only CrowdAnalyzer per configuration and applies all of them
+  to every frame of the chunk.
+- Resulting counts are scored against ground truth with
+  model_utils.calculate_metrics and reported next to the postprocessing cost
+  of each configuration.
+
+Usage:
+    python -m models.sweep --source models/crowd.mp4 --weights yolov8n.pt --ground-truth gt.csv
+    python -m models.sweep --source clip.mp4 --weights yolov8n.pt --ground-truth gt.json --grid grid.json
+
+Ground truth is a CSV with frame,count columns or a JSON list of counts
+(frame 1 first) / {frame: count} object. The grid is a JSON object mapping
+CrowdAnalyzer postprocessing parameters to lists of values.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .detection_model import CrowdAnalyzer
+from .model_utils import calculate_metrics
+
+SWEEP_PARAMS = (
+    "head_top_ratio", "head_radius_scale", "circle_nms_factor", "nms_mode", "nms_iou", "min_bbox_area",
+    "enable_refine", "refine_top_scale", "hough_dp", "hough_min_dist", "hough_param1", "hough_param2",
+    "hough_min_radius_scale", "hough_max_radius_scale",
+)
+
+DEFAULT_GRID = {
+    "head_top_ratio": [0.15, 0.18, 0.22],
+    "circle_nms_factor": [0.6, 0.8, 1.0],
+    "min_bbox_area": [300, 600, 1200],
+    "enable_refine": [False],
+}
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """Cartesian product of a parameter grid; nms_iou only varies under nms_mode="area"."""
+    unknown = set(grid) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Not postprocessing parameters: {sorted(unknown)}")
+    keys = list(grid)
+    configs, seen = [], set()
+    for values in itertools.product(*(grid[k] for k in keys)):
+        config = dict(zip(keys, values))
+        if config.get("nms_mode", "distance") != "area":
+            config.pop("nms_iou", None)
+        key = json.dumps(config, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def load_ground_truth(path: str) -> Dict[int, float]:
+    """Frame number (1-based, as CrowdAnalyzer.frame_counter) -> true count."""
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            return {int(row["frame"]): float(row["count"]) for row in csv.DictReader(f)}
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {i: float(c) for i, c in enumerate(data, 1)}
+    return {int(k): float(v) for k, v in data.items()}
+
+
+# ---------------- Workers ----------------
+_WORKER = {}
+
+
+def _init_worker(configs: List[Dict], count_mode: str) -> None:
+    """Build one postprocess-only analyzer per configuration, once per process."""
+    _WORKER["analyzers"] = [CrowdAnalyzer(None, adaptive=False, count_mode=count_mode, **config)
+                            for config in configs]
+
+
+def _postprocess_chunk(job):
+    """Apply every configuration to a chunk of frames; returns counts and seconds per config."""
+    frames, raws = job
+    analyzers = _WORKER["analyzers"]
+    counts = np.zeros((len(analyzers), len(raws)), dtype=np.int64)
+    seconds = np.zeros(len(analyzers))
+    for i, analyzer in enumerate(analyzers):
+        start = time.perf_counter()
+        for j, (frame, raw) in enumerate(zip(frames, raws)):
+            batch = analyzer.postprocess(frame, raw)
+            counts[i, j] = len(batch) if analyzer.count_mode == "persons" else len(batch.circles)
+        seconds[i] = time.perf_counter() - start
+    return counts, seconds
+
+
+# ---------------- Sweep ----------------
+def run_sweep(source: str, weights: str, configs: List[Dict], device: str = "cpu",
+              count_mode: str = "heads", imgsz: int = 640, max_frames: Optional[int] = None,
+              chunk_frames: int = 32, workers: Optional[int] = None,
+              cache_dir: Optional[str] = None) -> Dict:
+    """
+    Run inference once per frame of `source` and every configuration on the raw boxes.
+    Returns per-config count arrays (frame order) and postprocessing seconds.
+    """
+    # Fixed imgsz so every configuration sees the same raw detections
+    detector = CrowdAnalyzer(weights, device=device, imgsz=imgsz, adaptive=False)
+    if cache_dir:
+        from .detection_cache import DetectionCache
+
+        detector.detection_cache = DetectionCache.for_analyzer(cache_dir, source, weights, detector)
+    # Frames only need to travel to workers when some configuration refines with Hough
+    needs_frames = any(config.get("enable_refine", True) for config in configs)
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video source: {source}")
+
+    workers = workers or os.cpu_count() or 1
+    chunks, pending = [], []
+    frames, raws = [], []
+    frame_idx = 0
+    infer_s = 0.0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(configs, count_mode)) as pool:
+        while max_frames is None or frame_idx < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_idx += 1
+            start = time.perf_counter()
+            raw = detector.raw_detections(frame, frame_idx)
+            infer_s += time.perf_counter() - start
+            frames.append(frame if needs_frames else SimpleNamespace(shape=frame.shape))
+            raws.append(raw)
+            if len(raws) == chunk_frames:
+                pending.append(pool.submit(_postprocess_chunk, (frames, raws)))
+                frames, raws = [], []
+                # Bound the frames held in flight
+                if len(pending) >= 2 * workers:
+                    chunks.append(pending.pop(0).result())
+        if raws:
+            pending.append(pool.submit(_postprocess_chunk, (frames, raws)))
+        chunks.extend(f.result() for f in pending)
+    cap.release()
+    if detector.detection_cache is not None:
+        detector.detection_cache.close()
+
+    if not chunks:
+        raise RuntimeError(f"No frames read from {source}")
+    return {
+        "frames": frame_idx,
+        "infer_s": infer_s,
+        "counts": np.concatenate([c for c, _ in chunks], axis=1),
+        "post_s": np.sum([s for _, s in chunks], axis=0),
+    }
+
+
+def score_sweep(configs: List[Dict], sweep: Dict, ground_truth: Dict[int, float]) -> List[Dict]:
+    """Metrics per configuration on frames that have ground truth, best MAE first."""
+    frames = np.array(sorted(f for f in ground_truth if 1 <= f <= sweep["frames"]), dtype=np.int64)
+    if len(frames) == 0:
+        raise ValueError("Ground truth covers none of the processed frames")
+    y_true = np.array([ground_truth[f] for f in frames])
+    rows = []
+    for config, counts, post_s in zip(configs, sweep["counts"], sweep["post_s"]):
+        y_pred = counts[frames - 1].astype(np.float64)
+        metrics = calculate_metrics(y_true, y_pred)
+        rows.append({
+            "config": config,
+            **metrics,
+            "bias": float(np.mean(y_pred - y_true)),
+            "post_ms_per_frame": 1000.0 * post_s / sweep["frames"],
+        })
+    return sorted(rows, key=lambda r: r["mae"])
+
+
+def print_report(rows: List[Dict], sweep: Dict, top: Optional[int] = None) -> None:
+    from tabulate import tabulate
+
+    keys = list(dict.fromkeys(k for r in rows for k in r["config"]))
+    table = [[r["config"].get(k, "") for k in keys]
+             + [f"{r['mae']:.2f}", f"{r['rmse']:.2f}", f"{r['r2']:.3f}", f"{r['bias']:+.2f}",
+                f"{r['post_ms_per_frame']:.2f}"] for r in rows[:top]]
+    print(tabulate(table, headers=keys + ["MAE", "RMSE", "R2", "Bias", "Post ms/frame"], tablefmt="github"))
+    print(f"\n{len(rows)} configurations on {sweep['frames']} frames; "
+          f"inference {1000.0 * sweep['infer_s'] / sweep['frames']:.1f} ms/frame, run once")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep CrowdAnalyzer postprocessing parameters")
+    parser.add_argument("--source", required=True, help="Video file")
+    parser.add_argument("--weights", required=True, help="Path to YOLO weights file")
+    parser.add_argument("--ground-truth", required=True, help="CSV (frame,count) or JSON counts")
+    parser.add_argument("--grid", help="JSON file mapping parameters to value lists (default: built-in grid)")
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--count-mode", default="heads", choices=["persons", "heads"])
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--chunk-frames", type=int, default=32, help="Frames per pool task")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    parser.add_argument("--cache-dir", help="Reuse raw detections from a DetectionCache")
+    parser.add_argument("--top", type=int, default=None, help="Only print the best N configurations")
+    parser.add_argument("--output", help="Also write the scored rows as JSON")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    configs = expand_grid(grid)
+    ground_truth = load_ground_truth(args.ground_truth)
+
+    start = time.perf_counter()
+    sweep = run_sweep(args.source, args.weights, configs, args.device, args.count_mode, args.imgsz,
+                      args.max_frames, args.chunk_frames, args.workers, args.cache_dir)
+    rows = score_sweep(configs, sweep, ground_truth)
+    print_report(rows, sweep, args.top)
+    print(f"Swept in {time.perf_counter() - start:.2f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+models/synthetic.py
+
+Synthetic inputs shared by the calibration and load-test tools
+(models/inference_pool.py, scripts/simulate_data.py, scripts/soak_test.py).
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+def synthetic_clip(n_frames: int = 16, shape: Tuple[int, int] = (720, 1280), seed: int = 0) -> List[np.ndarray]:
+    """Smoothed noise frames: network cost is content-independent, but they hold no people to post-process."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        frame = rng.integers(0, 256, (shape[0], shape[1], 3), dtype=np.uint8)
+        frames.append(cv2.GaussianBlur(frame, (9, 9), 0))
+    return frames
@@ -0,0 +1,137 @@
+"""
+models/zones.py
+
+Per-zone counts and line-crossing counts for a camera.
+
+- Zone polygons are rasterized once into a uint8 label map at a reduced
+  working resolution; each frame assigns all head centers with one array
+  lookup and counts them with np.bincount (no per-point polygon tests).
+- Line crossings come from matching head centers between consecutive frames
+  and a vectorized segment-intersection test against each counting line.
+
+Config file format (JSON, coordinates in frame pixels):
+    {
+      "zones": [{"name": "entrance", "polygon": [[x, y], ...], "max_count": 8}],
+      "lines": [{"name": "gate", "p1": [x, y], "p2": [x, y]}]
+    }
+Zones later in the list win where polygons overlap. A crossing counts as "in"
+when a head moves from the right of p1->p2 to its left (image coordinates).
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+
+class ZoneMap:
+    """Label raster of zone polygons with vectorized point assignment."""
+
+    def __init__(self, zones: List[Dict], frame_shape: Tuple[int, int], scale: float = 0.25):
+        if len(zones) > 255:
+            raise ValueError("At most 255 zones are supported per camera")
+        self.zones = zones
+        self.names = [z["name"] for z in zones]
+        self.max_counts = [z.get("max_count") for z in zones]
+        self.frame_h, self.frame_w = int(frame_shape[0]), int(frame_shape[1])
+        self.scale = float(scale)
+        h = max(1, int(round(self.frame_h * self.scale)))
+        w = max(1, int(round(self.frame_w * self.scale)))
+        self.label_map = np.zeros((h, w), dtype=np.uint8)
+        for idx, zone in enumerate(zones, 1):
+            pts = np.round(np.asarray(zone["polygon"], dtype=np.float64) * self.scale).astype(np.int32)
+            cv2.fillPoly(self.label_map, [pts], idx)
+
+    def assign(self, centers: np.ndarray) -> np.ndarray:
+        """Zone label (0 = none, i = zones[i - 1]) for each (x, y) center."""
+        centers = np.asarray(centers).reshape(-1, 2)
+        x = np.clip((centers[:, 0] * self.scale).astype(np.int64), 0, self.label_map.shape[1] - 1)
+        y = np.clip((centers[:, 1] * self.scale).astype(np.int64), 0, self.label_map.shape[0] - 1)
+        return self.label_map[y, x]
+
+    def count(self, centers: np.ndarray) -> Dict[str, int]:
+        """Head count per zone name."""
+        counts = np.bincount(self.assign(centers), minlength=len(self.names) + 1)[1:]
+        return dict(zip(self.names, counts.tolist()))
+
+    def over_limit(self, counts: Dict[str, int]) -> List[str]:
+        """Zones whose count exceeds their configured max_count."""
+        return [name for name, limit in zip(self.names, self.max_counts)
+                if limit is not None and counts.get(name, 0) > limit]
+
+
+class LineCounter:
+    """In/out crossing counts for counting lines from consecutive head positions."""
+
+    def __init__(self, lines: List[Dict], max_match_dist: float = 50.0):
+        self.names = [l["name"] for l in lines]
+        self.p1 = np.array([l["p1"] for l in lines], dtype=np.float64).reshape(-1, 2)
+        self.p2 = np.array([l["p2"] for l in lines], dtype=np.float64).reshape(-1, 2)
+        self.max_match_dist = float(max_match_dist)
+        self.totals = {name: {"in": 0, "out": 0} for name in self.names}
+        self.prev_centers = np.zeros((0, 2), dtype=np.float64)
+
+    def _match(self, centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mutual nearest-neighbour pairs (prev_idx, curr_idx) within max_match_dist."""
+        prev = self.prev_centers
+        if len(prev) == 0 or len(centers) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        dist = np.hypot(prev[:, None, 0] - centers[None, :, 0], prev[:, None, 1] - centers[None, :, 1])
+        nearest_curr = dist.argmin(axis=1)
+        nearest_prev = dist.argmin(axis=0)
+        prev_idx = np.arange(len(prev))
+        mutual = (nearest_prev[nearest_curr] == prev_idx) & (dist[prev_idx, nearest_curr] <= self.max_match_dist)
+        return prev_idx[mutual], nearest_curr[mutual]
+
+    def update(self, centers: np.ndarray) -> Dict[str, Dict[str, int]]:
+        """Fold in one frame of centers; returns this frame's crossings per line."""
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        frame_counts = {name: {"in": 0, "out": 0} for name in self.names}
+        prev = self.prev_centers
+        prev_idx, curr_idx = self._match(centers)
+        self.prev_centers = centers
+        if len(prev_idx) == 0 or not self.names:
+            return frame_counts
+
+        # Movement segments a -> b for matched heads, tested against every line at once
+        a, b = prev[prev_idx], centers[curr_idx]
+        d = (self.p2 - self.p1)[:, None, :]
+        side_a = _cross(d, a[None, :, :] - self.p1[:, None, :])  # (lines, pairs)
+        side_b = _cross(d, b[None, :, :] - self.p1[:, None, :])
+        seg = (b - a)[None, :, :]
+        side_p1 = _cross(seg, self.p1[:, None, :] - a[None, :, :])
+        side_p2 = _cross(seg, self.p2[:, None, :] - a[None, :, :])
+        crossed = (side_a * side_b < 0) & (side_p1 * side_p2 < 0)
+
+        ins = (crossed & (side_a > 0)).sum(axis=1)
+        outs = (crossed & (side_a < 0)).sum(axis=1)
+        for name, n_in, n_out in zip(self.names, ins.tolist(), outs.tolist()):
+            frame_counts[name] = {"in": n_in, "out": n_out}
+            self.totals[name]["in"] += n_in
+            self.totals[name]["out"] += n_out
+        return frame_counts
+
+    def get_state(self) -> Dict:
+        """Tracked positions and running totals, for checkpoints."""
+        return {"prev_centers": self.prev_centers.tolist(), "totals": self.totals}
+
+    def set_state(self, state: Dict) -> None:
+        self.prev_centers = np.asarray(state["prev_centers"], dtype=np.float64).reshape(-1, 2)
+        for name, totals in state["totals"].items():
+            if name in self.totals:
+                self.totals[name] = dict(totals)
+
+
+def _cross(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """z component of the 2-D cross product, broadcast over leading axes."""
+    return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+
+def load_zone_config(path: str) -> Dict:
+    """Read a per-camera zone/line config file."""
+    with open(path) as f:
+        config = json.load(f)
+    config.setdefault("zones", [])
+    config.setdefault("lines", [])
+    return config
@@ -2,10 +2,9 @@ import cv2
 import json
 import os
 import sys
+from collections import deque
 from pathlib import Path
 import urllib.request
-from tqdm import tqdm
-from ultralytics import YOLO
 
 # Ensure models directory is in the Python path
 current_dir = Path(__file__).parent
@@ -13,9 +12,13 @@ models_dir = current_dir / "models"
 sys.path.append(str(current_dir))
 
 from models.crowd_pipeline import CrowdPipeline
+from services.video_service import FrameSampler
+from services.rate_policy_service import ForecastRatePolicy
 
 def download_with_progress(url: str, output_path: str):
     """Download file with progress bar"""
+    from tqdm import tqdm
+
     try:
         response = urllib.request.urlopen(url)
         total_size = int(response.headers.get('content-length', 0))
@@ -93,6 +96,8 @@ def download_yolo_weights(weights_name="yolov8m.pt"):
     if not weights_path.exists():
         print(f"Downloading YOLO weights to {weights_path}...")
         try:
+            from ultralytics import YOLO
+
             # Let ultralytics handle the download
             model = YOLO(weights_name)
             # Move weights to our weights directory
@@ -113,7 +118,27 @@ def download_yolo_weights(weights_name="yolov8m.pt"):
     
     return str(weights_path)
 
-def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id: str, email: str, password: str):
+def pooled_detections(pool, sampled, window: int):
+    """Yield sampled frames with their DetectorPool batch, in source order, keeping `window` frames in flight."""
+    pending, done = deque(), {}
+
+    def oldest():
+        seq, item = pending.popleft()
+        while seq not in done:
+            finished, batch = pool.get(timeout=300)
+            done[finished] = batch
+        return (*item, done.pop(seq))
+
+    for seq, item in enumerate(sampled):
+        pool.submit(seq, item[2])
+        pending.append((seq, item))
+        if len(pending) >= window:
+            yield oldest()
+    while pending:
+        yield oldest()
+
+def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id: str, email: str, password: str,
+                 sample_fps: float = None, adaptive_rate: bool = False, pool_layout: str = None):
     """Run the complete detection and forecasting pipeline"""
     # Handle video path
     if str(video_path).lower() in ["0", "webcam"]:
@@ -147,11 +172,24 @@ def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id:
             except Exception as e:
                 raise FileNotFoundError(f"Could not find or download weights: {e}")
 
+    rate_policy = ForecastRatePolicy() if adaptive_rate else None
+    pool, detector = None, None
+    if pool_layout:
+        from models.detection_model import CrowdAnalyzer
+        from models.inference_pool import DetectorPool, load_clip
+
+        # CPU worker processes with the calibrated layout (calibrated on this video when none is saved)
+        clip = load_clip(str(video_path)) if video_path != 0 else None
+        pool = DetectorPool.from_calibration(weights_path, path=pool_layout, device="cpu", frames=clip)
+        # Workers detect and post-process; the pipeline only needs a network-free instance for counting
+        detector = CrowdAnalyzer(yolo_weights=None)
     pipeline = CrowdPipeline(
         detection_weights=weights_path,
         device="cuda",
         source_type="webcam" if video_path == 0 else "file",
-        camera_id=camera_id
+        camera_id=camera_id,
+        rate_policy=rate_policy,
+        detector=detector
     )
 
     # Authenticate with the backend
@@ -166,6 +204,8 @@ def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id:
     
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
+        if pool is not None:
+            pool.close()
         raise RuntimeError(f"Could not open video: {video_path}")
         
     frame_count = 0
@@ -173,13 +213,20 @@ def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id:
         print(f"Processing video: {video_path}")
         print(f"Saving results to: {output_dir}")
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
+        sampler = FrameSampler(cap, sample_fps)
+        if sample_fps:
+            print(f"Sampling {sampler.source_fps:.1f} fps source at {sample_fps} fps (every {sampler.step:.1f} frames)")
+        if pool is not None:
+            print(f"Detecting with a {pool.layout} worker pool")
+            frames = pooled_detections(pool, sampler, 2 * pool.layout.workers)
+        else:
+            frames = ((*item, None) for item in sampler)
+        for source_frame, media_time, frame, detections in frames:
             # Process frame
-            annotated, count, avg_count, alert = pipeline.process_frame(frame)
+            annotated, count, avg_count, alert = pipeline.process_frame(
+                frame, media_time=media_time if sample_fps else None, source_frame=source_frame,
+                detections=detections
+            )
             frame_count += 1
             
             # Generate forecasts every 30 frames
@@ -196,8 +243,14 @@ def run_pipeline(video_path: str, weights_path: str, output_dir: str, camera_id:
     finally:
         cap.release()
         cv2.destroyAllWindows()
+        if pool is not None:
+            pool.close()
         
     print("Processing complete!")
+    if rate_policy is not None:
+        report = rate_policy.report()
+        print(f"Adaptive rate: {report['compute_saved']:.1%} detection compute saved, "
+              f"{report['missed_crossings']} threshold crossings first seen at a reduced rate")
     return frame_count
 
 if __name__ == "__main__":
@@ -209,7 +262,13 @@ if __name__ == "__main__":
     parser.add_argument("--camera_id", default="cam01", help="Camera ID for the backend")
     parser.add_argument("--email", help="Email for backend authentication")
     parser.add_argument("--password", help="Password for backend authentication")
+    parser.add_argument("--sample-fps", type=float, help="Analyze at this rate; skipped frames are grabbed without retrieve/convert")
+    parser.add_argument("--adaptive-rate", action="store_true", help="Detect sparsely while the forecast stays far below the alert threshold")
+    parser.add_argument("--pool", nargs="?", const="config/inference_layout.json", metavar="LAYOUT_JSON",
+                        help="Detect on a CPU worker pool with the calibrated layout (see models/inference_pool.py)")
     args = parser.parse_args()
+    if args.pool and args.adaptive_rate:
+        parser.error("--pool detects every sampled frame ahead of time; it cannot be combined with --adaptive-rate")
     
     try:
         # Ensure directories exist
@@ -222,7 +281,8 @@ if __name__ == "__main__":
         if args.video.lower() in ["0", "webcam"]:
             args.video = "0"
             
-        total_frames = run_pipeline(args.video, args.weights, args.output, args.camera_id, args.email, args.password)
+        total_frames = run_pipeline(args.video, args.weights, args.output, args.camera_id, args.email, args.password,
+                                    args.sample_fps, args.adaptive_rate, args.pool)
         print(f"Processed {total_frames} frames")
     except FileNotFoundError as e:
         print(f"Error: {e}")
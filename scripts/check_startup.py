@@ -0,0 +1,106 @@
+"""
+scripts/check_startup.py
+
+Startup budget check for the detection-only entry points.
+
+Imports each entry module in a fresh interpreter with `-X importtime`, then
+fails if the import is slower or larger than the budget, or if any heavy
+framework (TensorFlow, matplotlib, torch, ...) was loaded before it is needed.
+
+Usage:
+    python scripts/check_startup.py
+    python scripts/check_startup.py --max-seconds 1.0 --max-rss-mb 150
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_MODULES = ["run_pipeline", "models.crowd_pipeline", "models.detection_model"]
+
+# Frameworks that only specific code paths need; none may load at import time
+HEAVY_MODULES = ["tensorflow", "keras", "torch", "ultralytics", "matplotlib",
+                 "pandas", "sklearn", "scipy", "colorama", "tqdm", "tabulate", "requests"]
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_kb / 1024.0, "heavy": heavy}}))
+"""
+
+
+def parse_importtime(stderr: str, top: int = 5):
+    """Slowest direct dependencies (cumulative microseconds) from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def probe(module: str):
+    """Import module in a clean interpreter and return its measurements."""
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=str(REPO_ROOT), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["slowest"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enforce the detection-only startup budget")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_MODULES)
+    parser.add_argument("--max-seconds", type=float, default=1.5, help="Import time budget per module")
+    parser.add_argument("--max-rss-mb", type=float, default=200.0, help="Peak RSS budget after import")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        try:
+            r = probe(module)
+        except RuntimeError as e:
+            print(e)
+            failures.append(module)
+            continue
+        print(f"{module}: {r['seconds']:.3f}s, {r['rss_mb']:.1f} MB peak RSS")
+        for micros, name in r["slowest"]:
+            print(f"    {micros / 1000.0:8.1f} ms  {name}")
+        problems = []
+        if r["seconds"] > args.max_seconds:
+            problems.append(f"import took {r['seconds']:.3f}s > {args.max_seconds}s")
+        if r["rss_mb"] > args.max_rss_mb:
+            problems.append(f"peak RSS {r['rss_mb']:.1f} MB > {args.max_rss_mb} MB")
+        if r["heavy"]:
+            problems.append(f"heavy modules loaded at import: {', '.join(r['heavy'])}")
+        for problem in problems:
+            print(f"  FAIL: {problem}")
+        if problems:
+            failures.append(module)
+
+    if failures:
+        print(f"Startup budget exceeded for: {', '.join(failures)}")
+        sys.exit(1)
+    print("Startup budget OK")
+
+
+if __name__ == "__main__":
+    main()
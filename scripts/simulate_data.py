@@ -0,0 +1,300 @@
+"""
+scripts/simulate_data.py
+
+High-volume synthetic detection streams for load testing the non-detection
+stages of the pipeline.
+
+- Generates per-camera count streams for N cameras with a daily cycle,
+  random decaying bursts and noise (as in forecasting_model.demo_run),
+  vectorized per camera.
+- Bypasses video decoding and the network: each camera is a real
+  CrowdPipeline whose detector is a stub replaying its count stream as boxes
+  of people walking across a synthetic frame. Everything after inference
+  runs as in production: detection post-processing, forecasting
+  (ForecasterSelector), zones, lines, flow and heatmap, alerting
+  (AlertEngine), persistence (rollups + periodic result files) and upload
+  (backend POSTs when --upload-url is given).
+- Ramps the offered rate in 1-second ticks and reports the sustained
+  throughput, per-stage cost, and the rate at which each stage (and the whole
+  chain) starts to fall behind. Stage costs come from timing the pipeline's
+  components in place; "other" is the rest of process_frame (history and
+  records; drawing too with --annotate).
+- Events take process_frame's annotate=False path by default: the overlays
+  are display-only and would otherwise be the single largest "other" cost.
+
+Each event still runs a full process_frame in one Python process, so the
+ceiling is per-event Python overhead rather than any one stage. Measured on a
+single-core VM (10 cameras, 180x320 frames, --save-every 0): about 4,800 ev/s
+sustained, ~3,900 ev/s with --annotate; tracking (flow and heatmap) is the
+largest stage at ~100 us per event. The default ramp goes past that, so the
+report shows where the chain falls behind.
+
+Usage:
+    python scripts/simulate_data.py --cameras 10 --rates 1000 2000 4000 8000
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from models.crowd_pipeline import CrowdPipeline
+from models.detection_model import CrowdAnalyzer
+from models.detections import DetectionBatch
+from models.synthetic import synthetic_clip
+from services.alert_service import AlertRule
+
+STAGES = ("detection", "forecasting", "tracking", "alerting", "persistence", "upload", "other")
+
+# Component methods timed per stage, as (attribute path on the pipeline, method names)
+STAGE_METHODS = {
+    "detection": [("detector", ("detect",))],
+    "forecasting": [("forecast_selector", ("observe", "forecast"))],
+    "tracking": [("zone_map", ("count",)), ("line_counter", ("update",)), ("flow", ("update",)),
+                 ("heatmap", ("update",))],
+    "alerting": [("alert_engine", ("evaluate", "is_active"))],
+    "persistence": [("rollups", ("add",)), ("", ("save_pipeline_data",))],
+    "upload": [("", ("send_data_to_backend",))],
+}
+
+
+def instrument(pipeline: CrowdPipeline, wrap) -> None:
+    """Replace each STAGE_METHODS method on the pipeline's components with wrap(method, stage)."""
+    for stage, targets in STAGE_METHODS.items():
+        for attr, methods in targets:
+            obj = getattr(pipeline, attr) if attr else pipeline
+            if obj is None:
+                continue
+            for name in methods:
+                setattr(obj, name, wrap(getattr(obj, name), stage))
+
+
+def generate_counts(n_events: int, rate_hz: float, seed: int = 0, start_ts: float = 0.0,
+                    base: float = 20.0, burst_prob: float = 0.0005, noise: float = 2.0) -> np.ndarray:
+    """One camera's counts: daily cycle + exponentially decaying bursts + Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    t = start_ts + np.arange(n_events) / rate_hz
+    phase = rng.uniform(0, 2 * np.pi)
+    daily = base * (1.0 + 0.6 * np.sin(2 * np.pi * t / 86400.0 + phase))
+
+    # Bursts: sparse impulses convolved with a decay kernel of ~10 s
+    impulses = (rng.random(n_events) < burst_prob) * rng.uniform(0.5, 2.0, n_events) * base
+    kernel = np.exp(-np.arange(int(10 * rate_hz) + 1) / rate_hz / 3.0)
+    bursts = np.convolve(impulses, kernel)[:n_events]
+
+    counts = daily + bursts + rng.normal(0, noise, n_events)
+    return np.clip(np.round(counts), 0, None).astype(np.int64)
+
+
+class StubDetector(CrowdAnalyzer):
+    """
+    CrowdAnalyzer without a network: each inference returns count[i] person
+    boxes taken from a population of people walking across the frame. The
+    rest of detect() (caching, post-processing, circle NMS) runs as is.
+    """
+
+    def __init__(self, counts: np.ndarray, frame_shape: Tuple[int, int], seed: int = 0):
+        super().__init__(yolo_weights=None, device="cpu", adaptive=False)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.frame_h, self.frame_w = int(frame_shape[0]), int(frame_shape[1])
+        rng = np.random.default_rng(seed)
+        n = int(self.counts.max()) + 1
+        self._pos = rng.uniform((0, 0), (self.frame_w, self.frame_h), (n, 2))
+        self._vel = rng.normal(0, 2.0, (n, 2))
+        self._size = np.array([self.frame_w / 40, self.frame_h / 8])
+        self._data = np.zeros((n, 6), dtype=np.float32)
+        self._data[:, 4] = 0.9
+        self._calls = 0
+
+    def _infer(self, frame_bgr) -> DetectionBatch:
+        n = int(self.counts[self._calls % len(self.counts)])
+        self._calls += 1
+        self.frame_counter += 1
+        self._pos = (self._pos + self._vel) % (self.frame_w, self.frame_h)
+        self._data[:, 0:2] = self._pos - self._size / 2
+        self._data[:, 2:4] = self._pos + self._size / 2
+        data = self._data[:n]
+        return DetectionBatch(data[:, :4].copy(), data[:, 5].astype(np.int64), data[:, 4].copy())
+
+
+def zone_config(frame_shape: Tuple[int, int]) -> Dict:
+    """Two zones splitting the frame and one counting line between them."""
+    h, w = frame_shape
+    return {
+        "zones": [
+            {"name": "left", "polygon": [[0, 0], [w // 2, 0], [w // 2, h], [0, h]], "max_count": 15},
+            {"name": "right", "polygon": [[w // 2, 0], [w, 0], [w, h], [w // 2, h]], "max_count": 15},
+        ],
+        "lines": [{"name": "middle", "p1": [w // 2, 0], "p2": [w // 2, h]}],
+    }
+
+
+class SimCamera:
+    """One camera: a CrowdPipeline fed by a StubDetector, with its components timed per stage."""
+
+    def __init__(self, camera_id: str, counts: np.ndarray, frames: List[np.ndarray], persist_dir: str,
+                 zones_path: str, stage_s: Dict[str, float], alert_threshold: float = 30,
+                 save_every: int = 30, forecast_model: Optional[str] = None,
+                 upload_url: Optional[str] = None, seed: int = 0, annotate: bool = False):
+        self.camera_id = camera_id
+        self.annotate = annotate  # drawing is display-only; on, it lands in "other"
+        self.frames = frames
+        self.results_dir = os.path.join(persist_dir, camera_id)
+        self.save_every = save_every
+        self.stage_s = stage_s
+        self.pipeline = CrowdPipeline(
+            device="cpu",
+            camera_id=camera_id,
+            detector=StubDetector(counts, frames[0].shape[:2], seed),
+            zone_config=zones_path,
+            forecast_model_path=forecast_model,
+            alert_rules=[AlertRule("crowd_high", threshold=alert_threshold),
+                         AlertRule("crowd_forecast_high", threshold=alert_threshold, metric="forecast")],
+        )
+        if upload_url:
+            self.pipeline.backend_url = upload_url
+            self.pipeline.auth_token = "simulated"
+        self.frames_done = 0
+        self.process(np.zeros(1))  # zones and heatmap are built on the first frame; time them from then on
+        instrument(self.pipeline, self._timed)
+
+    def _timed(self, fn, stage: str):
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stage_s[stage] += time.perf_counter() - t0
+        return timed
+
+    def process(self, media_times: np.ndarray) -> None:
+        for t in media_times.tolist():
+            self.pipeline.process_frame(self.frames[self.frames_done % len(self.frames)], media_time=t,
+                                        source_frame=self.frames_done, annotate=self.annotate)
+            self.frames_done += 1
+            if self.save_every and self.frames_done % self.save_every == 0:
+                self.pipeline.save_pipeline_data(self.results_dir)
+
+
+def run_rate(cameras: List[SimCamera], rate: int, ticks: int, clock: List[float],
+             stage_s: Dict[str, float]) -> Dict:
+    """Offer `rate` events/s for `ticks` one-second ticks; returns per-stage timings."""
+    per_cam = max(1, rate // len(cameras))
+    for stage in stage_s:
+        stage_s[stage] = 0.0
+    lag = 0.0
+    events = 0
+    total_s = 0.0
+    wall_start = time.perf_counter()
+    for _ in range(ticks):
+        tick_start = time.perf_counter()
+        media_times = clock[0] + np.arange(per_cam) / per_cam
+        for cam in cameras:
+            cam.process(media_times)
+            events += per_cam
+        clock[0] += 1.0
+
+        busy = time.perf_counter() - tick_start
+        total_s += busy
+        if busy < 1.0:
+            lag = max(0.0, lag - (1.0 - busy))
+            if lag == 0.0:
+                time.sleep(1.0 - busy)
+        else:
+            lag += busy - 1.0
+    wall = time.perf_counter() - wall_start
+    stage_s["other"] = max(0.0, total_s - sum(v for k, v in stage_s.items() if k != "other"))
+    return {"rate": per_cam * len(cameras), "events": events, "wall_s": wall,
+            "throughput": events / wall, "lag_s": lag, "stage_s": dict(stage_s), "ticks": ticks}
+
+
+def print_report(rows: List[Dict]) -> None:
+    from tabulate import tabulate
+
+    headers = ["Offered ev/s", "Sustained ev/s", "Lag s"] + [f"{s} util" for s in STAGES] + ["Total util"]
+    table = []
+    for r in rows:
+        utils = [r["stage_s"][s] / r["ticks"] for s in STAGES]
+        table.append([r["rate"], f"{r['throughput']:.0f}", f"{r['lag_s']:.2f}"]
+                     + [f"{u:.2f}" for u in utils] + [f"{sum(utils):.2f}"])
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+    print("\nFirst offered rate at which each stage alone needs more than one second per second:")
+    for stage in STAGES + ("total",):
+        behind = next((r["rate"] for r in rows
+                       if (sum(r["stage_s"].values()) if stage == "total" else r["stage_s"][stage]) / r["ticks"] >= 1.0),
+                      None)
+        # Capacity estimate from the per-event cost measured at the highest offered rate
+        last = rows[-1]
+        busy = sum(last["stage_s"].values()) if stage == "total" else last["stage_s"][stage]
+        capacity = last["events"] / busy if busy > 0 else float("inf")
+        label = f"{behind} ev/s" if behind else "not reached"
+        print(f"  {stage:12s} {label:>14s}   (capacity ~{capacity:,.0f} ev/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic detection stream load test")
+    parser.add_argument("--cameras", type=int, default=10)
+    parser.add_argument("--rates", type=int, nargs="+", default=[1000, 2000, 4000, 8000],
+                        help="Offered total events per second, ramped in order")
+    parser.add_argument("--ticks", type=int, default=3, help="Seconds to run at each rate")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[180, 320], metavar=("H", "W"))
+    parser.add_argument("--alert-threshold", type=float, default=30)
+    parser.add_argument("--save-every", type=int, default=30, help="Frames between result files per camera (0: none)")
+    parser.add_argument("--forecast-model", help="Exported LSTM for result files (see model_utils.export_forecast_model)")
+    parser.add_argument("--persist-dir", help="Where result files go (default: a temp dir)")
+    parser.add_argument("--upload-url", help="POST each camera's records here (as send_data_to_backend does)")
+    parser.add_argument("--annotate", action="store_true",
+                        help="Also draw the display overlays per frame, as run_pipeline.py does")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output")
+    args = parser.parse_args()
+
+    if args.save_every and not args.forecast_model and importlib.util.find_spec("tensorflow") is None:
+        parser.error("result files include LSTM forecasts, which need TensorFlow; "
+                     "pass --forecast-model or --save-every 0")
+
+    persist_dir = args.persist_dir or tempfile.mkdtemp(prefix="crowd_sim_")
+    os.makedirs(persist_dir, exist_ok=True)
+    frame_shape = tuple(args.frame_size)
+    zones_path = os.path.join(persist_dir, "zones.json")
+    with open(zones_path, "w") as f:
+        json.dump(zone_config(frame_shape), f)
+    frames = synthetic_clip(n_frames=8, shape=frame_shape, seed=args.seed)
+
+    per_cam_max = max(args.rates) // args.cameras + 1
+    stream_len = per_cam_max * args.ticks * len(args.rates)
+    start_ts = time.time()
+    stage_s = dict.fromkeys(STAGES, 0.0)
+    # The pipeline prints per frame (e.g. backend upload without a token); keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        cameras = [SimCamera(f"cam{i:03d}",
+                             generate_counts(stream_len, per_cam_max, seed=args.seed + i, start_ts=start_ts),
+                             frames, persist_dir, zones_path, stage_s, args.alert_threshold, args.save_every,
+                             args.forecast_model, args.upload_url, seed=args.seed + i, annotate=args.annotate)
+                   for i in range(args.cameras)]
+    clock = [1.0]  # media seconds; each camera's pipeline anchors them to the wall clock
+
+    print(f"Simulating {args.cameras} cameras; result files in {persist_dir}")
+    rows = []
+    for rate in args.rates:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            row = run_rate(cameras, rate, args.ticks, clock, stage_s)
+        rows.append(row)
+        print(f"  offered {row['rate']:>7} ev/s -> sustained {row['throughput']:,.0f} ev/s, lag {row['lag_s']:.2f}s")
+    print()
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
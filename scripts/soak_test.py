@@ -0,0 +1,292 @@
+"""
+scripts/soak_test.py
+
+Long-running soak test of CrowdPipeline with memory and leak tracking.
+
+- Drives the full pipeline (detection post-processing, zones and lines, flow,
+  forecasting, alerting, heatmap, rollups, result files and checkpoints) for
+  a simulated duration. Frames are synthetic and the detector is
+  simulate_data.StubDetector, which replays a count stream as boxes of
+  walking people, so no weights or GPU are needed. Simulated media time drives every clock.
+- Samples process RSS (less tracemalloc's own overhead) and tracemalloc's
+  traced total at a fixed simulated interval. Growth per simulated hour is
+  the least-squares slope of the samples taken after warm-up.
+- Compares a tracemalloc snapshot taken after warm-up with the final one.
+  Objects replaced in steady state cancel out. What is left is attributed to
+  the pipeline stage whose call allocated it: the outermost stage method on
+  its traceback, from the methods simulate_data times per stage
+  (simulate_data.STAGE_METHODS), so e.g. forecasting run by
+  save_pipeline_data counts as persistence. Allocations outside any stage
+  call fall back to the stage of their module. Per module, growth goes to the
+  innermost repo module on the traceback (or the library that allocated it).
+  Bounded buffers that are still filling show up too; a longer run tells them
+  apart from leaks.
+- With --save-every 0 nothing writes result files, so the soak drains the
+  closed rollup buckets itself at the same cadence; otherwise the pending
+  queue would fill up to its bound and read as growth.
+- Exits with status 1 when RSS or traced memory grows faster than
+  --max-growth-mb-per-hour.
+
+Usage:
+    python scripts/soak_test.py --hours 2 --fps 5
+    python scripts/soak_test.py --hours 24 --fps 2 --max-growth-mb-per-hour 2 --report soak.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+
+from scripts.simulate_data import STAGE_METHODS, StubDetector, generate_counts, zone_config
+from models.crowd_pipeline import CrowdPipeline
+from models.synthetic import synthetic_clip
+from services.rate_policy_service import ForecastRatePolicy
+
+# Repo modules by pipeline stage, for growth allocated outside any stage method
+STAGE_MODULES = {
+    "detection": ("models/detection_model.py", "models/detections.py", "models/preprocess.py",
+                  "models/detection_cache.py"),
+    "tracking": ("models/zones.py", "models/flow.py", "models/heatmap.py"),
+    "forecasting": ("models/forecasters.py", "models/forecast_cache.py", "models/forecasting_model.py",
+                    "models/model_utils.py"),
+    "alerting": ("services/alert_service.py",),
+    "scheduling": ("services/scheduler_service.py", "services/rate_policy_service.py"),
+    "persistence": ("models/rollups.py",),
+    "pipeline": ("models/crowd_pipeline.py",),
+    "harness": ("scripts/soak_test.py", "scripts/simulate_data.py"),
+}
+MODULE_STAGE = {module: stage for stage, modules in STAGE_MODULES.items() for module in modules}
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _owner(traceback: tracemalloc.Traceback) -> str:
+    """Innermost repo module on a traceback, else the library of the innermost frame."""
+    for frame in reversed(traceback):
+        path = Path(frame.filename)
+        try:
+            return path.resolve().relative_to(REPO_ROOT).as_posix()
+        except ValueError:
+            continue
+    filename = traceback[-1].filename if len(traceback) else "<unknown>"
+    parts = Path(filename).parts
+    if "site-packages" in parts:
+        return f"<{parts[parts.index('site-packages') + 1]}>"
+    return f"<{Path(filename).name}>"
+
+
+def attribute_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> Dict[str, Dict]:
+    """Net bytes and blocks allocated between two snapshots, per owning module."""
+    growth = defaultdict(lambda: {"bytes": 0, "blocks": 0})
+    for diff in after.compare_to(before, "traceback"):
+        owner = growth[_owner(diff.traceback)]
+        owner["bytes"] += diff.size_diff
+        owner["blocks"] += diff.count_diff
+    return dict(growth)
+
+
+def stage_code_ranges(pipeline: CrowdPipeline) -> List[Tuple[str, str, int, int]]:
+    """(stage, file, first line, last line) of every STAGE_METHODS method on the pipeline's components."""
+    ranges = []
+    for stage, targets in STAGE_METHODS.items():
+        for attr, methods in targets:
+            obj = getattr(pipeline, attr) if attr else pipeline
+            if obj is None:
+                continue
+            for name in methods:
+                code = getattr(obj, name).__func__.__code__
+                last = max(line for _, _, line in code.co_lines() if line is not None)
+                ranges.append((stage, code.co_filename, code.co_firstlineno, last))
+    return ranges
+
+
+def _stage(traceback: tracemalloc.Traceback, ranges: List[Tuple[str, str, int, int]]) -> Optional[str]:
+    """Stage of the outermost stage method on a traceback (None outside any stage call)."""
+    for frame in traceback:
+        for stage, filename, first, last in ranges:
+            if frame.filename == filename and first <= frame.lineno <= last:
+                return stage
+    return None
+
+
+def attribute_stages(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                     ranges: List[Tuple[str, str, int, int]]) -> Dict[str, Dict]:
+    """Net bytes and blocks allocated between two snapshots, per stage whose call allocated them."""
+    growth = defaultdict(lambda: {"bytes": 0, "blocks": 0})
+    for diff in after.compare_to(before, "traceback"):
+        stage = _stage(diff.traceback, ranges)
+        if stage is None:
+            owner = _owner(diff.traceback)
+            stage = MODULE_STAGE.get(owner, "library" if owner.startswith("<") else "other")
+        growth[stage]["bytes"] += diff.size_diff
+        growth[stage]["blocks"] += diff.count_diff
+    return dict(growth)
+
+
+def growth_rate(samples: List[Dict], key: str, since_h: float) -> float:
+    """Least-squares slope of samples[key] (MB) per simulated hour, using samples after since_h."""
+    points = [(s["sim_h"], s[key]) for s in samples if s["sim_h"] > since_h]
+    if len(points) < 3:
+        return 0.0
+    t, v = np.array(points).T
+    if np.ptp(t) == 0:
+        return 0.0
+    return float(np.polyfit(t, v, 1)[0])
+
+
+def run_soak(hours: float = 1.0, fps: float = 5.0, frame_shape=(360, 640), sample_minutes: float = 5.0,
+             warmup_fraction: float = 0.2, save_every: int = 30, checkpoint_every: int = 300,
+             trace_frames: int = 10, adaptive_rate: bool = False, forecast_model: Optional[str] = None,
+             work_dir: Optional[str] = None, seed: int = 0, verbose: bool = False) -> Dict:
+    """Run the pipeline for `hours` of simulated time; returns samples, rates and per-stage and per-module growth."""
+    n_frames = int(hours * 3600 * fps)
+    counts = generate_counts(n_frames, fps, seed=seed, base=12.0, burst_prob=0.0002, noise=1.5)
+    frames = synthetic_clip(n_frames=8, shape=frame_shape, seed=seed)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="crowd_soak_")
+    results_dir = os.path.join(work_dir, "results")
+    zones_path = os.path.join(work_dir, "zones.json")
+    with open(zones_path, "w") as f:
+        json.dump(zone_config(frame_shape), f)
+
+    pipeline = CrowdPipeline(
+        device="cpu",
+        camera_id="soak_cam",
+        detector=StubDetector(counts, frame_shape, seed),
+        zone_config=zones_path,
+        forecast_model_path=forecast_model,
+        checkpoint_path=os.path.join(work_dir, "checkpoint.json") if checkpoint_every else None,
+        checkpoint_every=checkpoint_every,
+        rate_policy=ForecastRatePolicy() if adaptive_rate else None,
+    )
+
+    sample_every = max(1, int(sample_minutes * 60 * fps))
+    warmup_frame = int(n_frames * warmup_fraction)
+    out = sys.stdout
+    samples, baseline = [], None
+    # Rollup buckets are drained when result files are written; without them, drain at the same cadence
+    drain_every = save_every or 30
+    tracemalloc.start(trace_frames)
+    wall_start = time.perf_counter()
+    # The pipeline prints per frame (e.g. backend upload without a token); keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(out if verbose else devnull):
+        for i in range(n_frames):
+            pipeline.process_frame(frames[i % len(frames)], media_time=i / fps, source_frame=i)
+            if (i + 1) % drain_every == 0:
+                if save_every:
+                    pipeline.save_pipeline_data(results_dir)
+                else:
+                    pipeline.rollups.drain()
+            if (i + 1) % sample_every == 0 or i + 1 == n_frames:
+                traced, _ = tracemalloc.get_traced_memory()
+                # tracemalloc's own bookkeeping is resident too; leave it out of RSS
+                rss = rss_mb() - tracemalloc.get_tracemalloc_memory() / 2 ** 20
+                sample = {"frame": i + 1, "sim_h": (i + 1) / fps / 3600.0, "rss_mb": rss,
+                          "traced_mb": traced / 2 ** 20, "wall_s": time.perf_counter() - wall_start}
+                samples.append(sample)
+                print(f"  {sample['sim_h']:6.2f} h simulated  RSS {sample['rss_mb']:7.1f} MB  "
+                      f"traced {sample['traced_mb']:6.1f} MB  ({sample['wall_s']:.0f} s)", file=out)
+            if i + 1 == max(warmup_frame, 1):
+                baseline = tracemalloc.take_snapshot()
+    final = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    warmup_h = warmup_frame / fps / 3600.0
+    span_h = max(hours - warmup_h, 1e-9)
+    modules = attribute_growth(baseline, final)
+    stages = attribute_stages(baseline, final, stage_code_ranges(pipeline))
+    return {
+        "frames": n_frames,
+        "hours": hours,
+        "wall_s": time.perf_counter() - wall_start,
+        "work_dir": work_dir,
+        "samples": samples,
+        "rss_mb_per_hour": growth_rate(samples, "rss_mb", warmup_h),
+        "traced_mb_per_hour": growth_rate(samples, "traced_mb", warmup_h),
+        "stages": {stage: {**g, "kb_per_hour": g["bytes"] / 1024 / span_h} for stage, g in stages.items()},
+        "modules": {name: {**g, "stage": MODULE_STAGE.get(name, "library" if name.startswith("<") else "other"),
+                           "kb_per_hour": g["bytes"] / 1024 / span_h}
+                    for name, g in modules.items()},
+    }
+
+
+def print_report(result: Dict, max_growth: float, top: int = 15) -> bool:
+    """Print growth by stage and module; True when within the budget."""
+    from tabulate import tabulate
+
+    stages = sorted(result["stages"].items(), key=lambda kv: -kv[1]["bytes"])
+    print("\nTraced growth after warm-up by stage (of the call that allocated it):")
+    print(tabulate([[s, f"{g['kb_per_hour']:,.1f}", g["blocks"]] for s, g in stages],
+                   headers=["Stage", "KB / sim h", "Blocks"], tablefmt="github"))
+
+    rows = sorted(result["modules"].items(), key=lambda kv: -kv[1]["bytes"])[:top]
+    print(f"\nTop {len(rows)} allocating modules:")
+    print(tabulate([[name, g["stage"], f"{g['kb_per_hour']:,.1f}", g["blocks"]] for name, g in rows],
+                   headers=["Module", "Stage", "KB / sim h", "Blocks"], tablefmt="github"))
+
+    rss, traced = result["rss_mb_per_hour"], result["traced_mb_per_hour"]
+    ok = rss <= max_growth and traced <= max_growth
+    print(f"\n{result['frames']} frames ({result['hours']:g} simulated h) in {result['wall_s']:.0f} s")
+    print(f"RSS growth {rss:+.2f} MB/h, traced growth {traced:+.2f} MB/h "
+          f"(budget {max_growth:g} MB/h): {'OK' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the pipeline with memory and leak tracking")
+    parser.add_argument("--hours", type=float, default=1.0, help="Simulated duration")
+    parser.add_argument("--fps", type=float, default=5.0, help="Simulated analysis frame rate")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[360, 640], metavar=("H", "W"))
+    parser.add_argument("--sample-minutes", type=float, default=5.0, help="Simulated minutes between memory samples")
+    parser.add_argument("--warmup", type=float, default=0.2, help="Fraction of the run excluded from growth rates")
+    parser.add_argument("--max-growth-mb-per-hour", type=float, default=5.0)
+    parser.add_argument("--save-every", type=int, default=30, help="Frames between result files (0: none)")
+    parser.add_argument("--checkpoint-every", type=int, default=300, help="Frames between checkpoints (0: none)")
+    parser.add_argument("--trace-frames", type=int, default=10,
+                        help="Traceback depth kept by tracemalloc (deep enough to reach a repo frame)")
+    parser.add_argument("--adaptive-rate", action="store_true", help="Run with the forecast-driven detection rate")
+    parser.add_argument("--forecast-model", help="Exported LSTM for result files (see model_utils.export_forecast_model)")
+    parser.add_argument("--work-dir", help="Where result files and checkpoints go (default: a temp dir)")
+    parser.add_argument("--report", help="Also write the samples and growth attribution here as JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output")
+    args = parser.parse_args()
+
+    if args.save_every and not args.forecast_model and importlib.util.find_spec("tensorflow") is None:
+        parser.error("result files include LSTM forecasts, which need TensorFlow; "
+                     "pass --forecast-model or --save-every 0")
+
+    print(f"Soak test: {args.hours:g} simulated hours at {args.fps:g} fps")
+    result = run_soak(args.hours, args.fps, tuple(args.frame_size), args.sample_minutes, args.warmup,
+                      args.save_every, args.checkpoint_every, args.trace_frames, args.adaptive_rate,
+                      args.forecast_model, args.work_dir, args.seed, args.verbose)
+    ok = print_report(result, args.max_growth_mb_per_hour)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({**result, "ok": ok, "max_growth_mb_per_hour": args.max_growth_mb_per_hour}, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
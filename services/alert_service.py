@@ -0,0 +1,227 @@
+"""
+services/alert_service.py
+
+Streaming alert engine for crowd counts.
+
+- Per-camera rules evaluated on raw, smoothed (EWMA) or forecasted counts,
+  optionally per zone.
+- O(1) work per rule per frame: hysteresis (separate raise/clear levels),
+  debounce (consecutive frames), cooldown after clearing, and a token-bucket
+  rate limit on emitted events per camera.
+- Only state transitions produce events, each with a stable id, so a crowd
+  that stays above the threshold yields one "raised" and one "cleared" event
+  instead of one alert per frame. Ids are the activation time plus a random
+  suffix, so they stay unique across restarts.
+"""
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("alert_service")
+
+SEVERITIES = ("info", "warning", "critical")  # lowest to highest
+
+
+@dataclass
+class AlertRule:
+    """Threshold rule on one metric ("raw", "smoothed" or "forecast") of a camera."""
+    name: str
+    threshold: float
+    metric: str = "raw"
+    zone: Optional[str] = None
+    clear_threshold: Optional[float] = None  # defaults to 80% of threshold
+    debounce_frames: int = 3
+    cooldown_s: float = 30.0
+    severity: str = "warning"
+
+    def __post_init__(self):
+        if self.metric not in ("raw", "smoothed", "forecast"):
+            raise ValueError(f"Unknown alert metric: {self.metric}")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Unknown alert severity: {self.severity}")
+        if self.clear_threshold is None:
+            self.clear_threshold = 0.8 * self.threshold
+
+
+@dataclass
+class AlertEvent:
+    """A raised or cleared alert."""
+    alert_id: str
+    camera_id: str
+    rule: str
+    state: str  # "raised" or "cleared"
+    value: float
+    threshold: float
+    timestamp: float
+    zone: Optional[str] = None
+    severity: str = "warning"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class _RuleState:
+    active: bool = False
+    streak: int = 0
+    last_cleared: Optional[float] = None  # None (never cleared) keeps the state JSON-safe
+    alert_id: Optional[str] = None
+
+
+@dataclass
+class _CameraState:
+    smoothed: Optional[float] = None
+    tokens: float = 0.0
+    last_refill: Optional[float] = None
+    rules: Dict[str, _RuleState] = field(default_factory=dict)
+    suppressed: int = 0
+
+
+class AlertEngine:
+    """
+    Evaluates rules for many cameras and emits de-duplicated AlertEvents.
+
+    rate_limit events per rate_window seconds are allowed per camera; events
+    beyond that are dropped (and counted) rather than queued, except
+    "cleared" events for alerts whose "raised" event was delivered.
+    """
+
+    def __init__(self,
+                 rules: Optional[Sequence[AlertRule]] = None,
+                 smoothing_alpha: float = 0.2,
+                 rate_limit: int = 10,
+                 rate_window: float = 60.0,
+                 on_event: Optional[Callable[[AlertEvent], None]] = None):
+        self.default_rules = list(rules) if rules is not None else [AlertRule("crowd_high", threshold=10)]
+        self.camera_rules: Dict[str, List[AlertRule]] = {}
+        self.smoothing_alpha = float(smoothing_alpha)
+        self.rate_limit = int(rate_limit)
+        self.rate_window = float(rate_window)
+        self.on_event = on_event
+        self._cameras: Dict[str, _CameraState] = {}
+
+    def set_rules(self, camera_id: str, rules: Sequence[AlertRule]) -> None:
+        """Override the default rules for one camera."""
+        self.camera_rules[camera_id] = list(rules)
+        self._cameras.pop(camera_id, None)
+
+    def rules_for(self, camera_id: str) -> List[AlertRule]:
+        return self.camera_rules.get(camera_id, self.default_rules)
+
+    def _camera(self, camera_id: str) -> _CameraState:
+        state = self._cameras.get(camera_id)
+        if state is None:
+            state = self._cameras[camera_id] = _CameraState(tokens=float(self.rate_limit))
+        return state
+
+    @staticmethod
+    def _alert_id(camera_id: str, rule: str, timestamp: float) -> str:
+        # Activation time plus a random suffix: unique across restarts, no counter to persist
+        return f"{camera_id}:{rule}:{int(timestamp * 1000)}-{uuid.uuid4().hex[:8]}"
+
+    def _take_token(self, cam: _CameraState, now: float) -> bool:
+        if cam.last_refill is not None:
+            cam.tokens = min(float(self.rate_limit),
+                             cam.tokens + (now - cam.last_refill) * self.rate_limit / self.rate_window)
+        cam.last_refill = now
+        if cam.tokens >= 1.0:
+            cam.tokens -= 1.0
+            return True
+        return False
+
+    def evaluate(self,
+                 camera_id: str,
+                 count: float,
+                 forecast: Optional[Sequence[float]] = None,
+                 zones: Optional[Dict[str, int]] = None,
+                 timestamp: Optional[float] = None) -> List[AlertEvent]:
+        """Fold in one frame for a camera; returns the events it produced."""
+        now = time.time() if timestamp is None else timestamp
+        cam = self._camera(camera_id)
+        a = self.smoothing_alpha
+        cam.smoothed = count if cam.smoothed is None else a * count + (1 - a) * cam.smoothed
+        forecast_peak = max(forecast) if forecast else None
+
+        events = []
+        for rule in self.rules_for(camera_id):
+            if rule.zone is not None:
+                if zones is None or rule.zone not in zones:
+                    continue
+                value = zones[rule.zone]
+            elif rule.metric == "smoothed":
+                value = cam.smoothed
+            elif rule.metric == "forecast":
+                if forecast_peak is None:
+                    continue
+                value = forecast_peak
+            else:
+                value = count
+
+            st = cam.rules.get(rule.name)
+            if st is None:
+                st = cam.rules[rule.name] = _RuleState()
+
+            if not st.active:
+                st.streak = st.streak + 1 if value >= rule.threshold else 0
+                cooled = st.last_cleared is None or now - st.last_cleared >= rule.cooldown_s
+                if st.streak >= rule.debounce_frames and cooled:
+                    st.active = True
+                    st.streak = 0
+                    if self._take_token(cam, now):
+                        st.alert_id = self._alert_id(camera_id, rule.name, now)
+                        events.append(AlertEvent(st.alert_id, camera_id, rule.name, "raised", float(value),
+                                                 rule.threshold, now, rule.zone, rule.severity))
+                    else:
+                        st.alert_id = None
+                        cam.suppressed += 1
+            else:
+                st.streak = st.streak + 1 if value <= rule.clear_threshold else 0
+                if st.streak >= rule.debounce_frames:
+                    st.active = False
+                    st.streak = 0
+                    st.last_cleared = now
+                    if st.alert_id is not None:
+                        events.append(AlertEvent(st.alert_id, camera_id, rule.name, "cleared", float(value),
+                                                 rule.clear_threshold, now, rule.zone, rule.severity))
+                    st.alert_id = None
+
+        for event in events:
+            logger.info(f"[ALERT {event.state.upper()}] {event.camera_id} {event.rule}: "
+                        f"{event.value:.1f} (threshold {event.threshold:.1f})")
+            if self.on_event is not None:
+                self.on_event(event)
+        return events
+
+    def is_active(self, camera_id: str, rule: Optional[str] = None, min_severity: Optional[str] = None) -> bool:
+        """Whether any (or the named) rule is currently raised for the camera, optionally at min_severity or above."""
+        cam = self._cameras.get(camera_id)
+        if cam is None:
+            return False
+        if rule is not None:
+            st = cam.rules.get(rule)
+            return bool(st and st.active)
+        if min_severity is None:
+            return any(st.active for st in cam.rules.values())
+        floor = SEVERITIES.index(min_severity)
+        return any(SEVERITIES.index(r.severity) >= floor and cam.rules.get(r.name, _RuleState()).active
+                   for r in self.rules_for(camera_id))
+
+    def get_state(self, camera_id: str) -> Optional[Dict]:
+        """Smoothing, rule and rate-limit state of one camera, for checkpoints."""
+        cam = self._cameras.get(camera_id)
+        return asdict(cam) if cam is not None else None
+
+    def set_state(self, camera_id: str, state: Dict) -> None:
+        rules = {name: _RuleState(**rule) for name, rule in state.get("rules", {}).items()}
+        self._cameras[camera_id] = _CameraState(**{**state, "rules": rules})
+
+    def stats(self, camera_id: str) -> Dict:
+        cam = self._camera(camera_id)
+        return {
+            "smoothed": cam.smoothed,
+            "active": sorted(name for name, st in cam.rules.items() if st.active),
+            "suppressed": cam.suppressed,
+        }
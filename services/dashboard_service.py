@@ -0,0 +1,342 @@
+"""
+services/dashboard_service.py
+
+Python-side dashboard feed built from pipeline results as they are produced.
+
+- Keeps a precomputed summary per camera: latest count and alert state,
+  zone counts and crowd flow, rolling window stats and the latest forecast.
+- Every change is recorded as a compact delta (only the fields that changed)
+  under a monotonically increasing sequence number.
+- A small local HTTP server serves the full snapshot, deltas since a given
+  sequence number, and a Server-Sent Events stream of new deltas, so clients
+  fetch only what changed instead of re-reading every result file.
+
+Results reach the service either in-process (CrowdPipeline(dashboard=...))
+or by tailing a results directory, where only files past a per-prefix
+high-water mark (the frame index in their name) are parsed.
+
+Usage:
+    python -m services.dashboard_service --results results --port 8765
+
+Endpoints:
+    GET /api/summary             full snapshot with its sequence number
+    GET /api/deltas?since=<seq>  deltas after seq (or a reset snapshot if too old
+                                 or ahead of the service, e.g. after a restart)
+    GET /api/stream?since=<seq>  text/event-stream of deltas; a reconnecting
+                                 EventSource resumes from its Last-Event-ID
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("dashboard_service")
+
+
+class CameraSummary:
+    """Rolling statistics over the last `window` counts, maintained in O(1) per update."""
+
+    def __init__(self, window: int = 300):
+        self.counts = deque(maxlen=window)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self.fields: Dict[str, Any] = {}
+
+    def add_count(self, count: float) -> None:
+        if len(self.counts) == self.counts.maxlen:
+            old = self.counts[0]
+            self._sum -= old
+            self._sumsq -= old * old
+        self.counts.append(count)
+        self._sum += count
+        self._sumsq += count * count
+
+    def stats(self) -> Dict[str, float]:
+        n = len(self.counts)
+        mean = self._sum / n
+        var = max(0.0, self._sumsq / n - mean * mean)
+        return {"rolling_mean": round(mean, 2), "rolling_std": round(math.sqrt(var), 2), "window": n}
+
+
+class DashboardService:
+    """Per-camera summaries plus a bounded, sequence-numbered delta log."""
+
+    def __init__(self, window: int = 300, max_deltas: int = 10000):
+        self.window = int(window)
+        self.seq = 0
+        self._cameras: Dict[str, CameraSummary] = {}
+        self._deltas: deque = deque(maxlen=int(max_deltas))
+        self._cond = threading.Condition()
+
+    def _apply(self, camera_id: str, updates: Dict[str, Any]) -> Optional[Dict]:
+        """Merge updates into a camera summary and log whatever actually changed."""
+        summary = self._cameras[camera_id]
+        changes = {k: v for k, v in updates.items() if summary.fields.get(k) != v}
+        if not changes:
+            return None
+        summary.fields.update(changes)
+        self.seq += 1
+        delta = {"seq": self.seq, "camera_id": camera_id, "changes": changes}
+        self._deltas.append(delta)
+        self._cond.notify_all()
+        return delta
+
+    def _summary(self, camera_id: str) -> CameraSummary:
+        summary = self._cameras.get(camera_id)
+        if summary is None:
+            summary = self._cameras[camera_id] = CameraSummary(self.window)
+        return summary
+
+    def publish_detection(self, camera_id: str, record: Dict) -> Optional[Dict]:
+        """Fold in one detection record (as written to detections_*.json)."""
+        with self._cond:
+            summary = self._summary(camera_id)
+            summary.add_count(record["count"])
+            updates = {
+                "count": record["count"],
+                "alert": bool(record.get("alert", False)),
+                "frame": record.get("frame"),
+                "timestamp": record.get("timestamp"),
+            }
+            for key in ("zones", "flow"):
+                if key in record:
+                    updates[key] = record[key]
+            updates.update(summary.stats())
+            return self._apply(camera_id, updates)
+
+    def publish_forecast(self, camera_id: str, record: Dict) -> Optional[Dict]:
+        """Fold in one forecast record (as written to forecast_*.json)."""
+        with self._cond:
+            self._summary(camera_id)
+            updates = {"forecast_frame": record.get("frame")}
+            for key in ("lstm_predictions", "linear_predictions", "selected_model", "selected_predictions"):
+                if key in record:
+                    updates[key] = record[key]
+            return self._apply(camera_id, updates)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                "seq": self.seq,
+                "cameras": {cam: dict(s.fields) for cam, s in self._cameras.items()},
+            }
+
+    def deltas_since(self, since: int) -> Dict:
+        """
+        Deltas with seq > since; a full snapshot if the log no longer reaches back,
+        or if `since` is ahead of this service (the client saw a previous process).
+        """
+        with self._cond:
+            oldest = self._deltas[0]["seq"] if self._deltas else self.seq + 1
+            if since < oldest - 1 or since > self.seq:
+                return {"reset": True, **self.snapshot()}
+            return {"seq": self.seq, "deltas": [d for d in self._deltas if d["seq"] > since]}
+
+    def wait_for_update(self, since: int, timeout: float = 15.0) -> bool:
+        """Block until seq moves past `since` (or timeout); used by the SSE stream."""
+        with self._cond:
+            # since > seq needs a reset right away, not once this service catches up
+            return self._cond.wait_for(lambda: self.seq != since, timeout=timeout)
+
+
+class ResultsTailer:
+    """
+    Feeds a DashboardService from new detections_*/forecast_* files in a directory.
+
+    Files are named by frame index, so a high-water mark per prefix tells new
+    files from consumed ones. The directory is only listed again once its
+    mtime has changed (or a file was still being written on the last poll).
+
+    A file written after the last consumed one but numbered at or below the
+    mark means the pipeline restarted from frame 0: the mark is reset, and
+    files left over from the previous run are ignored from then on.
+    (CrowdPipeline writes result files by rename, so overwriting one also
+    changes the directory mtime.)
+    """
+
+    _PREFIXES = ("detections_", "forecast_")
+    _FRAME_RE = re.compile(r"_(\d+)\.json$")
+
+    def __init__(self, service: DashboardService, results_dir: str, camera_id: str = "default_cam"):
+        self.service = service
+        self.results_dir = results_dir
+        self.camera_id = camera_id
+        self._marks = {prefix: (-1, 0) for prefix in self._PREFIXES}  # (frame, mtime_ns) of the last file consumed
+        self._floors = {prefix: 0 for prefix in self._PREFIXES}  # files no newer than this are from an earlier run
+        self._dir_mtime = None
+        self._retry = False
+        self._last_frame = 0
+
+    def _frame_of(self, path: str) -> int:
+        m = self._FRAME_RE.search(path)
+        return int(m.group(1)) if m else 0
+
+    def _new_files(self) -> List:
+        """(file frame, prefix, path, mtime) of files past their prefix's high-water mark."""
+        found = []
+        restarted = set()
+        with os.scandir(self.results_dir) as entries:
+            for entry in entries:
+                prefix = entry.name.split("_", 1)[0] + "_"
+                if prefix not in self._marks or not self._FRAME_RE.search(entry.name):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+                if mtime <= self._floors[prefix]:
+                    continue
+                frame = self._frame_of(entry.name)
+                mark, mark_mtime = self._marks[prefix]
+                if frame > mark:
+                    found.append((frame, prefix, entry.path, mtime))
+                elif mtime > mark_mtime:
+                    restarted.add(prefix)
+        if not restarted:
+            return sorted(found)
+        for prefix in restarted:
+            logger.info(f"{prefix}* frame indices went backwards; pipeline restarted, resetting its mark")
+            self._floors[prefix] = self._marks[prefix][1]
+            self._marks[prefix] = (-1, 0)
+            if prefix == "detections_":
+                self._last_frame = 0
+        return self._new_files()
+
+    def poll(self) -> int:
+        """Parse files past the high-water marks, in frame order; returns how many were consumed."""
+        try:
+            mtime = os.stat(self.results_dir).st_mtime_ns
+        except OSError:
+            return 0
+        # Coarse mtime clocks can hide a file created in the same tick, so recent mtimes are always listed
+        settled = time.time_ns() - mtime > 2_000_000_000
+        if mtime == self._dir_mtime and settled and not self._retry:
+            return 0
+        self._dir_mtime = mtime
+        self._retry = False
+        consumed = 0
+        blocked = set()
+        for frame, prefix, path, file_mtime in self._new_files():
+            if prefix in blocked:
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Possibly still being written; hold this prefix's mark and retry on the next poll
+                self._retry = True
+                blocked.add(prefix)
+                continue
+            self._marks[prefix] = (frame, file_mtime)
+            consumed += 1
+            if prefix == "detections_":
+                for record in data:
+                    # Detection files overlap (last 30 frames each); skip frames already published
+                    if record.get("frame", 0) > self._last_frame:
+                        self.service.publish_detection(self.camera_id, record)
+                        self._last_frame = record.get("frame", 0)
+            else:
+                self.service.publish_forecast(self.camera_id, data)
+        return consumed
+
+    def run(self, interval: float = 1.0, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll()
+            stop.wait(interval)
+
+
+def make_handler(service: DashboardService):
+    class DashboardHandler(BaseHTTPRequestHandler):
+        def _send_json(self, payload: Dict, status: int = 200) -> None:
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                since = int(query.get("since", ["0"])[0])
+                if url.path == "/api/stream":
+                    # EventSource reconnects to the same URL; the last id it saw is the real cursor
+                    since = int(self.headers.get("Last-Event-ID", since))
+            except ValueError:
+                return self._send_json({"error": "since must be an integer"}, 400)
+
+            if url.path == "/api/summary":
+                return self._send_json(service.snapshot())
+            if url.path == "/api/deltas":
+                return self._send_json(service.deltas_since(since))
+            if url.path == "/api/stream":
+                return self._stream(since)
+            return self._send_json({"error": "not found"}, 404)
+
+        def _stream(self, since: int) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            try:
+                while True:
+                    if service.wait_for_update(since):
+                        payload = service.deltas_since(since)
+                        since = payload["seq"]
+                        self.wfile.write(f"id: {since}\ndata: {json.dumps(payload)}\n\n".encode())
+                    else:
+                        self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return DashboardHandler
+
+
+def serve(service: DashboardService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Start the HTTP/SSE server on a daemon thread and return it."""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dashboard-http", daemon=True).start()
+    logger.info(f"Dashboard service listening on http://{host}:{port}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve incremental dashboard updates")
+    parser.add_argument("--results", default="results", help="Results directory to tail")
+    parser.add_argument("--camera_id", default="default_cam", help="Camera ID for tailed files")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between directory polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    service = DashboardService()
+    server = serve(service, args.host, args.port)
+    try:
+        ResultsTailer(service, args.results, args.camera_id).run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+services/rate_policy_service.py
+
+Forecast-driven detection rate: spend detection compute on cameras where a
+crowd is building up instead of on quiet ones.
+
+- Each camera registers its alert threshold and full-quality imgsz. Its
+  settings are picked from a ladder running from full rate (stride 1, full
+  imgsz) through doubling strides up to max_stride, then the sparsest level
+  at min_imgsz.
+- update() takes the camera's short-horizon forecast. Combined with the spread
+  of its recently detected counts, it gives a pessimistic upper bound
+  (peak + z * std) as a fraction of the threshold. Near the threshold, or
+  rising toward it, means full rate right away. Well below it means sparser
+  levels, and only low, stable cameras reach the sparsest level. Relaxing
+  happens one level at a time, after hold_s seconds at the lower need.
+- record() accounts every frame for report(). Compute saved is measured
+  against detecting every frame at full imgsz, with detection cost taken as
+  proportional to imgsz^2. Missed crossings are threshold crossings first
+  seen while the camera was below full rate. In that case the crossing may
+  have happened up to stride - 1 frames before it was detected.
+- replay() runs the policy over a full-rate count series. Ground truth is
+  known there, so it reports the true delay of every crossing.
+
+Usage:
+    python -m services.rate_policy_service --counts detections.csv --threshold 10
+"""
+
+import argparse
+import csv
+import logging
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import asdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .scheduler_service import CameraSettings
+
+logger = logging.getLogger("rate_policy_service")
+
+
+class _CameraState:
+    def __init__(self, camera_id: str, threshold: float, ladder: List[CameraSettings], window: int):
+        self.camera_id = camera_id
+        self.threshold = float(threshold)
+        self.ladder = ladder
+        self.level = 0  # full rate until there is a forecast to go on
+        self.changed_at = None
+        self.counts = deque(maxlen=window)  # counts of detected frames only
+        self.last_count = None
+        self.last_detect_frame = None
+        self.frames = 0
+        self.detections = 0
+        self.cost = 0.0  # detections weighted by (imgsz / full imgsz)^2
+        self.crossings = 0
+        self.missed = 0
+        self.max_gap = 0  # worst frames between a crossing and the detection before it
+        self.upper = None
+
+    @property
+    def settings(self) -> CameraSettings:
+        return self.ladder[self.level]
+
+
+class ForecastRatePolicy:
+    """
+    Per-camera detection stride and imgsz from forecasts and recent variance.
+
+    full_ratio: upper bound / threshold at which a camera goes to full rate.
+    quiet_ratio: below this (and with a std under stable_std) the sparsest
+    level is allowed; levels in between are spread linearly.
+    """
+
+    def __init__(self,
+                 horizon: int = 50,
+                 max_stride: int = 8,
+                 min_imgsz: int = 448,
+                 full_ratio: float = 0.8,
+                 quiet_ratio: float = 0.4,
+                 rise_ratio: float = 0.5,
+                 z: float = 2.0,
+                 stable_std: float = 1.5,
+                 hold_s: float = 30.0,
+                 window: int = 60):
+        self.horizon = int(horizon)  # frames to look ahead; ceil(horizon / stride) forecast steps
+        self.max_stride = int(max_stride)
+        self.min_imgsz = int(min_imgsz)
+        self.full_ratio = float(full_ratio)
+        self.quiet_ratio = float(quiet_ratio)
+        self.rise_ratio = float(rise_ratio)  # a forecast rise only counts above this share of the threshold
+        self.z = float(z)
+        self.stable_std = float(stable_std)
+        self.hold_s = float(hold_s)
+        self.window = int(window)
+        self._cameras: Dict[str, _CameraState] = {}
+        self._lock = threading.Lock()
+
+    def _build_ladder(self, imgsz: int) -> List[CameraSettings]:
+        ladder = [CameraSettings(1, imgsz, True)]
+        stride = 2
+        while stride <= self.max_stride:
+            ladder.append(CameraSettings(stride, imgsz, True))
+            stride *= 2
+        if self.min_imgsz < imgsz:
+            ladder.append(CameraSettings(ladder[-1].stride, self.min_imgsz, True))
+        return ladder
+
+    def register(self, camera_id: str, threshold: float, imgsz: int = 640) -> None:
+        with self._lock:
+            self._cameras[camera_id] = _CameraState(camera_id, threshold, self._build_ladder(imgsz), self.window)
+
+    def unregister(self, camera_id: str) -> None:
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def settings(self, camera_id: str) -> CameraSettings:
+        """Current settings for a camera (full quality for unknown cameras)."""
+        cam = self._cameras.get(camera_id)
+        return cam.settings if cam is not None else CameraSettings()
+
+    # ---------------- Policy ----------------
+    def _target_level(self, cam: _CameraState, forecast: Optional[Sequence[float]]) -> int:
+        if cam.last_count is None or not forecast:
+            return 0
+        counts = np.asarray(cam.counts, dtype=np.float64)
+        std = float(counts.std()) if len(counts) > 1 else 0.0
+        peak = max(float(np.max(forecast)), float(counts.mean()))
+        cam.upper = peak + self.z * std
+        ratio = cam.upper / cam.threshold if cam.threshold > 0 else float("inf")
+        rising = forecast[-1] > cam.last_count + std and peak >= self.rise_ratio * cam.threshold
+        if ratio >= self.full_ratio or rising:
+            return 0
+        top = len(cam.ladder) - 1
+        if ratio <= self.quiet_ratio and std <= self.stable_std:
+            return top
+        # Spread the intermediate levels over (quiet_ratio, full_ratio); the sparsest is for stable scenes only
+        frac = (self.full_ratio - ratio) / (self.full_ratio - self.quiet_ratio)
+        return min(top - 1, max(1, int(frac * top)))
+
+    def update(self, camera_id: str, forecast: Optional[Sequence[float]],
+               timestamp: Optional[float] = None) -> CameraSettings:
+        """Re-plan a camera from its latest forecast; escalation is immediate, relaxing is held."""
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            cam = self._cameras.get(camera_id)
+            if cam is None:
+                return CameraSettings()
+            target = self._target_level(cam, forecast)
+            if target < cam.level:
+                cam.level, cam.changed_at = target, now
+            elif target > cam.level and (cam.changed_at is None or now - cam.changed_at >= self.hold_s):
+                cam.level, cam.changed_at = cam.level + 1, now
+            else:
+                return cam.settings
+            logger.info(f"Rate policy: {camera_id} -> stride {cam.settings.stride}, imgsz {cam.settings.imgsz} "
+                        f"(upper bound {cam.upper if cam.upper is not None else float('nan'):.1f} "
+                        f"of threshold {cam.threshold:g})")
+            return cam.settings
+
+    def record(self, camera_id: str, frame_idx: int, count: Optional[int] = None,
+               settings: Optional[CameraSettings] = None) -> None:
+        """Account one frame; count (and the settings it ran at) only for frames that were detected."""
+        with self._lock:
+            cam = self._cameras.get(camera_id)
+            if cam is None:
+                return
+            cam.frames += 1
+            if count is None:
+                return
+            s = settings or cam.settings
+            cam.detections += 1
+            cam.cost += (s.imgsz / cam.ladder[0].imgsz) ** 2
+            if cam.last_count is not None and cam.last_count < cam.threshold <= count:
+                cam.crossings += 1
+                gap = frame_idx - cam.last_detect_frame - 1
+                if gap > 0:
+                    cam.missed += 1
+                    cam.max_gap = max(cam.max_gap, gap)
+            cam.counts.append(float(count))
+            cam.last_count = float(count)
+            cam.last_detect_frame = frame_idx
+
+    def report(self) -> Dict:
+        """Per-camera settings, compute saved and threshold crossings detected late."""
+        with self._lock:
+            cams = list(self._cameras.values())
+            allocations = {}
+            frames = cost = 0.0
+            for cam in cams:
+                frames += cam.frames
+                cost += cam.cost
+                allocations[cam.camera_id] = {
+                    **asdict(cam.settings),
+                    "level": cam.level,
+                    "threshold": cam.threshold,
+                    "upper_bound": round(cam.upper, 2) if cam.upper is not None else None,
+                    "frames": cam.frames,
+                    "detections": cam.detections,
+                    "compute_saved": round(1.0 - cam.cost / cam.frames, 3) if cam.frames else 0.0,
+                    "crossings": cam.crossings,
+                    "missed_crossings": cam.missed,
+                    "max_crossing_gap_frames": cam.max_gap,
+                }
+            return {
+                "compute_saved": round(1.0 - cost / frames, 3) if frames else 0.0,
+                "missed_crossings": sum(c.missed for c in cams),
+                "allocations": allocations,
+            }
+
+
+def replay(counts: Sequence[int], threshold: float, fps: float = 25.0, imgsz: int = 640,
+           forecast_every: int = 25, policy: Optional[ForecastRatePolicy] = None, forecaster=None) -> Dict:
+    """
+    Run the policy over a full-rate count series, holding the last detected count
+    on skipped frames and forecasting from detected counts only, as the pipeline
+    does. Reports compute saved and, for every
+    true excursion above the threshold, how many frames passed before it was
+    seen; excursions that ended between detections are missed.
+    """
+    from models.forecasters import ForecasterSelector
+
+    policy = policy or ForecastRatePolicy()
+    forecaster = forecaster or ForecasterSelector(horizon=policy.horizon)
+    policy.register("replay", threshold, imgsz)
+    counts = np.asarray(counts)
+    seen = np.zeros(len(counts), dtype=bool)
+    held = None
+    last_detect = None
+    for i, true_count in enumerate(counts):
+        s = policy.settings("replay")
+        if last_detect is None or i - last_detect >= s.stride:
+            held, last_detect = int(true_count), i
+            policy.record("replay", i, held, s)
+            forecaster.observe(held)
+        else:
+            policy.record("replay", i)
+        seen[i] = held >= threshold
+        if i % forecast_every == 0:
+            # Forecast steps are detections, so the frame horizon spans fewer of them at a sparse stride
+            steps = math.ceil(policy.horizon / s.stride)
+            policy.update("replay", forecaster.forecast(steps), timestamp=i / fps)
+
+    # Each excursion above the threshold is seen late (after some frames) or missed outright
+    above = counts >= threshold
+    edges = np.diff(np.concatenate(([0], above.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    delays, missed = [], 0
+    for start, end in zip(starts, ends):
+        hit = np.flatnonzero(seen[start:end])
+        if len(hit):
+            delays.append(int(hit[0]))
+        else:
+            missed += 1
+    delays = np.asarray(delays, dtype=np.int64)
+    stats = policy.report()["allocations"]["replay"]
+    return {
+        "frames": int(len(counts)),
+        "detections": stats["detections"],
+        "compute_saved": stats["compute_saved"],
+        "true_crossings": int(len(starts)),
+        "late_crossings": int((delays > 0).sum()),
+        "missed_crossings": missed,
+        "max_delay_frames": int(delays.max()) if len(delays) else 0,
+        "mean_delay_frames": round(float(delays.mean()), 2) if len(delays) else 0.0,
+    }
+
+
+def load_counts(path: str) -> List[int]:
+    """Counts from a detection log CSV (see model_utils.CSVLogger) in frame order."""
+    with open(path, newline="") as f:
+        rows = sorted(csv.DictReader(f), key=lambda r: int(r["frame"]))
+    return [int(r["count"]) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the forecast-driven detection rate over a count series")
+    parser.add_argument("--counts", required=True, help="Detection log CSV with frame and count columns")
+    parser.add_argument("--threshold", type=float, default=10, help="Alert threshold to protect")
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--max-stride", type=int, default=8)
+    parser.add_argument("--hold", type=float, default=30.0, help="Seconds before relaxing one level")
+    args = parser.parse_args()
+
+    policy = ForecastRatePolicy(max_stride=args.max_stride, hold_s=args.hold)
+    result = replay(load_counts(args.counts), args.threshold, fps=args.fps, policy=policy)
+    print(f"Frames: {result['frames']}, detections: {result['detections']}, "
+          f"compute saved: {result['compute_saved']:.1%}")
+    print(f"Threshold crossings: {result['true_crossings']}, seen late: {result['late_crossings']} "
+          f"(max {result['max_delay_frames']} frames, mean {result['mean_delay_frames']}), "
+          f"missed: {result['missed_crossings']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+services/scheduler_service.py
+
+Cross-camera load shedding for pipelines sharing one inference node.
+
+- Each camera registers a priority (higher wins), a target detection rate and
+  a minimum guaranteed rate.
+- Pipelines report the cost of every detection they run; the scheduler keeps
+  an EWMA of each camera's cost normalized to its full-quality settings.
+- When estimated demand exceeds the node's capacity, the lowest-priority
+  camera that can still give something up is degraded one step at a time:
+  larger detection stride (never below its minimum rate), then smaller
+  imgsz, then Hough refinement off. With enough headroom (hysteresis below
+  the shedding level) the highest-priority cameras are restored first.
+- report() lists current allocations and violations: cameras below their
+  guaranteed rate and demand that remains over capacity with every camera
+  fully degraded.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("scheduler_service")
+
+
+@dataclass(frozen=True)
+class CameraSettings:
+    """What a pipeline should run for one camera right now."""
+    stride: int = 1  # detect every `stride`-th frame
+    imgsz: int = 640
+    refine: bool = True
+
+
+@dataclass
+class CameraBudget:
+    camera_id: str
+    priority: int = 0
+    target_rate: float = 25.0  # frames/s offered by the source
+    min_rate: float = 5.0  # detections/s that must be kept
+    imgsz: int = 640
+    min_imgsz: int = 448
+    refine: bool = True
+
+
+class _CameraState:
+    def __init__(self, budget: CameraBudget, max_stride: int, imgsz_step: int):
+        self.budget = budget
+        self.ladder = self._build_ladder(budget, max_stride, imgsz_step)
+        self.level = 0
+        self.cost = None  # EWMA seconds per detection at full-quality settings
+        self.detections = deque()  # timestamps of recent detections
+        self.first_ts = None
+
+    @staticmethod
+    def _build_ladder(b: CameraBudget, max_stride: int, imgsz_step: int) -> List[CameraSettings]:
+        """Degradation steps: stride first, then imgsz, then refine off."""
+        ladder = [CameraSettings(1, b.imgsz, b.refine)]
+        stride_cap = max(1, min(max_stride, int(b.target_rate // max(b.min_rate, 1e-9))))
+        for stride in range(2, stride_cap + 1):
+            ladder.append(CameraSettings(stride, b.imgsz, b.refine))
+        stride = ladder[-1].stride
+        imgsz = b.imgsz - imgsz_step
+        while imgsz >= b.min_imgsz:
+            ladder.append(CameraSettings(stride, imgsz, b.refine))
+            imgsz -= imgsz_step
+        if b.refine:
+            ladder.append(CameraSettings(stride, ladder[-1].imgsz, False))
+        return ladder
+
+    @property
+    def settings(self) -> CameraSettings:
+        return self.ladder[self.level]
+
+
+class LoadScheduler:
+    """
+    Allocates inference capacity across cameras by priority.
+
+    capacity is in busy-seconds per second (e.g. the number of detector
+    workers); shedding starts above shed_util of it and restoring needs the
+    result to stay under restore_util.
+    """
+
+    def __init__(self,
+                 capacity: Optional[float] = None,
+                 shed_util: float = 0.9,
+                 restore_util: float = 0.75,
+                 max_stride: int = 6,
+                 imgsz_step: int = 64,
+                 refine_cost: float = 0.15,
+                 cost_alpha: float = 0.2,
+                 rebalance_interval: float = 1.0,
+                 rate_window: float = 10.0):
+        self.capacity = float(capacity or os.cpu_count() or 1)
+        self.shed_util = float(shed_util)
+        self.restore_util = float(restore_util)
+        self.max_stride = int(max_stride)
+        self.imgsz_step = int(imgsz_step)
+        self.refine_cost = float(refine_cost)  # share of a detection's cost spent in Hough refinement
+        self.cost_alpha = float(cost_alpha)
+        self.rebalance_interval = float(rebalance_interval)
+        self.rate_window = float(rate_window)
+        self._cameras: Dict[str, _CameraState] = {}
+        self._lock = threading.Lock()
+        self._last_rebalance = 0.0
+        self._shortfall = 0.0
+
+    def register(self, budget: CameraBudget) -> None:
+        with self._lock:
+            self._cameras[budget.camera_id] = _CameraState(budget, self.max_stride, self.imgsz_step)
+
+    def unregister(self, camera_id: str) -> None:
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def settings(self, camera_id: str) -> CameraSettings:
+        """Current settings for a camera (full quality for unknown cameras)."""
+        cam = self._cameras.get(camera_id)
+        return cam.settings if cam is not None else CameraSettings()
+
+    # ---------------- Cost model ----------------
+    def _cost_factor(self, cam: _CameraState, s: CameraSettings) -> float:
+        """Cost of a detection at settings s relative to the camera's full-quality settings."""
+        base = cam.ladder[0]
+        factor = (s.imgsz / base.imgsz) ** 2
+        if base.refine:
+            factor = factor * (1.0 - self.refine_cost) + (self.refine_cost if s.refine else 0.0)
+        return factor
+
+    def _demand(self, cam: _CameraState, level: Optional[int] = None) -> float:
+        """Busy-seconds per second the camera needs at a ladder level."""
+        if cam.cost is None:
+            return 0.0
+        s = cam.ladder[cam.level if level is None else level]
+        return cam.budget.target_rate / s.stride * cam.cost * self._cost_factor(cam, s)
+
+    def record(self, camera_id: str, seconds: float, timestamp: Optional[float] = None) -> None:
+        """Report one detection and its cost; rebalances at most every rebalance_interval."""
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            cam = self._cameras.get(camera_id)
+            if cam is None:
+                return
+            normalized = seconds / self._cost_factor(cam, cam.settings)
+            a = self.cost_alpha
+            cam.cost = normalized if cam.cost is None else a * normalized + (1 - a) * cam.cost
+            cam.detections.append(now)
+            if cam.first_ts is None:
+                cam.first_ts = now
+            while cam.detections and cam.detections[0] < now - self.rate_window:
+                cam.detections.popleft()
+            if now - self._last_rebalance >= self.rebalance_interval:
+                self._last_rebalance = now
+                self._rebalance()
+
+    # ---------------- Allocation ----------------
+    def _rebalance(self) -> None:
+        cams = list(self._cameras.values())
+        demand = sum(self._demand(c) for c in cams)
+        changed = False
+
+        # Shed: lowest priority first; among equals, the camera costing the most
+        while demand > self.shed_util * self.capacity:
+            degradable = [c for c in cams if c.level < len(c.ladder) - 1]
+            if not degradable:
+                break
+            cam = min(degradable, key=lambda c: (c.budget.priority, -self._demand(c)))
+            demand -= self._demand(cam)
+            cam.level += 1
+            demand += self._demand(cam)
+            changed = True
+
+        # Restore: highest priority first, one step at a time, only with clear headroom
+        if demand <= self.shed_util * self.capacity:
+            for cam in sorted(cams, key=lambda c: -c.budget.priority):
+                while cam.level > 0:
+                    restored = demand - self._demand(cam) + self._demand(cam, cam.level - 1)
+                    if restored > self.restore_util * self.capacity:
+                        break
+                    cam.level -= 1
+                    demand = restored
+                    changed = True
+
+        self._shortfall = max(0.0, demand - self.capacity)
+        if changed:
+            logger.info("Load scheduler: " + ", ".join(
+                f"{c.budget.camera_id}={c.settings.stride}/{c.settings.imgsz}/{'r' if c.settings.refine else '-'}"
+                for c in cams) + f" (demand {demand:.2f} of {self.capacity:.2f})")
+
+    def rebalance(self) -> None:
+        with self._lock:
+            self._rebalance()
+
+    def report(self, now: Optional[float] = None) -> Dict:
+        """Current allocations, utilization and violations."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cams = list(self._cameras.values())
+            demand = sum(self._demand(c) for c in cams)
+            allocations, violations = {}, []
+            for cam in cams:
+                # Rate over the window, or over the camera's lifetime while it is shorter
+                span = min(self.rate_window, now - cam.first_ts) if cam.first_ts is not None else 0.0
+                recent = sum(1 for t in cam.detections if t >= now - self.rate_window)
+                achieved = recent / span if span > 0 else 0.0
+                s = cam.settings
+                expected = cam.budget.target_rate / s.stride
+                allocations[cam.budget.camera_id] = {
+                    **asdict(s),
+                    "priority": cam.budget.priority,
+                    "level": cam.level,
+                    "max_level": len(cam.ladder) - 1,
+                    "expected_rate": round(expected, 2),
+                    "achieved_rate": round(achieved, 2),
+                    "share": round(self._demand(cam) / demand, 3) if demand > 0 else 0.0,
+                }
+                if span >= 1.0 and achieved < cam.budget.min_rate:
+                    violations.append({"camera_id": cam.budget.camera_id, "type": "below_min_rate",
+                                       "achieved_rate": round(achieved, 2), "min_rate": cam.budget.min_rate})
+            if self._shortfall > 0:
+                violations.append({"type": "capacity_shortfall", "busy_seconds_per_second": round(self._shortfall, 3)})
+            return {
+                "capacity": self.capacity,
+                "demand": round(demand, 3),
+                "utilization": round(demand / self.capacity, 3),
+                "allocations": allocations,
+                "violations": violations,
+            }
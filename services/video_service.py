@@ -0,0 +1,71 @@
+"""
+services/video_service.py
+
+Frame sources for the pipeline.
+
+- FrameSampler reads a cv2.VideoCapture at a target analysis rate. Skipped
+  frames are stepped over with cap.grab() (demux and decode, but no
+  retrieve/convert to BGR), and gaps longer than seek_frames use a seek, so
+  offline analysis gets faster as the skip factor grows.
+- Every sampled frame carries its source frame index and media timestamp
+  (seconds from the start of the file; wall-clock seconds since start for
+  live sources).
+"""
+
+import math
+import time
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FrameSampler:
+    """Iterates (source_frame, media_time, frame) at up to target_fps."""
+
+    def __init__(self, cap: cv2.VideoCapture, target_fps: Optional[float] = None, seek_frames: int = 90):
+        self.cap = cap
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.source_fps = fps if fps and math.isfinite(fps) and fps > 0 else 30.0
+        # Live sources report no frame count; they cannot seek and have no media clock
+        self.live = cap.get(cv2.CAP_PROP_FRAME_COUNT) <= 0
+        self.target_fps = target_fps
+        self.step = max(1.0, self.source_fps / target_fps) if target_fps else 1.0
+        self.seek_frames = int(seek_frames)
+        self.grabbed = 0
+        self.decoded = 0
+        self.seeks = 0
+
+    def _media_time(self, index: int, start: float) -> float:
+        if self.live:
+            return time.time() - start
+        pos_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if pos_ms > 0 or index == 0:
+            return pos_ms / 1000.0
+        return index / self.source_fps
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        start = time.time()
+        index = 0  # source index of the next frame the capture will return
+        next_pick = 0.0
+        while True:
+            target = int(round(next_pick))
+            gap = target - index
+            if gap > self.seek_frames and not self.live:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                self.seeks += 1
+                index = target
+            else:
+                for _ in range(gap):
+                    if not self.cap.grab():
+                        return
+                    self.grabbed += 1
+                    index += 1
+            ok, frame = self.cap.read()
+            if not ok:
+                return
+            self.decoded += 1
+            yield index, self._media_time(index, start), frame
+            index += 1
+            # Accumulate the fractional step so 30 -> 7 fps does not drift
+            next_pick = max(next_pick + self.step, index)
@@ -0,0 +1,100 @@
+import pytest
+
+from services.alert_service import AlertEngine, AlertRule
+
+
+def feed(engine, values, camera="cam", start=0.0, step=1.0, **kwargs):
+    """Evaluate a series of counts one second apart; returns every event emitted."""
+    events = []
+    for i, value in enumerate(values):
+        events.extend(engine.evaluate(camera, value, timestamp=start + i * step, **kwargs))
+    return events
+
+
+def test_debounce_needs_consecutive_frames():
+    engine = AlertEngine([AlertRule("high", threshold=10, debounce_frames=3, cooldown_s=0)])
+    assert feed(engine, [12, 12, 5, 12, 12]) == []
+    events = feed(engine, [12], start=5)
+    assert [e.state for e in events] == ["raised"]
+    assert engine.is_active("cam", "high")
+
+
+def test_hysteresis_holds_between_clear_and_raise_levels():
+    engine = AlertEngine([AlertRule("high", threshold=10, clear_threshold=6, debounce_frames=1, cooldown_s=0)])
+    raised = feed(engine, [11])
+    # Below the raise level but above the clear level: stays raised, no new events
+    assert feed(engine, [9, 8, 7, 9], start=1) == []
+    cleared = feed(engine, [5], start=5)
+    assert [e.state for e in raised + cleared] == ["raised", "cleared"]
+    assert raised[0].alert_id == cleared[0].alert_id
+    assert not engine.is_active("cam")
+
+
+def test_cooldown_blocks_reraise():
+    engine = AlertEngine([AlertRule("high", threshold=10, debounce_frames=1, cooldown_s=30)])
+    feed(engine, [12, 0])  # raised at t=0, cleared at t=1
+    assert feed(engine, [12] * 10, start=2) == []
+    events = feed(engine, [12], start=31)
+    assert [e.state for e in events] == ["raised"]
+
+
+def test_alert_ids_unique_across_engines():
+    # A restarted process starts a fresh engine; ids must not repeat
+    ids = set()
+    for _ in range(3):
+        engine = AlertEngine([AlertRule("high", threshold=10, debounce_frames=1, cooldown_s=0)])
+        ids.update(e.alert_id for e in feed(engine, [12]))
+    assert len(ids) == 3
+    assert all(i.startswith("cam:high:0-") for i in ids)
+
+
+def test_rate_limit_suppresses_raise_and_its_clear():
+    rules = [AlertRule(f"r{i}", threshold=10, debounce_frames=1, cooldown_s=0) for i in range(3)]
+    engine = AlertEngine(rules, rate_limit=2, rate_window=60)
+    raised = feed(engine, [12])
+    assert len(raised) == 2
+    assert engine.stats("cam")["suppressed"] == 1
+    cleared = feed(engine, [0], start=1)
+    # Only alerts whose raise was delivered are cleared
+    assert sorted(e.alert_id for e in cleared) == sorted(e.alert_id for e in raised)
+
+
+def test_zone_and_forecast_rules():
+    engine = AlertEngine([
+        AlertRule("zone_a", threshold=5, zone="a", debounce_frames=1),
+        AlertRule("outlook", threshold=20, metric="forecast", debounce_frames=1),
+    ])
+    events = engine.evaluate("cam", 3, forecast=[10, 25, 15], zones={"a": 6, "b": 0}, timestamp=0)
+    assert {(e.rule, e.value) for e in events} == {("zone_a", 6.0), ("outlook", 25.0)}
+    # Without zone counts or a forecast those rules are skipped, not cleared
+    assert engine.evaluate("cam", 3, timestamp=1) == []
+    assert engine.is_active("cam", "zone_a") and engine.is_active("cam", "outlook")
+
+
+def test_state_round_trip():
+    rule = AlertRule("high", threshold=10, debounce_frames=1, cooldown_s=0)
+    engine = AlertEngine([rule])
+    raised = feed(engine, [12, 13])
+    restored = AlertEngine([rule])
+    restored.set_state("cam", engine.get_state("cam"))
+    assert restored.is_active("cam", "high")
+    cleared = feed(restored, [0], start=2)
+    assert [e.alert_id for e in cleared] == [raised[0].alert_id]
+
+
+def test_is_active_filters_by_severity():
+    engine = AlertEngine([
+        AlertRule("high", threshold=10, debounce_frames=1),
+        AlertRule("outlook", threshold=10, metric="forecast", severity="info", debounce_frames=1),
+    ])
+    engine.evaluate("cam", 3, forecast=[12], timestamp=0)
+    assert engine.is_active("cam")
+    assert not engine.is_active("cam", min_severity="warning")
+    engine.evaluate("cam", 12, forecast=[12], timestamp=1)
+    assert engine.is_active("cam", min_severity="warning")
+    assert not engine.is_active("cam", min_severity="critical")
+
+
+def test_unknown_severity_rejected():
+    with pytest.raises(ValueError, match="severity"):
+        AlertRule("high", threshold=10, severity="urgent")
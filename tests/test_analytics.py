@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.flow import FlowEstimator
+from models.heatmap import HeatmapAccumulator, decode_snapshot
+from models.zones import LineCounter, ZoneMap
+
+
+def test_heatmap_snapshot_round_trip():
+    heatmap = HeatmapAccumulator((360, 640), grid=(9, 16))
+    rng = np.random.default_rng(0)
+    for t in range(20):
+        heatmap.update(rng.uniform((0, 0), (640, 360), size=(15, 2)), timestamp=float(t))
+    for kind, grid in (("decayed", heatmap.decayed.reshape(9, 16)), ("window", heatmap.windowed())):
+        snapshot = heatmap.snapshot(kind, camera_id="cam")
+        assert snapshot["shape"] == [9, 16] and snapshot["frames"] == 20
+        np.testing.assert_allclose(decode_snapshot(snapshot), grid, atol=snapshot["scale"])
+
+
+def test_heatmap_bins_centers_into_cells():
+    heatmap = HeatmapAccumulator((360, 640), grid=(9, 16))
+    heatmap.update(np.array([[10, 10], [20, 30], [639, 359], [700, -5]]), timestamp=0.0)
+    window = heatmap.windowed()
+    assert window[0, 0] == 2
+    # Centers off the frame are clipped into the border cells
+    assert window[8, 15] == 1 and window[0, 15] == 1
+    assert window.sum() == 4
+
+
+def test_heatmap_decays_by_half_life_and_expires_window():
+    heatmap = HeatmapAccumulator((360, 640), grid=(9, 16), half_life=60.0, window=300.0, slots=30)
+    heatmap.update(np.array([[10, 10]]), timestamp=0.0)
+    heatmap.update(np.zeros((0, 2)), timestamp=60.0)
+    assert heatmap.decayed[0] == pytest.approx(0.5)
+    assert heatmap.windowed()[0, 0] == 1
+    heatmap.update(np.zeros((0, 2)), timestamp=400.0)
+    assert heatmap.windowed().sum() == 0
+
+
+def test_zone_counts_with_overlap():
+    zones = [
+        {"name": "left", "polygon": [[0, 0], [320, 0], [320, 240], [0, 240]], "max_count": 1},
+        {"name": "door", "polygon": [[280, 0], [360, 0], [360, 240], [280, 240]]},
+    ]
+    zone_map = ZoneMap(zones, (240, 640))
+    counts = zone_map.count(np.array([[10, 10], [100, 200], [300, 100], [500, 100]]))
+    # Zones later in the list win where polygons overlap; (500, 100) is in no zone
+    assert counts == {"left": 2, "door": 1}
+    assert zone_map.over_limit(counts) == ["left"]
+    assert zone_map.count(np.zeros((0, 2))) == {"left": 0, "door": 0}
+
+
+def test_line_counter_counts_crossings_by_direction():
+    # Walking down the line p1 -> p2, its left side is +x in image coordinates
+    counter = LineCounter([{"name": "gate", "p1": [100, 0], "p2": [100, 200]}])
+    counter.update(np.array([[80.0, 50.0], [20.0, 100.0]]))
+    assert counter.update(np.array([[115.0, 52.0], [25.0, 100.0]])) == {"gate": {"in": 1, "out": 0}}
+    counter.update(np.array([[130.0, 150.0]]))
+    assert counter.update(np.array([[90.0, 148.0]])) == {"gate": {"in": 0, "out": 1}}
+    # Staying on the same side, or jumping further than max_match_dist, is not a crossing
+    assert counter.update(np.array([[118.0, 52.0], [400.0, 148.0]])) == {"gate": {"in": 0, "out": 0}}
+    assert counter.totals == {"gate": {"in": 1, "out": 1}}
+
+
+def test_line_counter_state_round_trip():
+    lines = [{"name": "gate", "p1": [100, 0], "p2": [100, 200]}]
+    counter = LineCounter(lines)
+    counter.update(np.array([[80.0, 50.0]]))
+    counter.update(np.array([[120.0, 50.0]]))
+    restored = LineCounter(lines)
+    restored.set_state(counter.get_state())
+    assert restored.update(np.array([[80.0, 50.0]])) == counter.update(np.array([[80.0, 50.0]]))
+    assert restored.totals == counter.totals == {"gate": {"in": 1, "out": 1}}
+
+
+def textured_frame(shift=(0, 0)):
+    rng = np.random.default_rng(3)
+    noise = rng.integers(0, 256, (240, 320), dtype=np.uint8)
+    gray = cv2.GaussianBlur(noise, (0, 0), 2.0)
+    gray = np.roll(gray, shift, axis=(0, 1))
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def test_flow_measures_translation():
+    flow = FlowEstimator()
+    centers = np.array([[x, y] for x in range(80, 260, 40) for y in range(60, 200, 40)], dtype=np.float64)
+    first = flow.update(textured_frame(), centers, timestamp=0.0)
+    assert first["overall"]["tracked"] == 0
+    # Everything moves 4 px right and 2 px down in half a second
+    stats = flow.update(textured_frame(shift=(2, 4)), centers, timestamp=0.5)["overall"]
+    assert stats["tracked"] == len(centers) == stats["moving"]
+    assert stats["mean_velocity"] == pytest.approx([8.0, 4.0], abs=1.0)
+    assert stats["direction_deg"] == pytest.approx(np.degrees(np.arctan2(4, 8)), abs=5.0)
+    assert stats["coherence"] > 0.95
+    assert sum(stats["direction_hist"]) == len(centers)
+
+
+def test_flow_per_zone_and_stationary():
+    zones = [{"name": "left", "polygon": [[0, 0], [160, 0], [160, 240], [0, 240]]},
+             {"name": "right", "polygon": [[160, 0], [320, 0], [320, 240], [160, 240]]}]
+    zone_map = ZoneMap(zones, (240, 320))
+    flow = FlowEstimator()
+    centers = np.array([[60.0, 120.0], [100.0, 80.0]])
+    flow.update(textured_frame(), centers, timestamp=0.0, zone_map=zone_map)
+    stats = flow.update(textured_frame(), centers, timestamp=1.0, zone_map=zone_map)
+    assert stats["zones"]["left"]["tracked"] == 2 and stats["zones"]["right"]["tracked"] == 0
+    assert stats["overall"]["moving"] == 0 and stats["overall"]["direction_hist"] == [0] * 8
@@ -0,0 +1,96 @@
+import http.client
+import json
+import os
+
+from services.dashboard_service import DashboardService, ResultsTailer, serve
+
+
+def record(frame, count, alert=False):
+    return {"frame": frame, "count": count, "alert": alert, "timestamp": f"t{frame}"}
+
+
+def test_deltas_carry_only_changed_fields():
+    service = DashboardService()
+    service.publish_detection("cam", record(1, 5))
+    # Same count and alert: frame, timestamp and the rolling window move, the rest does not
+    delta = service.publish_detection("cam", record(2, 5))
+    assert set(delta["changes"]) == {"frame", "timestamp", "window"}
+    payload = service.deltas_since(1)
+    assert payload["seq"] == 2
+    assert [d["seq"] for d in payload["deltas"]] == [2]
+    assert service.deltas_since(2) == {"seq": 2, "deltas": []}
+    assert service.snapshot()["cameras"]["cam"]["count"] == 5
+
+
+def test_reset_when_log_no_longer_reaches_back():
+    service = DashboardService(max_deltas=3)
+    for frame in range(1, 6):
+        service.publish_detection("cam", record(frame, frame))
+    assert service.deltas_since(0)["reset"]
+    assert [d["seq"] for d in service.deltas_since(2)["deltas"]] == [3, 4, 5]
+
+
+def test_reset_when_client_is_ahead():
+    # A client that followed a previous process has a cursor past this one's seq
+    service = DashboardService()
+    service.publish_detection("cam", record(1, 3))
+    payload = service.deltas_since(40)
+    assert payload["reset"] and payload["seq"] == 1
+    assert payload["cameras"]["cam"]["count"] == 3
+    assert service.wait_for_update(40, timeout=5.0)
+
+
+def test_stream_resumes_from_last_event_id():
+    service = DashboardService()
+    service.publish_detection("cam", record(1, 3))
+    server = serve(service, port=0)
+    try:
+        conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+        conn.request("GET", "/api/stream?since=0", headers={"Last-Event-ID": "99"})
+        response = conn.getresponse()
+        event_id = response.fp.readline().decode().strip()
+        data = json.loads(response.fp.readline().decode()[len("data: "):])
+        conn.close()
+    finally:
+        server.shutdown()
+    assert event_id == "id: 1"
+    assert data["reset"]
+
+
+def write(results_dir, name, payload, mtime_s):
+    path = os.path.join(results_dir, name)
+    with open(path, "w") as f:
+        json.dump(payload, f)
+    os.utime(path, (mtime_s, mtime_s))
+
+
+def test_tailer_consumes_new_files_once(tmp_path):
+    service = DashboardService()
+    tailer = ResultsTailer(service, str(tmp_path), camera_id="cam")
+    write(tmp_path, "detections_2.json", [record(1, 1), record(2, 2)], 1000)
+    write(tmp_path, "forecast_2.json", {"frame": 2, "selected_model": "ewma"}, 1000)
+    assert tailer.poll() == 2
+    # Detection files overlap; only frames past the last published one count
+    write(tmp_path, "detections_4.json", [record(2, 2), record(3, 3), record(4, 4)], 1001)
+    assert tailer.poll() == 1
+    assert service.snapshot()["cameras"]["cam"]["frame"] == 4
+    assert service.snapshot()["cameras"]["cam"]["selected_model"] == "ewma"
+    assert tailer.poll() == 0
+
+
+def test_tailer_resets_marks_when_pipeline_restarts(tmp_path):
+    service = DashboardService()
+    tailer = ResultsTailer(service, str(tmp_path), camera_id="cam")
+    for frame in (30, 60, 90):
+        write(tmp_path, f"detections_{frame}.json", [record(frame, 9)], 1000 + frame)
+    assert tailer.poll() == 3
+
+    # Restarted without a checkpoint: numbering starts over, overwriting detections_30
+    write(tmp_path, "detections_30.json", [record(30, 1)], 2000)
+    assert tailer.poll() == 1
+    summary = service.snapshot()["cameras"]["cam"]
+    assert (summary["frame"], summary["count"]) == (30, 1)
+    # Leftovers from the previous run (detections_60/90) are never replayed
+    write(tmp_path, "detections_60.json", [record(60, 2)], 2001)
+    assert tailer.poll() == 1
+    assert service.snapshot()["cameras"]["cam"]["count"] == 2
@@ -0,0 +1,251 @@
+import cv2
+import numpy as np
+import pytest
+
+from models import sweep
+from models.detection_cache import DetectionCache
+from models.detection_model import CrowdAnalyzer
+from models.detections import DetectionBatch
+from models.inference_pool import (Layout, assign_cores, candidate_layouts, layout_signature, load_layout,
+                                   save_layout)
+from models.preprocess import Letterbox, LetterboxLayout, scale_boxes
+from models.sweep import expand_grid, score_sweep
+
+
+def reference_letterbox(img, imgsz, stride=32):
+    """ultralytics' predict-time LetterBox(auto=True), written out independently."""
+    shape = img.shape[:2]
+    r = min(imgsz / shape[0], imgsz / shape[1])
+    new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+    dw, dh = np.mod(imgsz - new_unpad[0], stride) / 2, np.mod(imgsz - new_unpad[1], stride) / 2
+    if shape[::-1] != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+@pytest.mark.parametrize("frame_shape", [(720, 1280), (1080, 1920), (480, 640), (333, 500), (640, 480)])
+@pytest.mark.parametrize("imgsz", [448, 640])
+def test_letterbox_matches_reference(frame_shape, imgsz):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (*frame_shape, 3), dtype=np.uint8)
+    letterbox = Letterbox()
+    rgb, layout = letterbox(frame, imgsz)
+    expected = cv2.cvtColor(reference_letterbox(frame, imgsz), cv2.COLOR_BGR2RGB)
+    assert rgb.shape == expected.shape == (layout.out_h, layout.out_w, 3)
+    np.testing.assert_array_equal(rgb, expected)
+
+
+def test_letterbox_reuses_buffers():
+    letterbox = Letterbox()
+    a = np.zeros((360, 640, 3), np.uint8)
+    b = np.full((360, 640, 3), 200, np.uint8)
+    first, _ = letterbox(a, 640)
+    second, _ = letterbox(b, 640)
+    assert first is second
+    assert second[200, 320, 0] == 200
+
+
+def test_scale_boxes_inverts_letterbox():
+    frame_shape = (720, 1280)
+    layout = LetterboxLayout(frame_shape, 640)
+    boxes = np.array([[100.0, 50.0, 300.0, 400.0], [1000.0, 600.0, 1280.0, 720.0]])
+    gain = layout.unpad_w / frame_shape[1]
+    mapped = boxes * gain
+    mapped[:, [0, 2]] += layout.left
+    mapped[:, [1, 3]] += layout.top
+    restored = scale_boxes(mapped.copy(), (layout.out_h, layout.out_w), frame_shape)
+    np.testing.assert_allclose(restored, boxes, atol=1.0)
+
+
+def analyzer(**kwargs):
+    return CrowdAnalyzer(yolo_weights=None, adaptive=False, **kwargs)
+
+
+@pytest.mark.parametrize("length,tile,overlap", [(1920, 960, 0.2), (3840, 960, 0.25), (1000, 640, 0.0), (500, 960, 0.2)])
+def test_tile_origins_cover_axis(length, tile, overlap):
+    origins = CrowdAnalyzer._tile_origins(length, tile, overlap)
+    assert origins[0] == 0
+    assert min(origins[-1] + tile, length) == length
+    if len(origins) > 1:
+        assert np.all(np.diff(origins) <= tile * (1 - overlap))
+
+
+def test_tile_grid_spans_frame():
+    grid = analyzer(tile_size=960, tile_overlap=0.2)._tile_grid((2160, 3840))
+    assert grid[:, 0].min() == 0 and grid[:, 1].min() == 0
+    assert grid[:, 2].max() == 3840 and grid[:, 3].max() == 2160
+    assert np.all(grid[:, 2] - grid[:, 0] <= 960)
+
+
+def test_merge_tiles_drops_duplicates_and_cut_boxes():
+    det = analyzer(iou_threshold=0.5)
+    raw = DetectionBatch(
+        xyxy=np.array([
+            [100, 100, 150, 250],  # person seen in the left tile
+            [102, 101, 151, 252],  # same person from the overlapping right tile
+            [100, 100, 120, 250],  # the same person cut at a seam: IoU 0.4, but inside the first box
+            [400, 100, 450, 250],  # someone else
+        ], dtype=np.float32),
+        cls=np.zeros(4, dtype=np.int64),
+        conf=np.array([0.9, 0.8, 0.85, 0.7], dtype=np.float32),
+    )
+    merged = det._merge_tiles(raw, np.array([False, False, True, False]))
+    np.testing.assert_array_equal(merged.conf, np.array([0.9, 0.7], dtype=np.float32))
+
+
+def test_merge_tiles_keeps_partial_overlap_away_from_seams():
+    det = analyzer(iou_threshold=0.5)
+    raw = DetectionBatch(np.array([[0, 0, 100, 200], [0, 0, 40, 200]], dtype=np.float32),
+                         np.zeros(2, dtype=np.int64), np.array([0.9, 0.8], dtype=np.float32))
+    assert len(det._merge_tiles(raw, np.zeros(2, dtype=bool))) == 2
+
+
+class ReplayAnalyzer(CrowdAnalyzer):
+    """CrowdAnalyzer whose inference returns fixed boxes and counts its calls."""
+
+    def __init__(self, raw, **kwargs):
+        super().__init__(yolo_weights=None, adaptive=False, **kwargs)
+        self.raw = raw
+        self.calls = 0
+
+    def _infer(self, frame_bgr):
+        self.calls += 1
+        return self.raw
+
+
+def people(n, spacing=80):
+    xyxy = np.array([[20 + i * spacing, 50, 60 + i * spacing, 170] for i in range(n)],
+                    dtype=np.float32).reshape(-1, 4)
+    return DetectionBatch(xyxy, np.zeros(n, dtype=np.int64), np.full(n, 0.9, dtype=np.float32))
+
+
+def test_detect_filters_small_boxes_and_makes_head_circles():
+    raw = people(3)
+    raw.xyxy = np.concatenate([raw.xyxy, [[500, 50, 505, 60]]]).astype(np.float32)  # below min_bbox_area
+    raw.cls = np.zeros(4, dtype=np.int64)
+    raw.conf = np.full(4, 0.9, dtype=np.float32)
+    det = ReplayAnalyzer(raw, enable_refine=False)
+    batch = det.detect(np.zeros((360, 640, 3), np.uint8))
+    assert len(batch) == 3
+    assert len(batch.circles) == 3
+    # Head circles sit in the top part of their boxes
+    assert np.all(batch.circles[:, 1] < batch.xyxy[:, 1] + 0.5 * (batch.xyxy[:, 3] - batch.xyxy[:, 1]))
+
+
+def test_detect_suppresses_overlapping_heads():
+    raw = people(2, spacing=2)
+    batch = ReplayAnalyzer(raw, enable_refine=False).detect(np.zeros((360, 640, 3), np.uint8))
+    assert len(batch) == 2
+    assert len(batch.circles) == 1
+
+
+def make_video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"not really a video, only hashed")
+    return str(path)
+
+
+def test_cache_key_covers_inference_settings(tmp_path):
+    video = make_video(tmp_path)
+    base = DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5)
+    variants = [
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.25, 0.5),
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, max_det=100),
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, tile_mode="full"),
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, tile_mode="full", tile_size=640),
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, tile_mode="full", tile_overlap=0.3),
+        DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, tile_mode="guided"),
+        DetectionCache(tmp_path / "cache", video, "yolov8m.pt", 0.35, 0.5),
+    ]
+    keys = {base.key} | {c.key for c in variants}
+    assert len(keys) == len(variants) + 1
+    # Tile settings do not matter while tiling is off
+    assert DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, tile_size=640).key == base.key
+    det = analyzer(tile_mode="guided", guide_imgsz=512)
+    assert DetectionCache.for_analyzer(tmp_path / "cache", video, "yolov8n.pt", det).meta["tiling"] == {
+        "mode": "guided", "size": 960, "overlap": 0.2, "guide_imgsz": 512}
+
+
+def test_cache_round_trip_and_imgsz_mismatch(tmp_path):
+    video = make_video(tmp_path)
+    cache = DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, chunk_frames=4)
+    for frame_idx in range(10):
+        cache.put(frame_idx, 640, people(frame_idx % 3))
+    cache.close()
+
+    reopened = DetectionCache(tmp_path / "cache", video, "yolov8n.pt", 0.35, 0.5, chunk_frames=4)
+    hit = reopened.get(5, 640)
+    np.testing.assert_array_equal(hit.xyxy, people(2).xyxy)
+    assert reopened.get(5, 448) is None
+    assert reopened.get(42, 640) is None
+    assert (reopened.hits, reopened.misses) == (1, 2)
+
+
+def test_detect_replays_cached_frames(tmp_path):
+    cache = DetectionCache(tmp_path / "cache", make_video(tmp_path), "yolov8n.pt", 0.35, 0.5)
+    frame = np.zeros((360, 640, 3), np.uint8)
+    first = ReplayAnalyzer(people(3), enable_refine=False, detection_cache=cache)
+    first.detect(frame, frame_idx=7)
+    second = ReplayAnalyzer(people(1), enable_refine=False, detection_cache=cache)
+    assert len(second.detect(frame, frame_idx=7)) == 3
+    assert second.calls == 0
+    second.imgsz = 448  # a different imgsz is a miss
+    assert len(second.detect(frame, frame_idx=7)) == 1
+
+
+def test_expand_grid_product_and_nms_iou():
+    configs = expand_grid({"min_bbox_area": [300, 600], "nms_mode": ["distance", "area"], "nms_iou": [0.3, 0.5]})
+    # nms_iou only varies under nms_mode="area", so the distance configs collapse
+    assert len(configs) == 6
+    assert {"min_bbox_area": 300, "nms_mode": "distance"} in configs
+    assert {"min_bbox_area": 600, "nms_mode": "area", "nms_iou": 0.5} in configs
+    with pytest.raises(ValueError, match="Not postprocessing parameters"):
+        expand_grid({"imgsz": [640]})
+
+
+def test_postprocess_chunk_applies_every_config():
+    configs = [{"min_bbox_area": 300, "enable_refine": False}, {"min_bbox_area": 10000, "enable_refine": False}]
+    sweep._init_worker(configs, "persons")
+    frame = np.zeros((360, 640, 3), np.uint8)
+    counts, seconds = sweep._postprocess_chunk(([frame, frame], [people(3), people(1)]))
+    # 40x120 px boxes pass a 300 px^2 minimum but not 10000
+    np.testing.assert_array_equal(counts, [[3, 1], [0, 0]])
+    assert seconds.shape == (2,)
+
+
+def test_score_sweep_ranks_by_mae():
+    pytest.importorskip("sklearn")
+    configs = [{"min_bbox_area": 300}, {"min_bbox_area": 600}]
+    result = {"frames": 4, "counts": np.array([[1, 2, 3, 9], [1, 2, 3, 4]]), "post_s": np.array([0.4, 0.2])}
+    rows = score_sweep(configs, result, {1: 1, 2: 2, 3: 3, 4: 4, 99: 5})
+    assert [r["config"] for r in rows] == [configs[1], configs[0]]
+    assert rows[0]["mae"] == 0.0 and rows[1]["mae"] == pytest.approx(1.25)
+    assert rows[1]["bias"] == pytest.approx(1.25)
+    assert rows[0]["post_ms_per_frame"] == pytest.approx(50.0)
+    with pytest.raises(ValueError, match="none of the processed frames"):
+        score_sweep(configs, result, {10: 1})
+
+
+def test_layouts_split_cores_evenly():
+    assert [str(layout) for layout in candidate_layouts(8)] == ["1x8", "2x4", "4x2", "8x1"]
+    assert Layout.parse("2X3") == Layout(2, 3)
+    assert assign_cores(Layout(2, 3), cores=[0, 1, 2, 3, 4, 5, 6]) == [[0, 1, 2], [3, 4, 5]]
+    with pytest.raises(ValueError, match="needs 8 cores"):
+        assign_cores(Layout(4, 2), cores=[0, 1, 2])
+
+
+def test_saved_layout_only_loads_for_same_signature(tmp_path):
+    weights = tmp_path / "yolov8n.pt"
+    weights.write_bytes(b"weights")
+    path = str(tmp_path / "layout.json")
+    signature = layout_signature(str(weights), imgsz=640)
+    save_layout(path, {"layout": Layout(2, 4), "fps": 31.234, "p95_ms": 88.88}, signature)
+    assert load_layout(path, signature) == Layout(2, 4)
+    assert load_layout(path) == Layout(2, 4)  # host-only check by default
+    assert load_layout(path, layout_signature(str(weights), imgsz=448)) is None
+    assert load_layout(path, layout_signature(str(weights), latency_cap_ms=100.0)) is None
+    weights.write_bytes(b"retrained weights")
+    assert load_layout(path, layout_signature(str(weights), imgsz=640)) is None
+    assert load_layout(str(tmp_path / "missing.json"), signature) is None
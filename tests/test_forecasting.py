@@ -0,0 +1,208 @@
+import time
+
+import numpy as np
+import pytest
+
+from models.forecast_cache import ForecastCache
+from models.forecasters import (FORECASTERS, DEFAULT_CANDIDATES, EWMAForecaster, Forecaster,
+                                ForecasterSelector, LinearTrendForecaster, create_forecaster, rolling_backtest)
+from models.forecasting_model import (_make_windows, fit_look_back, predict_future_counts,
+                                      train_lstm_model, train_lstm_model_batch)
+
+
+class FixedHorizonForecaster(Forecaster):
+    """Last value held, but like the LSTM it refuses to predict past max_steps."""
+
+    name = "fixed_horizon"
+    cost = 0.5
+    max_steps = 5
+
+    def fit(self, history):
+        self.last = float(history[-1])
+        return self
+
+    def update(self, value):
+        self.last = float(value)
+
+    def predict(self, n_steps):
+        if n_steps > self.max_steps:
+            raise ValueError(f"asked for {n_steps} steps")
+        return np.full(n_steps, self.last)
+
+
+def test_registry_has_defaults_and_rejects_unknown():
+    for name in DEFAULT_CANDIDATES + ("lstm",):
+        assert FORECASTERS[name].name == name
+    assert isinstance(create_forecaster("ewma", alpha=0.5), EWMAForecaster)
+    with pytest.raises(ValueError, match="Unknown forecaster"):
+        create_forecaster("prophet")
+
+
+@pytest.mark.parametrize("name", DEFAULT_CANDIDATES)
+def test_update_matches_refit(name):
+    rng = np.random.default_rng(0)
+    series = 20 + np.cumsum(rng.normal(0, 1, 200))
+    incremental = create_forecaster(name).fit(series[:150])
+    for value in series[150:]:
+        incremental.update(value)
+    assert incremental.predict(10).shape == (10,)
+    if name in ("ewma", "holt", "linear"):
+        refit = create_forecaster(name).fit(series)
+        np.testing.assert_allclose(incremental.predict(10), refit.predict(10), rtol=1e-6, atol=1e-6)
+
+
+def test_selector_routes_to_cheapest_within_budget():
+    selector = ForecasterSelector(error_budget=0.5, horizon=5)
+    for _ in range(60):
+        selector.observe(7)
+    assert selector.active.name == "ewma"
+    assert selector.forecast(3) == pytest.approx([7.0, 7.0, 7.0])
+
+
+def test_selector_prefers_trend_model_on_ramp():
+    selector = ForecasterSelector(error_budget=0.5, horizon=5)
+    for i in range(120):
+        selector.observe(float(i))
+    assert selector.active.name != "ewma"
+    assert selector.scores["ewma"] > selector.error_budget
+    assert selector.forecast(1)[0] == pytest.approx(120.0, abs=1.0)
+
+
+def test_selector_waits_for_history():
+    selector = ForecasterSelector(horizon=10)
+    for value in range(5):
+        selector.observe(value)
+    assert selector.forecast() is None
+
+
+def test_forecast_clamped_to_max_steps():
+    selector = ForecasterSelector(candidates=[FixedHorizonForecaster()], horizon=3)
+    for value in range(20):
+        selector.observe(value)
+    assert selector.forecast(50) == [19.0] * 5
+    assert EWMAForecaster.max_steps is None
+
+
+def test_selector_state_round_trip():
+    rng = np.random.default_rng(1)
+    selector = ForecasterSelector(horizon=5)
+    for value in 10 + rng.normal(0, 2, 150):
+        selector.observe(value)
+    restored = ForecasterSelector(horizon=5)
+    restored.set_state(selector.get_state())
+    assert restored.active.name == selector.active.name
+    assert restored.forecast(5) == pytest.approx(selector.forecast(5))
+
+
+def test_cache_key_quantizes_counts_and_binds_params():
+    cache = ForecastCache(quantum=1.0)
+    key = cache.make_key([1, 2, 3], "linear", {"n_steps": 10})
+    assert cache.make_key([1.2, 2.4, 2.9], "linear", {"n_steps": 10}) == key
+    assert cache.make_key([1, 2, 4], "linear", {"n_steps": 10}) != key
+    assert cache.make_key([1, 2, 3], "lstm", {"n_steps": 10}) != key
+    assert cache.make_key([1, 2, 3], "linear", {"n_steps": 5}) != key
+
+
+def test_cache_lru_and_disk(tmp_path):
+    cache = ForecastCache(max_entries=2, cache_dir=str(tmp_path))
+    for i in range(3):
+        cache.put(f"k{i}", None, [i])
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("k2") == (None, [2.0])
+    # Evicted from memory, still on disk
+    assert cache.get("k0") == (None, [0.0])
+    assert cache.stats()["disk_hits"] == 1
+    assert ForecastCache(cache_dir=str(tmp_path)).get("k1") == (None, [1.0])
+
+
+def test_make_windows_pairs_history_with_following_steps():
+    X, y = _make_windows(np.arange(10, dtype=np.float32), look_back=3, n_steps=2)
+    assert X.shape == (6, 3) and y.shape == (6, 2)
+    assert X[0].tolist() == [0, 1, 2] and y[0].tolist() == [3, 4]
+    assert X[-1].tolist() == [5, 6, 7] and y[-1].tolist() == [8, 9]
+
+
+def test_fit_look_back_warns_when_shortened(caplog):
+    assert fit_look_back(40, 30, 10) == 30
+    with caplog.at_level("WARNING", logger="models.forecasting_model"):
+        assert fit_look_back(30, 30, 10) == 20
+    assert "look_back=20" in caplog.text
+    with pytest.raises(ValueError):
+        fit_look_back(10, 5, 10)
+
+
+def test_lstm_batch_rejects_too_short_history_before_training():
+    with pytest.raises(ValueError):
+        train_lstm_model_batch([[1, 2, 3]], look_back=5, n_steps=6)
+
+
+def test_lstm_records_shortened_look_back():
+    pytest.importorskip("tensorflow")
+    history = [float(i % 7) for i in range(30)]
+    model, preds = train_lstm_model(history, look_back=30, n_steps=10, epochs=1)
+    assert int(model.input_shape[1]) == 20 and len(preds) == 10
+    assert predict_future_counts(model, history, 4) == pytest.approx(preds[:4], rel=1e-5)
+
+
+class SlowEWMAForecaster(EWMAForecaster):
+    """EWMA declared cheapest but slow to fit."""
+
+    name = "slow_ewma"
+    cost = 0.1
+
+    def fit(self, history):
+        time.sleep(0.002)
+        return super().fit(history)
+
+
+def test_selector_backtests_a_copy():
+    selector = ForecasterSelector(horizon=5)
+    for value in range(40):
+        selector.observe(float(value))
+    active = selector.active
+    state = active.get_state()
+    selector.backtest(active)
+    assert active.get_state() == state
+    assert selector.forecast(1)[0] == pytest.approx(active.predict(1)[0])
+
+
+def test_selector_ranks_by_measured_cost():
+    selector = ForecasterSelector(candidates=[SlowEWMAForecaster(), EWMAForecaster()], error_budget=0.5, horizon=5)
+    for _ in range(30):
+        selector.observe(7)
+    # Both are exact on a flat series; the declared-cheap one measures slower and loses
+    assert selector.costs["slow_ewma"] > selector.costs["ewma"]
+    assert selector.active.name == "ewma"
+    assert selector.get_state()["costs"] == selector.costs
+
+
+def test_rolling_backtest_matches_naive_forecaster():
+    series = np.arange(30, dtype=np.float64)
+    preds, targets, fit_s, predict_s = rolling_backtest(EWMAForecaster(alpha=1.0), series, [10, 15, 20], 3)
+    assert preds.tolist() == [[9.0] * 3, [14.0] * 3, [19.0] * 3]
+    assert targets.tolist() == [[10, 11, 12], [15, 16, 17], [20, 21, 22]]
+    assert fit_s.shape == predict_s.shape == (3,)
+    # A training window limits what the model sees: only the ramp, not the flat start
+    kinked = np.concatenate([np.zeros(10), np.arange(1.0, 21.0)])
+    preds, targets, _, _ = rolling_backtest(LinearTrendForecaster(), kinked, [15, 20], 3, train_window=4)
+    np.testing.assert_allclose(preds, targets)
+    preds, _, _, _ = rolling_backtest(LinearTrendForecaster(), kinked, [15, 20], 3)
+    assert np.abs(preds - targets).max() > 1.0
+
+
+def test_backtest_forecaster_on_naive_baseline():
+    from models.backtest import backtest_forecaster, rolling_windows, summarize
+
+    series = np.arange(60, dtype=np.float64)
+    train, target = rolling_windows(series, train_window=20, horizon=4, stride=10)
+    assert train.shape == (4, 20) and target[0].tolist() == [20, 21, 22, 23]
+    # EWMA with alpha=1 is the naive last-value forecast: on a unit ramp, step k is off by exactly k
+    result = backtest_forecaster("ewma", series, horizon=4, train_window=20, stride=10, params={"alpha": 1.0})
+    assert result["n_origins"] == 4
+    assert result["mae"] == pytest.approx([1.0, 2.0, 3.0, 4.0])
+    assert result["rmse"] == pytest.approx([1.0, 2.0, 3.0, 4.0])
+    assert len(result["fit_ms"]) == len(result["predict_ms"]) == 4
+    summary = summarize([result, result])[0]
+    assert summary["origins"] == 8 and summary["mae"] == pytest.approx([1.0, 2.0, 3.0, 4.0])
+    with pytest.raises(ValueError):
+        rolling_windows(series[:10], train_window=20, horizon=4)
@@ -0,0 +1,306 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from models.crowd_pipeline import CrowdPipeline
+from models.detection_model import CrowdAnalyzer
+from models.detections import DetectionBatch
+from models.rollups import RollupAggregator, rollup_detections
+from services.scheduler_service import CameraSettings
+
+FRAME_SHAPE = (240, 320)
+
+
+class PixelCountAnalyzer(CrowdAnalyzer):
+    """Stub detector: frame[0, 0, 0] people standing in a row, so a frame fully determines its detections."""
+
+    def __init__(self):
+        super().__init__(yolo_weights=None, adaptive=False, enable_refine=False)
+        self.calls = 0
+
+    def _infer(self, frame_bgr):
+        self.calls += 1
+        n = int(frame_bgr[0, 0, 0])
+        xyxy = np.array([[5 + 30 * i, 60, 30 + 30 * i, 200] for i in range(n)], dtype=np.float32).reshape(-1, 4)
+        return DetectionBatch(xyxy, np.zeros(n, dtype=np.int64), np.full(n, 0.9, dtype=np.float32))
+
+
+def frame_with(count):
+    frame = np.zeros((*FRAME_SHAPE, 3), dtype=np.uint8)
+    frame[0, 0, 0] = count
+    return frame
+
+
+COUNTS = [3, 4, 5, 6, 7, 8, 9, 9, 8, 7] * 8
+
+
+@pytest.fixture
+def zones_path(tmp_path):
+    h, w = FRAME_SHAPE
+    path = tmp_path / "zones.json"
+    path.write_text(json.dumps({
+        "zones": [{"name": "left", "polygon": [[0, 0], [w // 2, 0], [w // 2, h], [0, h]], "max_count": 3}],
+        "lines": [{"name": "middle", "p1": [w // 2, 0], "p2": [w // 2, h]}],
+    }))
+    return str(path)
+
+
+def make_pipeline(**kwargs):
+    return CrowdPipeline(device="cpu", camera_id="cam", detector=PixelCountAnalyzer(), estimate_flow=False, **kwargs)
+
+
+def run(pipeline, counts, start=0, fps=5.0):
+    return [pipeline.process_frame(frame_with(c), media_time=(start + i) / fps, source_frame=start + i)[1:]
+            for i, c in enumerate(counts)]
+
+
+def test_counts_come_from_detect_post_processing():
+    pipeline = make_pipeline()
+    results = run(pipeline, [0, 2, 5])
+    assert [count for count, _, _ in results] == [0, 2, 5]
+    assert len(pipeline.last_detections.circles) == 5
+
+
+def test_precomputed_detections_skip_local_detector():
+    pipeline = make_pipeline()
+    batch = PixelCountAnalyzer().detect(frame_with(4))
+    _, count, _, _ = pipeline.process_frame(frame_with(0), detections=batch)
+    assert count == 4
+    assert pipeline.detector.calls == 0
+
+
+def test_forecast_only_alert_does_not_flag_frame():
+    pipeline = make_pipeline()
+    pipeline.last_forecast = [20.0] * 5
+    results = run(pipeline, [2, 2, 2, 2])
+    assert pipeline.alert_engine.is_active("cam", "crowd_forecast_high")
+    assert not any(alert for _, _, alert in results)
+    assert run(pipeline, [12, 12, 12], start=4)[-1][2]
+
+
+def test_skipped_frames_hold_count_but_do_not_feed_forecaster():
+    class FixedRate:
+        def __init__(self):
+            self.frames = []
+
+        def settings(self, camera_id):
+            return CameraSettings(stride=3, imgsz=448, refine=False)
+
+        def register(self, *args):
+            pass
+
+        def record(self, camera_id, frame_idx, count=None, settings=None):
+            self.frames.append((frame_idx, count))
+
+    policy = FixedRate()
+    pipeline = make_pipeline(rate_policy=policy)
+    pipeline.forecast_interval = float("inf")
+    results = run(pipeline, [1, 2, 3, 4, 5, 6, 7])
+    assert [count for count, _, _ in results] == [1, 1, 1, 4, 4, 4, 7]
+    assert pipeline.detector.calls == 3
+    assert pipeline.detector.imgsz == 448 and not pipeline.detector.enable_refine
+    assert list(pipeline.forecast_selector.history) == [1.0, 4.0, 7.0]
+    assert [count for _, count in policy.frames] == [1, None, None, 4, None, None, 7]
+
+
+def test_policy_horizon_in_frames_and_settings_applied_on_change():
+    class StridePolicy:
+        horizon = 60  # frames
+
+        def __init__(self):
+            self.stride = 4
+
+        def settings(self, camera_id):
+            return CameraSettings(stride=self.stride, imgsz=512)
+
+        def register(self, *args):
+            pass
+
+        def record(self, *args, **kwargs):
+            pass
+
+        def update(self, camera_id, forecast, timestamp=None):
+            pass
+
+    policy = StridePolicy()
+    pipeline = make_pipeline(rate_policy=policy)
+    requested = []
+    pipeline.forecast_selector.forecast = lambda n: requested.append(n) or [1.0] * n
+    pipeline.forecast_interval = 0.0
+    run(pipeline, [1])
+    assert requested == [15] and pipeline.detector.imgsz == 512
+    # The detector adapts imgsz between detections; unchanged settings must not undo that
+    pipeline.detector.imgsz = 576
+    run(pipeline, [1] * 4, start=1)
+    assert pipeline.detector.imgsz == 576
+    policy.stride = 2
+    run(pipeline, [1] * 4, start=5)
+    assert requested[-1] == 30 and pipeline.detector.imgsz == 512
+
+
+def test_checkpoint_round_trip(tmp_path, zones_path):
+    path = str(tmp_path / "checkpoint.json")
+    first = make_pipeline(zone_config=zones_path, checkpoint_path=path, checkpoint_every=40)
+    run(first, COUNTS[:40])
+
+    resumed = make_pipeline(zone_config=zones_path, checkpoint_path=path, checkpoint_every=40)
+    assert resumed.frame_idx == 40
+    assert list(resumed.counts_history) == list(first.counts_history)
+    assert resumed.forecast_selector.active.name == first.forecast_selector.active.name
+    assert resumed.alert_engine.get_state("cam") == first.alert_engine.get_state("cam")
+    assert resumed.line_counter.totals == first.line_counter.totals
+    assert resumed.heatmap.get_state() == first.heatmap.get_state()
+
+    # Both continue identically from the checkpoint
+    assert run(resumed, COUNTS[40:], start=40) == run(first, COUNTS[40:], start=40)
+    assert resumed.forecast_selector.forecast(5) == pytest.approx(first.forecast_selector.forecast(5))
+    assert resumed.rollups.drain() == first.rollups.drain()
+    np.testing.assert_array_equal(resumed.heatmap.windowed(), first.heatmap.windowed())
+
+
+def test_checkpoint_is_strict_json(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    pipeline = make_pipeline(checkpoint_path=str(path), checkpoint_every=0)
+    run(pipeline, [12] * 4 + [0] * 4)  # crowd_high raised and cleared
+    pipeline.save_checkpoint(str(path))
+    json.loads(path.read_text(), parse_constant=lambda name: pytest.fail(f"{name} in checkpoint"))
+
+
+def test_live_frames_bypass_detection_cache():
+    class RecordingCache:
+        def __init__(self):
+            self.keys = []
+
+        def get(self, frame_idx, imgsz):
+            self.keys.append(frame_idx)
+
+        def put(self, frame_idx, imgsz, raw):
+            pass
+
+    pipeline = make_pipeline()
+    pipeline.detector.detection_cache = RecordingCache()
+    pipeline.process_frame(frame_with(2))
+    pipeline.process_frame(frame_with(2), source_frame=7)
+    # Only the frame with a source frame number reaches the cache
+    assert pipeline.detector.detection_cache.keys == [7]
+
+
+def test_checkpoint_rejects_other_camera(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    run(make_pipeline(checkpoint_path=path, checkpoint_every=5), COUNTS[:5])
+    other = CrowdPipeline(device="cpu", camera_id="other", detector=PixelCountAnalyzer(), estimate_flow=False)
+    assert not other.load_checkpoint(path)
+    assert other.frame_idx == 0
+
+
+def test_checkpoint_every_zero_disables_periodic_saves(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    pipeline = make_pipeline(checkpoint_path=str(path), checkpoint_every=0)
+    run(pipeline, COUNTS[:10])
+    assert not path.exists()
+    pipeline.save_checkpoint(str(path))
+    assert json.loads(path.read_text())["frame_idx"] == 10
+
+
+def test_rollup_buckets_close_on_boundaries():
+    agg = RollupAggregator(resolutions=(1, 10))
+    closed = []
+    for i, count in enumerate([2, 4, 6, 8, 10]):
+        closed += agg.add(100.0 + i * 0.5, count, alert=count >= 8)
+    # Frames at 100.0/100.5, 101.0/101.5 and 102.0: two 1 s buckets closed so far
+    assert [b["frames"] for b in closed] == [2, 2]
+    assert [b["count_mean"] for b in closed] == [3.0, 7.0]
+    assert closed[1]["alert_fraction"] == 0.5
+    final = agg.flush()
+    tens = next(b for b in final if b["resolution_s"] == 10)
+    assert tens["frames"] == 5 and tens["count_min"] == 2 and tens["count_max"] == 10
+    assert tens["count_p95"] == 10.0
+    assert agg.series(1) == [3.0, 7.0, 10.0]
+
+
+def test_rollup_drain_is_incremental_and_bounded():
+    agg = RollupAggregator(resolutions=(1,), max_pending=3)
+    for t in range(10):
+        agg.add(float(t), t)
+    drained = agg.drain()
+    assert len(drained) == 3  # oldest dropped when nothing drains
+    assert drained[-1]["count_mean"] == 8.0
+    assert agg.drain() == []
+
+
+def test_rollup_detections_from_records():
+    pipeline = make_pipeline()
+    pipeline.media_epoch = 1_700_000_000.0  # whole second, so buckets follow media time exactly
+    run(pipeline, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10], fps=2.0)
+    agg = rollup_detections(list(pipeline.detection_data), resolutions=(1,))
+    buckets = list(agg.closed[1])
+    assert [b["frames"] for b in buckets] == [2] * 5
+    assert [b["count_max"] for b in buckets] == [2, 4, 6, 8, 10]
+    assert [b["count_mean"] for b in buckets] == [1.5, 3.5, 5.5, 7.5, 9.5]
+
+
+def test_annotate_false_returns_frame_untouched():
+    drawn, plain = make_pipeline(), make_pipeline()
+    frame = frame_with(3)
+    annotated, count, _, alert = drawn.process_frame(frame.copy())
+    same, plain_count, _, plain_alert = plain.process_frame(frame, annotate=False)
+    assert same is frame and int(frame.sum()) == 3
+    assert int(annotated.sum()) > 3
+    assert (plain_count, plain_alert) == (count, alert) == (3, False)
+
+
+def test_simulated_cameras_time_every_stage(tmp_path):
+    from models.synthetic import synthetic_clip
+    from scripts.simulate_data import STAGES, SimCamera, generate_counts, run_rate, zone_config
+
+    shape = (90, 160)
+    zones = tmp_path / "zones.json"
+    zones.write_text(json.dumps(zone_config(shape)))
+    stage_s = dict.fromkeys(STAGES, 0.0)
+    frames = synthetic_clip(n_frames=2, shape=shape)
+    cameras = [SimCamera(f"cam{i}", generate_counts(100, 20, seed=i), frames, str(tmp_path), str(zones),
+                         stage_s, save_every=0, seed=i) for i in range(2)]
+    row = run_rate(cameras, rate=40, ticks=1, clock=[1.0], stage_s=stage_s)
+    assert row["events"] == 40 and all(cam.frames_done == 21 for cam in cameras)
+    assert row["stage_s"]["detection"] > 0 and row["stage_s"]["tracking"] > 0
+
+
+def test_soak_growth_rate_skips_warmup():
+    from scripts.soak_test import growth_rate
+
+    samples = [{"sim_h": h, "rss_mb": 100.0 + (50.0 if h <= 0.2 else 2.0 * h)} for h in np.arange(0.1, 1.05, 0.1)]
+    assert growth_rate(samples, "rss_mb", since_h=0.2) == pytest.approx(2.0)
+    assert growth_rate(samples[:4], "rss_mb", since_h=0.2) == 0.0  # too few points after warm-up
+
+
+def test_soak_attributes_growth_to_allocating_stage():
+    import tracemalloc
+    from scripts.soak_test import attribute_growth, attribute_stages, stage_code_ranges
+
+    pipeline = make_pipeline()
+    pipeline.process_frame(frame_with(1))
+    tracemalloc.start(25)
+    try:
+        before = tracemalloc.take_snapshot()
+        # A new camera's smoothing and rule state is allocated inside AlertEngine.evaluate
+        for i in range(50):
+            pipeline.alert_engine.evaluate(f"cam{i}", 5, timestamp=0.0)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stages = attribute_stages(before, after, stage_code_ranges(pipeline))
+    assert max(stages, key=lambda s: stages[s]["bytes"]) == "alerting"
+    modules = attribute_growth(before, after)
+    assert max(modules, key=lambda m: modules[m]["bytes"]) == "services/alert_service.py"
+
+
+def test_soak_run_without_result_files(tmp_path):
+    from scripts.soak_test import run_soak
+
+    result = run_soak(hours=0.01, fps=5.0, frame_shape=(90, 160), sample_minutes=0.1, save_every=0,
+                      checkpoint_every=0, work_dir=str(tmp_path))
+    assert result["frames"] == 180 and len(result["samples"]) == 6
+    assert "persistence" in result["stages"]
+    assert not os.path.exists(tmp_path / "results")
@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.forecasters import ForecasterSelector
+from services.rate_policy_service import ForecastRatePolicy, replay
+from services.scheduler_service import CameraBudget, CameraSettings, LoadScheduler
+from services.video_service import FrameSampler
+
+
+def scheduler(capacity=1.0):
+    # cost_alpha=1: the cost estimate is the last reported detection, so tests steer demand directly
+    sched = LoadScheduler(capacity=capacity, rebalance_interval=0.0, cost_alpha=1.0)
+    sched.register(CameraBudget("low", priority=0))
+    sched.register(CameraBudget("high", priority=5))
+    return sched
+
+
+def load(sched, full_cost, timestamp=0.0):
+    """One detection per camera costing full_cost seconds at full quality, scaled to its current settings."""
+    for camera_id in ("low", "high"):
+        cam = sched._cameras[camera_id]
+        sched.record(camera_id, full_cost * sched._cost_factor(cam, cam.settings), timestamp)
+
+
+def test_ladder_degrades_stride_then_imgsz_then_refine():
+    sched = scheduler()
+    ladder = sched._cameras["low"].ladder
+    # target 25 fps with a 5/s minimum caps the stride at 5
+    assert [s.stride for s in ladder[:5]] == [1, 2, 3, 4, 5]
+    assert [s.imgsz for s in ladder[4:8]] == [640, 576, 512, 448]
+    assert ladder[-1] == CameraSettings(5, 448, False)
+
+
+def test_sheds_lowest_priority_first():
+    sched = scheduler()
+    load(sched, 0.02)  # 2 x 25 fps x 20 ms = 1.0 busy-s/s over a 0.9 shedding level
+    assert sched.settings("low").stride == 2
+    assert sched.settings("high") == CameraSettings()
+
+    load(sched, 0.1, timestamp=1.0)
+    report = sched.report(now=1.0)["allocations"]
+    # The high-priority camera only gives something up once the low one has nothing left
+    assert report["low"]["level"] == report["low"]["max_level"]
+    assert 0 < report["high"]["level"] < report["high"]["max_level"]
+
+
+def test_restores_highest_priority_first():
+    sched = scheduler()
+    load(sched, 1.0)
+    assert all(a["level"] == a["max_level"] for a in sched.report(now=0.0)["allocations"].values())
+    assert any(v["type"] == "capacity_shortfall" for v in sched.report(now=0.0)["violations"])
+
+    for t in range(1, 20):
+        load(sched, 0.02, timestamp=float(t))
+    # Headroom (restore_util 0.75) fits the high camera at full quality and the low one at half rate
+    assert sched.settings("high") == CameraSettings()
+    assert sched.settings("low").stride == 2
+    assert sched.report(now=19.0)["utilization"] == pytest.approx(0.75)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    """Two seconds at 30 fps; frame i is filled with 4 * i so frames identify themselves."""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("No MJPG encoder in this OpenCV build")
+    for i in range(60):
+        writer.write(np.full((48, 64, 3), 4 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def sample(path, target_fps=None, seek_frames=90):
+    sampler = FrameSampler(cv2.VideoCapture(path), target_fps, seek_frames=seek_frames)
+    return sampler, list(sampler)
+
+
+def test_sampler_reads_every_frame_without_target(clip):
+    sampler, frames = sample(clip)
+    assert [index for index, _, _ in frames] == list(range(60))
+    assert [t for _, t, _ in frames] == pytest.approx([i / 30.0 for i in range(60)], abs=1e-3)
+    assert (sampler.decoded, sampler.grabbed, sampler.seeks) == (60, 0, 0)
+
+
+def test_sampler_grabs_skipped_frames_without_drift(clip):
+    sampler, frames = sample(clip, target_fps=7.0)
+    indices = [index for index, _, _ in frames]
+    # 30 -> 7 fps: a fractional step of 4.29 frames, accumulated rather than rounded each time
+    assert indices == [round(k * 30 / 7) for k in range(len(indices))]
+    assert [t for _, t, _ in frames] == pytest.approx([i / 30.0 for i in indices], abs=1e-3)
+    # Decoded pixels match the source frame each timestamp claims (MJPG is lossy)
+    assert all(abs(int(frame[0, 0, 0]) - 4 * index) <= 4 for index, _, frame in frames)
+    # Every other frame is only grabbed (demuxed, never converted to BGR)
+    assert (sampler.decoded, sampler.grabbed, sampler.seeks) == (len(frames), 60 - len(frames), 0)
+
+
+def test_sampler_seeks_long_gaps(clip):
+    sampler, frames = sample(clip, target_fps=1.0, seek_frames=5)
+    assert [(index, round(t, 3)) for index, t, _ in frames] == [(0, 0.0), (30, 1.0)]
+    assert abs(int(frames[1][2][0, 0, 0]) - 120) <= 4
+    # The second seek lands past the end of the clip and stops the iteration
+    assert (sampler.seeks, sampler.grabbed, sampler.decoded) == (2, 0, 2)
+
+
+def test_replay_converts_frame_horizon_to_forecast_steps():
+    class Recording:
+        def __init__(self):
+            self.inner = ForecasterSelector(horizon=50)
+            self.asked = set()
+
+        def observe(self, value):
+            self.inner.observe(value)
+
+        def forecast(self, n_steps):
+            self.asked.add(n_steps)
+            return self.inner.forecast(n_steps)
+
+    forecaster = Recording()
+    counts = [2] * 3000 + [15] * 500 + [2] * 500
+    result = replay(counts, 10, policy=ForecastRatePolicy(horizon=50, hold_s=5), forecaster=forecaster)
+    # 50 frames ahead is ceil(50 / stride) detections at strides 1, 2, 4 and 8
+    assert forecaster.asked == {50, 25, 13, 7}
+    assert result["true_crossings"] == 1 and result["missed_crossings"] == 0
+    assert result["max_delay_frames"] < 8
+    assert result["compute_saved"] > 0.5
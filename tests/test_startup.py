@@ -0,0 +1,22 @@
+from scripts.check_startup import HEAVY_MODULES, parse_importtime, probe
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2000 |      52000 |   numpy
+import time:       300 |        300 |     numpy.core
+import time:       900 |      14000 |   cv2
+import time:       400 |      70000 | models.crowd_pipeline
+"""
+
+
+def test_parse_importtime_ranks_direct_dependencies():
+    # Only depth-1 entries count; the module itself (depth 0) and nested imports do not
+    assert parse_importtime(IMPORTTIME, top=2) == [(52000, "numpy"), (14000, "cv2")]
+
+
+def test_pipeline_import_loads_no_heavy_framework():
+    result = probe("models.crowd_pipeline")
+    assert result["heavy"] == []
+    assert "tensorflow" in HEAVY_MODULES and "torch" in HEAVY_MODULES
+    assert result["seconds"] > 0 and result["rss_mb"] > 0